@@ -1,9 +1,15 @@
 # app.py
+import dataclasses
+import hashlib
+import json
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta, date
 import calendar
 from payroll import *
+from graphe_paie import GrapheBulletin
+from bulletin_pdf import gabarit
+from stockage import stockage_par_defaut
 
 def create_calendar_input(timesheet_name, year, month):
     """Crée un calendrier interactif pour saisir les heures"""
@@ -121,6 +127,13 @@ jan_25_abs_inj = generate_timesheet(2025, 1)
 jan_25_abs_mal = generate_timesheet(2025, 1)
 jan_25 = combine_timesheets(jan_25_contrat, jan_25_reel, jan_25_nuit, jan_25_dimanche, jan_25_rtt, jan_25_cp, jan_25_jfr, jan_25_jfnr, jan_25_abs_inj, jan_25_abs_mal)
 
+def empreinte_historique(salarie, timesheet, absence_motifs, bulletin):
+    """Empreinte de ce que l'application historise, pour ne réécrire la base que si la saisie a changé."""
+    h = hashlib.sha256(json.dumps([dataclasses.asdict(salarie), absence_motifs], sort_keys=True, default=str).encode())
+    h.update(pd.util.hash_pandas_object(timesheet).values.tobytes())
+    h.update(pd.util.hash_pandas_object(bulletin.astype(str)).values.tobytes())
+    return h.hexdigest()
+
 def afficher_evolution_conges_payes(salarie, timesheet):
     # Initialiser une liste pour stocker les soldes mensuels
     soldes_mensuels = []
@@ -168,7 +181,7 @@ def main():
     with col2:
         # Ajouter le titre
         st.title("Peppers: Générateur de Fiche de Paie")
-        st.write("Renseignez vos variables de rémunération et générez votre bulletin de paie au format CSV.")
+        st.write("Renseignez vos variables de rémunération et générez votre bulletin de paie au format CSV ou PDF.")
 
     # Create three columns with the middle one empty for spacing
     col1, col_space, col2 = st.columns([4, 1, 4])
@@ -194,12 +207,20 @@ def main():
         entreprise_taux_AT = st.number_input("Taux AT", value=0.00212, format="%.5f")
         st.markdown("<br>", unsafe_allow_html=True)
 
+        entreprise_majoration_nuit = st.number_input("Majoration heures de nuit (%)", min_value=0.0, value=0.0)
+        st.markdown("<br>", unsafe_allow_html=True)
+
+        entreprise_majoration_dimanche = st.number_input("Majoration heures de dimanche (%)", min_value=0.0, value=0.0)
+        st.markdown("<br>", unsafe_allow_html=True)
+
         entreprise = Entreprise(
             nom=entreprise_nom,
             adresse=entreprise_adresse,
             siret=entreprise_siret,
             effectif=entreprise_effectif,
-            taux_AT=entreprise_taux_AT
+            taux_AT=entreprise_taux_AT,
+            taux_majoration_nuit=entreprise_majoration_nuit / 100,
+            taux_majoration_dimanche=entreprise_majoration_dimanche / 100
         )
         st.markdown("---")
 
@@ -354,6 +375,12 @@ def main():
         if prime_exceptionnelle_enabled:
             prime_exceptionnelle_valeur = st.number_input("Valeur de la prime exceptionnelle", value=0.0)
 
+    with st.expander("Sur objectifs"):
+        prime_objectifs_enabled = st.checkbox("Activer la prime sur objectifs")
+        if prime_objectifs_enabled:
+            prime_objectifs_cible = st.number_input("Montant cible de la prime", value=0.0)
+            prime_objectifs_atteinte = st.number_input("Taux d'atteinte des objectifs (1 = 100%)", value=1.0)
+
     # Construire le dictionnaire des primes basé sur les entrées de l'utilisateur
     primes = {}
     if prime_13_mois_enabled:
@@ -366,6 +393,9 @@ def main():
         primes["ancienneté"] = {"type": "ancienneté"}
     if prime_exceptionnelle_enabled:
         primes["exceptionnelle"] = {"type": "exceptionnelle", "valeur": prime_exceptionnelle_valeur}
+    if prime_objectifs_enabled:
+        primes["objectifs"] = {"type": "objectifs", "montant_cible": prime_objectifs_cible,
+                               "taux_atteinte": prime_objectifs_atteinte}
     
 
     # --- Compute Payroll ---
@@ -374,9 +404,6 @@ def main():
         #st.subheader("Avantages configurés")
         #st.json(avantages)
 
-        # Calculer les cotisations
-        cotisations = calcul_cotisations(salarie)
-
         # Convertir les données du formulaire en timesheet
         ts_contract = convert_to_timesheet(st.session_state['timesheet_contractuelles'], 2025, 1)
         ts_reelles = convert_to_timesheet(st.session_state['timesheet_reelles'], 2025, 1)
@@ -403,27 +430,38 @@ def main():
 
         
 
-        # Calculer la fiche de paie avec les absences
-        df_pay = fiche_de_paie(
-            salarie=salarie,
-            avantages=avantages,
-            primes=primes,
-            timesheet=jan_25,
-            timesheet_prec=dec_24,
-            absence_motifs=st.session_state.absence_motifs
-        )
-
-
-        cotis=calcul_cotisations(salarie=salarie)
-        df_cotisations = df_cotis(salarie=salarie,cotisations=cotis,df_salaire=df_pay)
- 
-          # Ajouter les réductions
-        df_reduc = df_reductions(salarie, df_cotisations, jan_25, avantages)
-    
-         # Ajouter les sous-totaux
-        df_final = ajouter_sous_totaux(df_reduc, salarie, jan_25)
-    
-        
+        # Timesheet du mois précédent : celle historisée si elle existe, sinon la saisie par défaut
+        stockage = stockage_par_defaut()
+        salarie_id = stockage.identifiant_salarie(salarie.numero_ss)
+        timesheet_prec = dec_24
+        if salarie_id is not None:
+            historisee = stockage.charger_timesheet(salarie_id, dec_24.index.min(), dec_24.index.max())
+            if not historisee.empty:
+                timesheet_prec = historisee
+
+        # Calculer la fiche de paie avec les absences : seuls les noeuds touchés par la saisie sont recalculés
+        graphe = st.session_state.get('graphe_bulletin')
+        if graphe is None:
+            graphe = GrapheBulletin(salarie, avantages, primes, jan_25, timesheet_prec, st.session_state.absence_motifs)
+            st.session_state['graphe_bulletin'] = graphe
+        else:
+            graphe.modifier("salarie", salarie)
+            graphe.modifier("avantages_declares", avantages)
+            graphe.modifier("primes_declarees", primes)
+            graphe.modifier("absence_motifs", st.session_state.absence_motifs)
+            graphe.modifier("timesheet_prec", timesheet_prec)
+            graphe.modifier_timesheet(jan_25)
+        df_final = graphe.bulletin()
+
+        # Historiser le salarié, sa timesheet, ses absences et le bulletin calculé, seulement s'ils ont
+        # changé depuis le dernier enregistrement de la session
+        empreinte = empreinte_historique(salarie, jan_25, st.session_state.absence_motifs, df_final)
+        if st.session_state.get('empreinte_historique') != empreinte:
+            salarie_id = stockage.enregistrer_salarie(salarie)
+            stockage.enregistrer_timesheets([(salarie_id, jan_25)])
+            stockage.enregistrer_absences([(salarie_id, "2025-01", st.session_state.absence_motifs)])
+            stockage.enregistrer_bulletins([(salarie_id, "2025-01", df_final)])
+            st.session_state['empreinte_historique'] = empreinte
 
          # Convertir les colonnes en numérique
         df_final['Total (€)'] = pd.to_numeric(df_final['Total (€)'], errors='coerce')
@@ -455,6 +493,12 @@ def main():
             file_name=f'fiche_de_paie_{salarie.nom}_{datetime.now().strftime("%Y-%m")}.csv',
             mime='text/csv'
         )
+        st.download_button(
+            label="Télécharger la fiche de paie (PDF)",
+            data=gabarit().rendre(df_filtered, salarie, "2025-01"),
+            file_name=f'fiche_de_paie_{salarie.nom}_{datetime.now().strftime("%Y-%m")}.pdf',
+            mime='application/pdf'
+        )
 
 
         st.subheader("Solde Congés Payés")
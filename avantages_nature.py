@@ -0,0 +1,227 @@
+"""
+Évaluation des avantages en nature par tableaux.
+
+Les barèmes (forfait logement par tranche de rémunération, taux du forfait véhicule, plafond
+électrique...) viennent des registres datés de parametres.py ; chaque fonction accepte des
+scalaires ou des tableaux NumPy alignés, de sorte qu'un même code évalue l'avantage d'un salarié
+et les déclarations de tout un effectif en une passe.
+"""
+import numpy as np
+import pandas as pd
+
+from parametres import baremes, parametre
+
+TYPES_AVANTAGES = ("nourriture", "logement", "voiture", "autres")
+
+# Colonnes d'une table de déclarations et valeur prise lorsqu'elle est absente ou vide
+# (valeurs par défaut de calcul_avantages_en_nature)
+DEFAUTS_DECLARATIONS = {
+    "mode": "forfaitaire",
+    "salaire_de_base": 0.0,
+    "pieces": 1,
+    "type_vehicule": "thermique",
+    "achat_ou_location": "achat",
+    "anciennete": "moins_5_ans",
+    "carburant_inclus": False,
+    "carburant_professionnel_et_personnel": False,
+    "prix_achat_ttc": 25000.0,
+    "cout_annuel_ttc": 5000.0,
+    "frais_reels_carburant": 2000.0,
+    "amortissement": 5000.0,
+    "assurance": 1000.0,
+    "entretien": 1000.0,
+    "repas_par_jour": 1,
+    "jours_travailles": 0,
+    "titre_restaurant": 0.0,
+    "participation": 0.0,
+}
+# Valeur réelle par défaut selon le type d'avantage
+VALEUR_REELLE_PAR_DEFAUT = {"logement": 1000.0, "autres": 0.0}
+
+COLONNES_DECLARATIONS = ["salarie", "avantage", "type", "valeur_reelle", *DEFAUTS_DECLARATIONS]
+
+# Nom du paramètre dans les déclarations au format dictionnaire, quand il diffère de la colonne
+_PARAMS = {"pieces": "pieces principales"}
+
+# Paramètres de valeur_voiture, dans l'ordre
+_PARAMS_VOITURE = [
+    "mode", "type_vehicule", "achat_ou_location", "anciennete", "carburant_inclus",
+    "carburant_professionnel_et_personnel", "prix_achat_ttc", "cout_annuel_ttc", "frais_reels_carburant",
+    "amortissement", "assurance", "entretien",
+]
+
+
+def valeur_logement(salaire_de_base, pieces=1, mode="forfaitaire", valeur_reelle=1000.0, periode=None):
+    """
+    Avantage logement mensuel : forfait URSSAF de la tranche du salaire de base (par pièce au-delà
+    d'une pièce principale) ou valeur réelle.
+    """
+    une_piece = baremes().valeurs("LOGEMENT_UNE_PIECE", salaire_de_base, periode)
+    par_piece = baremes().valeurs("LOGEMENT_PAR_PIECE", salaire_de_base, periode)
+    forfait = np.where(np.equal(pieces, 1), une_piece, par_piece * np.asarray(pieces, dtype=float))
+    mode = np.asarray(mode)
+    return np.where(mode == "forfaitaire", forfait, np.where(mode == "reelle", valeur_reelle, 0.0))
+
+
+def valeur_voiture(mode="forfaitaire", type_vehicule="thermique", achat_ou_location="achat",
+                   anciennete="moins_5_ans", carburant_inclus=False, carburant_professionnel_et_personnel=False,
+                   prix_achat_ttc=25000.0, cout_annuel_ttc=5000.0, frais_reels_carburant=2000.0,
+                   amortissement=5000.0, assurance=1000.0, entretien=1000.0, periode=None):
+    """
+    Avantage véhicule mensuel : forfait annuel sur le prix d'achat ou le coût de location, ou
+    dépenses réelles, abattu puis plafonné pour un véhicule électrique, ramené au mois.
+    """
+    carburant_inclus = np.asarray(carburant_inclus, dtype=bool)
+    moins_5_ans = np.asarray(anciennete) == "moins_5_ans"
+    taux_achat = np.where(
+        moins_5_ans,
+        np.where(carburant_inclus, parametre("AVANTAGE_VOITURE_ACHAT_CARBURANT", periode),
+                 parametre("AVANTAGE_VOITURE_ACHAT", periode)),
+        np.where(carburant_inclus, parametre("AVANTAGE_VOITURE_ACHAT_PLUS_5_ANS_CARBURANT", periode),
+                 parametre("AVANTAGE_VOITURE_ACHAT_PLUS_5_ANS", periode)),
+    )
+    achat = np.asarray(prix_achat_ttc, dtype=float) * taux_achat
+
+    location_seule = parametre("AVANTAGE_VOITURE_LOCATION", periode) * np.asarray(cout_annuel_ttc, dtype=float)
+    location = np.where(
+        ~carburant_inclus,
+        location_seule,
+        np.where(np.asarray(carburant_professionnel_et_personnel, dtype=bool),
+                 parametre("AVANTAGE_VOITURE_LOCATION_CARBURANT_GLOBAL", periode) * np.asarray(cout_annuel_ttc, dtype=float),
+                 location_seule + frais_reels_carburant),
+    )
+    achat_ou_location = np.asarray(achat_ou_location)
+    forfait = np.where(achat_ou_location == "achat", achat, np.where(achat_ou_location == "location", location, 0.0))
+    reelle = (np.asarray(amortissement, dtype=float) + assurance) + entretien + frais_reels_carburant
+
+    mode = np.asarray(mode)
+    valeur = np.where(mode == "forfaitaire", forfait, np.where(mode == "reelle", reelle, 0.0))
+
+    abattue = valeur - parametre("AVANTAGE_VOITURE_ABATTEMENT_ELECTRIQUE", periode) * valeur
+    abattue = np.minimum(np.maximum(0, abattue), parametre("AVANTAGE_VOITURE_PLAFOND_ELECTRIQUE", periode))
+    valeur = np.where(np.asarray(type_vehicule) == "electrique", abattue, valeur)
+    return valeur / 12
+
+
+def valeur_nourriture(jours_travailles, titre_restaurant, participation, repas_par_jour=1):
+    """Part salariale des titres-restaurant du mois (déduite du net, hors total des avantages)."""
+    return repas_par_jour * (titre_restaurant * (1 - np.asarray(participation, dtype=float))) * jours_travailles
+
+
+def valeur_autres(valeur_reelle=0.0, periode=None):
+    return np.asarray(valeur_reelle, dtype=float) * parametre("AVANTAGE_AUTRES", periode)
+
+
+def valeurs_avantages(avantages, salaire_de_base, jours_travailles, titre_restaurant, participation, periode=None):
+    """
+    Valeur mensuelle, non arrondie, de chaque avantage déclaré au format de calcul_avantages_en_nature,
+    pour un salaire de base scalaire ou un tableau de salaires de base.
+
+    :return: {nom de l'avantage: (type, valeur)} dans l'ordre de `avantages` ; types inconnus ignorés
+    """
+    valeurs = {}
+    for avantage, details in avantages.items():
+        type_avantage = details["type"]
+        params = details.get("params", {})
+        if type_avantage == "nourriture":
+            valeur = valeur_nourriture(jours_travailles, titre_restaurant, participation, params.get("repas_par_jour", 1))
+        elif type_avantage == "logement":
+            valeur = valeur_logement(salaire_de_base, params.get("pieces principales", 1), details.get("mode", "forfaitaire"),
+                                     params.get("valeur_reelle", VALEUR_REELLE_PAR_DEFAUT["logement"]), periode)
+        elif type_avantage == "voiture":
+            valeur = valeur_voiture(*(params.get(nom, DEFAUTS_DECLARATIONS[nom]) for nom in _PARAMS_VOITURE), periode=periode)
+        elif type_avantage == "autres":
+            valeur = valeur_autres(params.get("valeur_reelle", VALEUR_REELLE_PAR_DEFAUT["autres"]), periode)
+        else:
+            continue
+        valeurs[avantage] = (type_avantage, valeur)
+    return valeurs
+
+
+def declarations_depuis_dicts(avantages_par_salarie, salaries, jours_travailles=None):
+    """
+    Table de déclarations (colonnes COLONNES_DECLARATIONS) à partir d'avantages au format de
+    calcul_avantages_en_nature.
+
+    :param avantages_par_salarie: {identifiant: {nom de l'avantage: {"type", "mode", "params"}}}
+    :param salaries: {identifiant: Salarie}, pour le salaire de base et les titres-restaurant de l'entreprise
+    :param jours_travailles: {identifiant: jours travaillés du mois}, pour les titres-restaurant
+    """
+    jours_travailles = jours_travailles or {}
+    lignes = []
+    for identifiant, avantages in avantages_par_salarie.items():
+        salarie = salaries[identifiant]
+        for avantage, details in avantages.items():
+            params = details.get("params", {})
+            ligne = {colonne: params.get(_PARAMS.get(colonne, colonne), defaut)
+                     for colonne, defaut in DEFAUTS_DECLARATIONS.items()}
+            # Le mode du logement est celui de la déclaration, celui du véhicule est dans ses paramètres
+            ligne["mode"] = params.get("mode", "forfaitaire") if details["type"] == "voiture" else details.get("mode", "forfaitaire")
+            ligne.update({
+                "salarie": identifiant,
+                "avantage": avantage,
+                "type": details["type"],
+                "valeur_reelle": params.get("valeur_reelle", VALEUR_REELLE_PAR_DEFAUT.get(details["type"], 0.0)),
+                "salaire_de_base": salarie.salaire_de_base,
+                "jours_travailles": jours_travailles.get(identifiant, 0),
+                "titre_restaurant": salarie.entreprise.titre_restaurant,
+                "participation": salarie.entreprise.participation_titre_restaurant,
+            })
+            lignes.append(ligne)
+    return pd.DataFrame(lignes, columns=COLONNES_DECLARATIONS)
+
+
+def _colonne(declarations, nom):
+    if nom not in declarations:
+        return np.full(len(declarations), DEFAUTS_DECLARATIONS[nom])
+    colonne = declarations[nom]
+    return colonne.where(colonne.notna(), DEFAUTS_DECLARATIONS[nom]).to_numpy()
+
+
+def valoriser_avantages(declarations, periode=None):
+    """
+    Valeur mensuelle, non arrondie, de chaque déclaration d'avantage en nature.
+
+    :param declarations: DataFrame au format COLONNES_DECLARATIONS ; seules "type" est obligatoire,
+        les autres colonnes absentes ou vides prennent leur valeur par défaut
+    :param periode: Période de paie, pour les barèmes en vigueur
+    :return: Copie des déclarations avec une colonne "valeur"
+    """
+    types = declarations["type"].to_numpy()
+    c = {nom: _colonne(declarations, nom) for nom in DEFAUTS_DECLARATIONS}
+    valeur_reelle = declarations["valeur_reelle"] if "valeur_reelle" in declarations else pd.Series(np.nan, index=declarations.index)
+    valeur_reelle = np.where(valeur_reelle.isna(), np.where(types == "logement", VALEUR_REELLE_PAR_DEFAUT["logement"], 0.0),
+                             valeur_reelle.to_numpy(dtype=float, na_value=0.0))
+
+    valeur = np.select(
+        [types == "nourriture", types == "logement", types == "voiture", types == "autres"],
+        [
+            valeur_nourriture(c["jours_travailles"].astype(float), c["titre_restaurant"].astype(float),
+                              c["participation"], c["repas_par_jour"].astype(float)),
+            valeur_logement(c["salaire_de_base"].astype(float), c["pieces"], c["mode"], valeur_reelle, periode),
+            valeur_voiture(c["mode"], c["type_vehicule"], c["achat_ou_location"], c["anciennete"],
+                           c["carburant_inclus"].astype(bool), c["carburant_professionnel_et_personnel"].astype(bool),
+                           c["prix_achat_ttc"].astype(float), c["cout_annuel_ttc"].astype(float),
+                           c["frais_reels_carburant"].astype(float), c["amortissement"].astype(float),
+                           c["assurance"].astype(float), c["entretien"].astype(float), periode),
+            valeur_autres(valeur_reelle, periode),
+        ],
+        0.0,
+    )
+    resultat = declarations.copy()
+    resultat["valeur"] = valeur
+    return resultat
+
+
+def totaux_avantages(valorisees):
+    """
+    Totaux par salarié d'une table valorisée, arrondis comme calcul_avantages_en_nature :
+    "total_avantages" (réintégré au brut, hors titres-restaurant) et "nourriture" (déduite du net).
+    """
+    nourriture = valorisees["type"] == "nourriture"
+    totaux = pd.DataFrame({
+        "total_avantages": valorisees["valeur"].where(~nourriture, 0.0),
+        "nourriture": valorisees["valeur"].where(nourriture, 0.0),
+        "salarie": valorisees["salarie"],
+    }).groupby("salarie", sort=False).sum()
+    return totaux.round(2)
@@ -0,0 +1,239 @@
+"""
+Agrégation des badgeages (pointages d'entrée et de sortie) en heures journalières.
+
+    python badgeages.py 2025 3 badgeages_1.csv badgeages_2.csv -o pointages_2025-03.csv
+    cat badgeages.csv | python badgeages.py 2025 3 > pointages_2025-03.csv
+
+Les terminaux émettent un événement par passage (salarié, horodatage, entrée ou sortie), dans
+l'ordre chronologique de chaque salarié. Les événements sont lus ligne à ligne et appariés au fil
+de l'eau : pour chaque salarié, seuls l'entrée en cours et les cumuls des jours du mois sont gardés
+en mémoire. Chaque plage entrée-sortie est découpée à minuit et aux bornes de la plage de nuit
+(21h-6h), puis ventilée sur les canaux "heures réelles normales", "heures de nuit" et "heures de
+dimanche". Les heures de nuit et de dimanche sont un détail des heures réelles (elles y sont
+comprises), comme dans controle_temps_travail et le calcul des majorations.
+
+Seules les heures des jours du mois sont retenues : une plage commencée la veille du premier n'en
+garde que la part après minuit, et les jours du mois précédent de la première semaine restent vides.
+Le résultat est un TimesheetsMois (timesheet(salarie) : format de combine_timesheets) ; la sortie
+en ligne de commande est au format d'import de importer_pointages.
+"""
+import argparse
+import csv
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from import_pointage import COLONNES_EXPORT, TimesheetsMois, dates_du_mois
+from payroll import CANAUX_TIMESHEET
+
+# Colonnes attendues dans les fichiers d'événements des terminaux
+COLONNES_BADGEUSE = {"salarie": "employee", "horodatage": "timestamp", "sens": "direction"}
+
+ENTREE, SORTIE = "entrée", "sortie"
+ALIAS_SENS = {
+    "in": ENTREE, "entree": ENTREE, "entrée": ENTREE, "e": ENTREE, "i": ENTREE,
+    "out": SORTIE, "sortie": SORTIE, "s": SORTIE, "o": SORTIE,
+}
+
+HEURE_DEBUT_NUIT = 21
+HEURE_FIN_NUIT = 6
+# Au-delà, une plage est tenue pour un oubli de badgeage de sortie
+DUREE_MAX = 24.0
+
+# Canaux alimentés, dans l'ordre des colonnes des cumuls
+CANAUX_BADGEAGES = [CANAUX_TIMESHEET.index(canal) for canal in
+                    ("heures réelles normales", "heures de nuit", "heures de dimanche")]
+COLONNES_REJETS = ["salarie", "horodatage", "sens", "motif"]
+
+SECONDES_JOUR = 86400
+
+
+class _EtatSalarie:
+    """
+    Entrée en cours, dernier événement et cumuls en secondes d'un salarié : liste plate indexée par
+    jour * 3 + canal (les mises à jour une à une sont plus rapides sur une liste que sur un tableau).
+    """
+    __slots__ = ("entree", "dernier", "secondes")
+
+    def __init__(self, nb_jours):
+        self.entree = None
+        self.dernier = None
+        self.secondes = [0] * (nb_jours * len(CANAUX_BADGEAGES))
+
+
+class AgregateurBadgeages:
+    """
+    Apparie les événements d'un mois au fil de l'eau :
+
+        agregateur = AgregateurBadgeages(2025, 3)
+        for salarie, horodatage, sens in evenements:
+            agregateur.ajouter(salarie, horodatage, sens)
+        mois = agregateur.resultat()
+
+    Les événements d'un même salarié doivent arriver dans l'ordre chronologique ; ceux de salariés
+    différents peuvent être entremêlés. Les anomalies (sortie sans entrée, entrée sans sortie, plage
+    de plus de `duree_max` heures, événement antérieur au précédent, sens ou horodatage illisible)
+    sont écartées et listées dans les rejets du résultat.
+    """
+
+    def __init__(self, annee, mois, debut_nuit=HEURE_DEBUT_NUIT, fin_nuit=HEURE_FIN_NUIT, duree_max=DUREE_MAX):
+        self.annee, self.mois = annee, mois
+        self.dates = dates_du_mois(annee, mois)
+        self.origine = self.dates[0].to_pydatetime()
+        self.premier_jour = (datetime(annee, mois, 1) - self.origine).days
+        # Dimanches, en indice de jour depuis l'origine (les jours du mois suivant ne sont pas retenus)
+        self.dimanches = set(np.flatnonzero(self.dates.weekday == 6).tolist())
+        self.debut_nuit = int(debut_nuit * 3600)
+        self.fin_nuit = int(fin_nuit * 3600)
+        self.duree_max = timedelta(hours=duree_max)
+        self.etats = {}
+        self.rejets = []
+
+    def _rejeter(self, salarie, horodatage, sens, motif):
+        self.rejets.append((salarie, horodatage, sens, motif))
+
+    def ajouter(self, salarie, horodatage, sens):
+        """
+        :param horodatage: datetime, ou chaîne ISO 8601 (heure locale ; un éventuel fuseau est ignoré)
+        :param sens: ENTREE, SORTIE ou un libellé de ALIAS_SENS
+        """
+        sens_lu = ALIAS_SENS.get(str(sens).strip().lower())
+        if isinstance(horodatage, str):
+            try:
+                horodatage = datetime.fromisoformat(horodatage.strip())
+            except ValueError:
+                return self._rejeter(salarie, horodatage, sens, "horodatage invalide")
+        horodatage = horodatage.replace(tzinfo=None)
+        if sens_lu is None:
+            return self._rejeter(salarie, horodatage, sens, "sens inconnu")
+
+        etat = self.etats.get(salarie)
+        if etat is None:
+            etat = self.etats[salarie] = _EtatSalarie(len(self.dates))
+        if etat.dernier is not None and horodatage < etat.dernier:
+            return self._rejeter(salarie, horodatage, sens_lu, "événement antérieur au précédent")
+        etat.dernier = horodatage
+
+        if sens_lu == ENTREE:
+            if etat.entree is not None:
+                self._rejeter(salarie, etat.entree, ENTREE, "entrée sans sortie")
+            etat.entree = horodatage
+        elif etat.entree is None:
+            self._rejeter(salarie, horodatage, SORTIE, "sortie sans entrée")
+        else:
+            entree, etat.entree = etat.entree, None
+            if horodatage - entree > self.duree_max:
+                self._rejeter(salarie, entree, ENTREE, "plage supérieure à la durée maximale")
+                self._rejeter(salarie, horodatage, SORTIE, "plage supérieure à la durée maximale")
+            else:
+                self._ventiler(etat.secondes, entree, horodatage)
+
+    def _ventiler(self, secondes, entree, sortie):
+        """Découpe la plage à minuit et aux bornes de la nuit, et cumule les jours du mois."""
+        debut = (entree - self.origine) // timedelta(seconds=1)
+        fin = (sortie - self.origine) // timedelta(seconds=1)
+        nb_jours = len(self.dates)
+        while debut < fin:
+            jour, dans_le_jour = divmod(debut, SECONDES_JOUR)
+            fin_morceau = min(fin, (jour + 1) * SECONDES_JOUR)
+            if jour >= nb_jours:
+                break
+            if jour >= self.premier_jour:
+                a, b = dans_le_jour, fin_morceau - jour * SECONDES_JOUR
+                nuit = max(0, min(b, self.fin_nuit) - a) + max(0, b - max(a, self.debut_nuit))
+                secondes[3 * jour] += b - a
+                secondes[3 * jour + 1] += nuit
+                if jour in self.dimanches:
+                    secondes[3 * jour + 2] += b - a
+            debut = fin_morceau
+
+    def cloturer(self):
+        """Rejette les entrées restées sans sortie en fin de flux."""
+        for salarie, etat in self.etats.items():
+            if etat.entree is not None:
+                self._rejeter(salarie, etat.entree, ENTREE, "entrée sans sortie")
+                etat.entree = None
+
+    def resultat(self):
+        """Clôture le flux et renvoie les heures du mois (TimesheetsMois, salariés triés)."""
+        self.cloturer()
+        salaries = np.array(sorted(self.etats, key=str), dtype=object)
+        heures = np.zeros((len(salaries), len(self.dates), len(CANAUX_TIMESHEET)))
+        for i, salarie in enumerate(salaries):
+            secondes = np.array(self.etats[salarie].secondes, dtype=np.int64).reshape(len(self.dates), -1)
+            heures[i][:, CANAUX_BADGEAGES] = secondes / 3600
+        return TimesheetsMois(
+            annee=self.annee,
+            mois=self.mois,
+            salaries=salaries,
+            dates=self.dates,
+            heures=heures,
+            rejets=pd.DataFrame(self.rejets, columns=COLONNES_REJETS) if self.rejets else pd.DataFrame(),
+        )
+
+
+def lire_badgeages(fichiers, colonnes=None):
+    """
+    Événements (salarié, horodatage, sens) de fichiers CSV à en-tête, lus ligne à ligne.
+    :param fichiers: Chemins, "-" pour l'entrée standard
+    :param colonnes: Correspondance des colonnes des fichiers, par défaut COLONNES_BADGEUSE
+    """
+    colonnes = {**COLONNES_BADGEUSE, **(colonnes or {})}
+    for chemin in fichiers:
+        flux = sys.stdin if chemin == "-" else open(chemin, newline="", encoding="utf-8")
+        try:
+            for ligne in csv.DictReader(flux):
+                yield ligne[colonnes["salarie"]], ligne[colonnes["horodatage"]], ligne[colonnes["sens"]]
+        finally:
+            if flux is not sys.stdin:
+                flux.close()
+
+
+def agreger_badgeages(evenements, annee, mois, **options):
+    """
+    Heures d'un mois à partir d'événements de badgeage.
+    :param evenements: Itérable de (salarié, horodatage, sens), par exemple lire_badgeages(fichiers)
+    :param options: debut_nuit, fin_nuit, duree_max (voir AgregateurBadgeages)
+    :return: TimesheetsMois
+    """
+    agregateur = AgregateurBadgeages(annee, mois, **options)
+    for salarie, horodatage, sens in evenements:
+        agregateur.ajouter(salarie, horodatage, sens)
+    return agregateur.resultat()
+
+
+def ecrire_pointages(timesheets, flux):
+    """Écrit les cellules non nulles au format d'import de importer_pointages (COLONNES_EXPORT)."""
+    ecriture = csv.writer(flux)
+    ecriture.writerow([COLONNES_EXPORT[c] for c in ("salarie", "date", "canal", "heures")])
+    jours = timesheets.dates.strftime("%Y-%m-%d")
+    for salarie, heures in zip(timesheets.salaries, timesheets.heures):
+        for jour, canal in zip(*np.nonzero(heures)):
+            ecriture.writerow([salarie, jours[jour], CANAUX_TIMESHEET[canal], repr(float(heures[jour, canal]))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrégation des badgeages en heures journalières")
+    parser.add_argument("annee", type=int)
+    parser.add_argument("mois", type=int)
+    parser.add_argument("fichiers", nargs="*", default=["-"], help="Fichiers CSV d'événements, - pour l'entrée standard")
+    parser.add_argument("-o", "--sortie", default="-")
+    parser.add_argument("--rejets", default=None, help="Fichier CSV des événements écartés")
+    args = parser.parse_args()
+
+    timesheets = agreger_badgeages(lire_badgeages(args.fichiers), args.annee, args.mois)
+    if args.sortie == "-":
+        ecrire_pointages(timesheets, sys.stdout)
+    else:
+        with open(args.sortie, "w", newline="", encoding="utf-8") as flux:
+            ecrire_pointages(timesheets, flux)
+    if len(timesheets.rejets):
+        if args.rejets:
+            timesheets.rejets.to_csv(args.rejets, index=False)
+        print(f"{len(timesheets.rejets)} événement(s) écarté(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
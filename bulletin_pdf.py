@@ -0,0 +1,421 @@
+"""
+Bulletins de paie au format PDF.
+
+Le gabarit (mise en page, polices, logo) est préparé une fois par processus : le logo PNG est
+décodé et compressé, les objets PDF fixes et le fond de page (logo, titre, en-têtes de colonnes)
+sont sérialisés une fois pour toutes ; chaque bulletin n'ajoute que ses textes. Les polices sont
+les polices standard Helvetica des lecteurs PDF (encodage WinAnsi) : aucun fichier à embarquer,
+aucune dépendance hors NumPy.
+
+rendre_bulletins écrit les bulletins d'un effectif par lots dans un pool de processus, chaque PDF
+étant écrit sur disque dès qu'il est rendu.
+"""
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+LOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo_peppers_black.png")
+
+# Lignes toujours affichées, même à zéro (comme le bulletin de l'application)
+MOTS_TOTAUX = ("Sous-total", "Total", "Net", "Salaire")
+
+MOIS = ("janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août",
+        "septembre", "octobre", "novembre", "décembre")
+
+# Chasse des caractères ASCII de Helvetica, en millièmes de corps (métriques AFM standard) ;
+# Helvetica-Bold a les mêmes chasses pour les chiffres et la ponctuation des montants
+CHASSES_HELVETICA = dict(zip(
+    map(chr, range(32, 127)),
+    [278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+     556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+     1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+     667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+     333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+     556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584],
+))
+
+
+@dataclass(frozen=True)
+class MiseEnPage:
+    """Dimensions en points (A4 par défaut) et colonnes du tableau des lignes."""
+    largeur: float = 595.28
+    hauteur: float = 841.89
+    marge: float = 36.0
+    largeur_logo: float = 80.0
+    taille_titre: float = 14.0
+    taille_texte: float = 8.0
+    interligne: float = 12.0
+    # Hauteur réservée en haut de page au logo, au titre et aux identités entreprise / salarié
+    hauteur_entete: float = 170.0
+    # (colonne des lignes, intitulé, bord droit) des colonnes numériques, alignées à droite
+    colonnes: tuple = (
+        ("Base", "Base", 330.0),
+        ("Taux (%)", "Taux (%)", 390.0),
+        ("Total (€)", "Part salarié (€)", 475.0),
+        ("Part_Employeur", "Part employeur (€)", 559.0),
+    )
+
+    @property
+    def haut_tableau(self):
+        return self.hauteur - self.hauteur_entete
+
+    @property
+    def lignes_par_page(self):
+        # Une ligne d'en-tête de colonnes et le pied de page sous le tableau
+        return int((self.haut_tableau - 2 * self.interligne - self.marge - 2 * self.interligne) // self.interligne)
+
+
+# =============================================================================
+# Logo : décodage d'un PNG 8 bits non entrelacé
+# =============================================================================
+def _defiltrer_sequentiel(ligne, precedente, bpp, filtre):
+    """Filtres PNG Average (3) et Paeth (4), qui dépendent de l'octet voisin déjà décodé."""
+    ligne, precedente = ligne.tolist(), precedente.tolist()
+    courante = [0] * len(ligne)
+    for i, x in enumerate(ligne):
+        a = courante[i - bpp] if i >= bpp else 0
+        b = precedente[i]
+        if filtre == 3:
+            courante[i] = (x + (a + b) // 2) & 0xFF
+            continue
+        c = precedente[i - bpp] if i >= bpp else 0
+        p = a + b - c
+        pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+        courante[i] = (x + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+    return np.array(courante, dtype=np.uint8)
+
+
+def _defiltrer(lignes, filtres, bpp):
+    pixels = np.empty_like(lignes)
+    precedente = np.zeros(lignes.shape[1], dtype=np.uint8)
+    for y, (ligne, filtre) in enumerate(zip(lignes, filtres)):
+        if filtre == 0:
+            courante = ligne
+        elif filtre == 1:
+            # Sub : somme cumulée, modulo 256, de chaque canal le long de la ligne
+            courante = np.cumsum(ligne.reshape(-1, bpp), axis=0, dtype=np.uint8).ravel()
+        elif filtre == 2:
+            courante = ligne + precedente
+        elif filtre in (3, 4):
+            courante = _defiltrer_sequentiel(ligne, precedente, bpp, filtre)
+        else:
+            raise ValueError(f"Filtre PNG inconnu : {filtre}")
+        pixels[y] = courante
+        precedente = pixels[y]
+    return pixels
+
+
+def lire_png(chemin):
+    """
+    Pixels d'un PNG 8 bits non entrelacé (gris, RVB, avec ou sans transparence).
+    :return: (couleurs (hauteur, largeur, composantes) en uint8, transparence (hauteur, largeur) ou None)
+    """
+    with open(chemin, "rb") as f:
+        donnees = f.read()
+    if donnees[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError(f"{chemin} n'est pas un fichier PNG")
+
+    position, idat = 8, []
+    while position < len(donnees):
+        longueur, nature = struct.unpack(">I4s", donnees[position:position + 8])
+        corps = donnees[position + 8:position + 8 + longueur]
+        if nature == b"IHDR":
+            largeur, hauteur, profondeur, couleur, _, _, entrelacement = struct.unpack(">IIBBBBB", corps)
+        elif nature == b"IDAT":
+            idat.append(corps)
+        elif nature == b"IEND":
+            break
+        position += 12 + longueur
+
+    composantes = {0: 1, 2: 3, 4: 2, 6: 4}.get(couleur)
+    if profondeur != 8 or entrelacement or composantes is None:
+        raise ValueError(f"PNG non pris en charge (profondeur {profondeur}, type {couleur}, entrelacé {entrelacement})")
+    brut = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8).reshape(hauteur, 1 + largeur * composantes)
+    pixels = _defiltrer(brut[:, 1:], brut[:, 0], composantes).reshape(hauteur, largeur, composantes)
+    if composantes in (2, 4):
+        return pixels[..., :-1], pixels[..., -1]
+    return pixels, None
+
+
+# =============================================================================
+# Écriture PDF
+# =============================================================================
+def _texte_pdf(texte):
+    """Chaîne littérale PDF encodée en WinAnsi (cp1252)."""
+    octets = str(texte).encode("cp1252", errors="replace")
+    return b"(" + octets.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _largeur(texte, taille):
+    return sum(CHASSES_HELVETICA.get(c, 556) for c in texte) * taille / 1000
+
+
+def _tronquer(texte, taille, largeur_max):
+    while texte and _largeur(texte, taille) > largeur_max:
+        texte = texte[:-1]
+    return texte
+
+
+def _objet(numero, corps):
+    return b"%d 0 obj\n" % numero + corps + b"\nendobj\n"
+
+
+def _flux(dictionnaire, donnees):
+    return b"<<" + dictionnaire + b" /Filter /FlateDecode /Length %d>>\nstream\n" % len(donnees) + donnees + b"\nendstream"
+
+
+def _nombre(valeur):
+    """Montant d'une cellule du bulletin (chaîne formatée, nombre ou vide) ; None si vide."""
+    if isinstance(valeur, str):
+        try:
+            valeur = float(valeur)
+        except ValueError:
+            return None
+    if valeur is None or valeur != valeur:
+        return None
+    return float(valeur)
+
+
+def _format_montant(valeur):
+    nombre = _nombre(valeur)
+    if nombre is None:
+        return ""
+    return f"{nombre:,.2f}".replace(",", " ").replace(".", ",")
+
+
+def lignes_affichees(lignes):
+    """
+    Lignes d'un bulletin (DataFrame ou liste de dictionnaires au format d'ajouter_sous_totaux) à
+    imprimer : celles dont la part salarié ou la part employeur est non nulle, et les totaux.
+    """
+    if isinstance(lignes, pd.DataFrame):
+        lignes = lignes.to_dict(orient="records")
+    return [
+        ligne for ligne in lignes
+        if _nombre(ligne.get("Total (€)")) or _nombre(ligne.get("Part_Employeur"))
+        or any(mot in str(ligne.get("Catégorie", "")) for mot in MOTS_TOTAUX)
+    ]
+
+
+def libelle_periode(periode):
+    periode = pd.Timestamp(periode)
+    return f"{MOIS[periode.month - 1]} {periode.year}"
+
+
+# Numéros des objets PDF : fixes (préparés par le gabarit) puis, par document, le catalogue,
+# l'arbre des pages et pour chaque page son objet et son contenu
+CATALOGUE, PAGES, POLICE, POLICE_GRASSE, LOGO_IMAGE, LOGO_MASQUE, FOND = range(1, 8)
+PREMIERE_PAGE = 8
+
+
+class GabaritBulletin:
+    """
+    Gabarit d'un bulletin : objets PDF communs à tous les bulletins (polices, logo, fond de page)
+    sérialisés à la construction. rendre et ecrire ne produisent plus que les textes du bulletin.
+    """
+
+    def __init__(self, mise_en_page=MiseEnPage(), logo=LOGO):
+        self.mise_en_page = m = mise_en_page
+        couleurs, masque = lire_png(logo)
+        hauteur_logo, largeur_logo = couleurs.shape[:2]
+        espace = b"/DeviceRGB" if couleurs.shape[2] == 3 else b"/DeviceGray"
+        image = b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s /BitsPerComponent 8" % (
+            largeur_logo, hauteur_logo, espace)
+
+        fixes = [
+            (POLICE, b"<</Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding>>"),
+            (POLICE_GRASSE, b"<</Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding>>"),
+            (LOGO_IMAGE, _flux(image + (b" /SMask %d 0 R" % LOGO_MASQUE if masque is not None else b""),
+                               zlib.compress(couleurs.tobytes(), 9))),
+        ]
+        if masque is not None:
+            fixes.append((LOGO_MASQUE, _flux(
+                b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray /BitsPerComponent 8" % (
+                    largeur_logo, hauteur_logo), zlib.compress(masque.tobytes(), 9))))
+        self._polices = b"/Font <</F1 %d 0 R /F2 %d 0 R>>" % (POLICE, POLICE_GRASSE)
+        fixes.append((FOND, _flux(
+            b"/Type /XObject /Subtype /Form /BBox [0 0 %.2f %.2f] /Resources <<%s /XObject <</Logo %d 0 R>>>>" % (
+                m.largeur, m.hauteur, self._polices, LOGO_IMAGE),
+            zlib.compress(self._contenu_fond(largeur_logo, hauteur_logo)))))
+
+        self._entete = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self._positions_fixes = {}
+        morceaux = []
+        position = len(self._entete)
+        for numero, corps in fixes:
+            objet = _objet(numero, corps)
+            self._positions_fixes[numero] = position
+            position += len(objet)
+            morceaux.append(objet)
+        self._objets_fixes = b"".join(morceaux)
+        self._ressources_page = b"<<%s /XObject <</Fond %d 0 R>>>>" % (self._polices, FOND)
+
+    def _contenu_fond(self, largeur_logo, hauteur_logo):
+        m = self.mise_en_page
+        hauteur_affichee = m.largeur_logo * hauteur_logo / largeur_logo
+        haut = m.hauteur - m.marge
+        fond = [
+            b"q %.2f 0 0 %.2f %.2f %.2f cm /Logo Do Q" % (m.largeur_logo, hauteur_affichee, m.marge, haut - hauteur_affichee),
+            b"BT /F2 %.2f Tf 1 0 0 1 %.2f %.2f Tm %s Tj ET" % (
+                m.taille_titre, m.marge + m.largeur_logo + 20, haut - m.taille_titre, _texte_pdf("BULLETIN DE PAIE")),
+        ]
+        # En-têtes de colonnes et filets du tableau
+        y = m.haut_tableau - m.interligne
+        fond.append(b"BT /F2 %.2f Tf 1 0 0 1 %.2f %.2f Tm %s Tj" % (m.taille_texte, m.marge, y, _texte_pdf("Rubrique")))
+        for _, intitule, droite in m.colonnes:
+            fond.append(b"1 0 0 1 %.2f %.2f Tm %s Tj" % (droite - _largeur(intitule, m.taille_texte), y, _texte_pdf(intitule)))
+        fond.append(b"ET")
+        for y_filet in (m.haut_tableau, y - m.interligne / 3):
+            fond.append(b"0.5 w %.2f %.2f m %.2f %.2f l S" % (m.marge, y_filet, m.largeur - m.marge, y_filet))
+        return b"\n".join(fond)
+
+    def _contenu_page(self, lignes, salarie, periode, numero_page, nombre_pages):
+        m = self.mise_en_page
+        entreprise = salarie.entreprise
+        t = m.taille_texte
+        contenu = [b"q /Fond Do Q", b"BT"]
+
+        def texte(x, y, valeur, police=b"F1", taille=t):
+            contenu.append(b"/%s %.2f Tf 1 0 0 1 %.2f %.2f Tm %s Tj" % (police, taille, x, y, _texte_pdf(valeur)))
+
+        # Identités de l'entreprise et du salarié, période
+        x_titre = m.marge + m.largeur_logo + 20
+        haut = m.hauteur - m.marge
+        texte(x_titre, haut - m.taille_titre - 2 * m.interligne, f"Période : {libelle_periode(periode)}", b"F2")
+        y = m.haut_tableau + 5 * m.interligne
+        colonne_salarie = m.largeur / 2
+        if entreprise is not None:
+            texte(m.marge, y, entreprise.nom, b"F2")
+            texte(m.marge, y - m.interligne, entreprise.adresse)
+            texte(m.marge, y - 2 * m.interligne, f"SIRET : {entreprise.siret}")
+        texte(colonne_salarie, y, f"{salarie.prenom} {salarie.nom}", b"F2")
+        texte(colonne_salarie, y - m.interligne, f"N° de sécurité sociale : {salarie.numero_ss}")
+        texte(colonne_salarie, y - 2 * m.interligne, f"{salarie.contrat} - {salarie.statut}, entré(e) le {salarie.date_entree}")
+
+        # Lignes du bulletin ; les totaux en gras sur fond grisé
+        largeur_rubrique = m.colonnes[0][2] - 60 - m.marge
+        bandes = []
+        y = m.haut_tableau - 2 * m.interligne - m.interligne / 2
+        for ligne in lignes:
+            categorie = str(ligne.get("Catégorie", "")).strip()
+            total = any(mot in categorie for mot in MOTS_TOTAUX)
+            police = b"F2" if total else b"F1"
+            if total:
+                bandes.append(b"0.92 g %.2f %.2f %.2f %.2f re f" % (m.marge, y - 3, m.largeur - 2 * m.marge, m.interligne))
+            texte(m.marge + 2, y, _tronquer(categorie, t, largeur_rubrique), police)
+            for colonne, _, droite in m.colonnes:
+                valeur = _format_montant(ligne.get(colonne))
+                if valeur:
+                    texte(droite - _largeur(valeur, t), y, valeur, police)
+            y -= m.interligne
+
+        pied = f"Page {numero_page}/{nombre_pages}"
+        texte(m.largeur - m.marge - _largeur(pied, t), m.marge, pied)
+        contenu.append(b"ET")
+        # Les bandes grisées sont peintes avant les textes
+        return b"\n".join(contenu[:1] + bandes + [b"0 g"] + contenu[1:])
+
+    def morceaux(self, lignes, salarie, periode):
+        """Octets successifs du PDF d'un bulletin, à écrire tels quels."""
+        lignes = lignes_affichees(lignes)
+        n = self.mise_en_page.lignes_par_page
+        pages = [lignes[i:i + n] for i in range(0, len(lignes), n)] or [[]]
+
+        numeros_pages = [PREMIERE_PAGE + 2 * i for i in range(len(pages))]
+        objets = [
+            (CATALOGUE, b"<</Type /Catalog /Pages %d 0 R>>" % PAGES),
+            (PAGES, b"<</Type /Pages /Kids [%s] /Count %d>>" % (
+                b" ".join(b"%d 0 R" % numero for numero in numeros_pages), len(pages))),
+        ]
+        for i, (numero, lignes_page) in enumerate(zip(numeros_pages, pages)):
+            objets.append((numero, b"<</Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources %s /Contents %d 0 R>>" % (
+                PAGES, self.mise_en_page.largeur, self.mise_en_page.hauteur, self._ressources_page, numero + 1)))
+            contenu = self._contenu_page(lignes_page, salarie, periode, i + 1, len(pages))
+            objets.append((numero + 1, _flux(b"", zlib.compress(contenu))))
+
+        morceaux = [self._entete, self._objets_fixes]
+        positions = dict(self._positions_fixes)
+        position = len(self._entete) + len(self._objets_fixes)
+        for numero, corps in objets:
+            objet = _objet(numero, corps)
+            positions[numero] = position
+            position += len(objet)
+            morceaux.append(objet)
+
+        # Les numéros sans objet (masque d'un logo sans transparence) sont des entrées libres,
+        # chaînées à partir de l'objet 0
+        taille = max(positions) + 1
+        libres = [numero for numero in range(1, taille) if numero not in positions]
+        suivant_libre = dict(zip([0] + libres, libres + [0]))
+        table = [b"xref\n0 %d\n" % taille]
+        table += [b"%010d 00000 n \n" % positions[numero] if numero in positions
+                  else b"%010d 65535 f \n" % suivant_libre[numero] for numero in range(taille)]
+        table.append(b"trailer\n<</Size %d /Root %d 0 R>>\nstartxref\n%d\n%%%%EOF\n" % (taille, CATALOGUE, position))
+        morceaux.append(b"".join(table))
+        return morceaux
+
+    def rendre(self, lignes, salarie, periode):
+        """PDF d'un bulletin, en octets."""
+        return b"".join(self.morceaux(lignes, salarie, periode))
+
+    def ecrire(self, chemin, lignes, salarie, periode):
+        """Écrit le PDF d'un bulletin (fichier temporaire puis renommage) et renvoie son chemin."""
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, "wb") as f:
+            f.writelines(self.morceaux(lignes, salarie, periode))
+        os.replace(temporaire, chemin)
+        return chemin
+
+
+@lru_cache(maxsize=None)
+def gabarit(mise_en_page=MiseEnPage(), logo=LOGO):
+    """Gabarit du processus : construit au premier appel, puis partagé par tous les bulletins."""
+    return GabaritBulletin(mise_en_page, logo)
+
+
+def _rendre_lot(lot, dossier, mise_en_page):
+    g = gabarit(mise_en_page)
+    return [g.ecrire(os.path.join(dossier, nom), lignes, salarie, periode) for nom, salarie, periode, lignes in lot]
+
+
+def _initialiser_worker(mise_en_page):
+    # Prépare le gabarit (logo, polices, fond de page) une fois par processus
+    gabarit(mise_en_page)
+
+
+def rendre_bulletins(bulletins, dossier, workers=None, taille_lot=64, mise_en_page=MiseEnPage()):
+    """
+    Écrit un PDF par bulletin dans `dossier`, par lots répartis sur un pool de processus.
+
+    :param bulletins: Itérable de (nom du fichier, Salarie, période, lignes d'ajouter_sous_totaux),
+        consommé au fil de l'eau : seuls quelques lots par worker sont en mémoire à la fois
+    :param workers: Nombre de processus (par défaut, un par cœur) ; 1 rend dans le processus courant
+    :return: Chemins des PDF écrits, dans l'ordre des bulletins
+    """
+    os.makedirs(dossier, exist_ok=True)
+    bulletins = iter(bulletins)
+    lots = iter(lambda: list(islice(bulletins, taille_lot)), [])
+    workers = workers or os.cpu_count()
+    chemins = []
+    if workers == 1:
+        for lot in lots:
+            chemins += _rendre_lot(lot, dossier, mise_en_page)
+        return chemins
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initialiser_worker, initargs=(mise_en_page,)) as pool:
+        en_cours = deque()
+        for lot in lots:
+            en_cours.append(pool.submit(_rendre_lot, lot, dossier, mise_en_page))
+            if len(en_cours) >= 2 * workers:
+                chemins += en_cours.popleft().result()
+        while en_cours:
+            chemins += en_cours.popleft().result()
+    return chemins
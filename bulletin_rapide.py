@@ -0,0 +1,233 @@
+"""
+Calcul d'un bulletin sans pandas.
+
+Produit exactement les mêmes lignes que calculer_bulletin, à partir de tableaux NumPy (un par
+canal de la timesheet) et de scalaires : pas de resample, de pd.to_datetime ni de DataFrame
+intermédiaire. Les lignes sont construites par les mêmes fonctions rubriques_* que le calcul
+pandas ; seules les sommes sont refaites ici, dans le même ordre que pandas pour que les montants
+arrondis soient identiques au centime.
+
+Avec centimes=True (moteur "centimes" de calculer_bulletin), les lignes de rémunération sont
+arrondies au centime et la suite du bulletin est calculée en centimes entiers (paie_centimes).
+"""
+
+import numpy as np
+import pandas as pd
+
+from paie_centimes import formater, rubriques_bulletin_centimes
+from parametres_entreprise import parametres_entreprise
+from payroll import (
+    calcul_avantages_en_nature,
+    calcul_cotisations,
+    calcul_primes_du_mois,
+    calcul_taxe_progressive,
+    calculer_reduction_fillon,
+    exoneration_heures_sup,
+    montant_net_social,
+    net_a_payer,
+    net_imposable,
+    reduction_tepa_par_heure,
+    rubriques_absences_maladie,
+    rubriques_cotisations,
+    rubriques_heures_sup,
+    rubriques_majorations,
+    rubriques_primes_et_avantages,
+    rubriques_reductions,
+    rubriques_salaire_de_base,
+    rubriques_sous_totaux,
+    rubriques_transport_et_repas,
+)
+
+COLONNES_BULLETIN = ["Catégorie", "Base", "Taux (%)", "Total (€)", "Part_Employeur"]
+COLONNES_MONTANTS = ("Total (€)", "Part_Employeur")
+
+CONTRAT = "heures contractuelles"
+REELLES = "heures réelles normales"
+NUIT = "heures de nuit"
+DIMANCHE = "heures de dimanche"
+RTT = "absence rémunérée RTT"
+CP = "absence rémunérée congé payé"
+JF_R = "absence rémunérée jour férié"
+JF_NR = "absence non rémunérée jour férié"
+
+# Canaux lus par le calcul, et ceux que merge_overlapping_days complète avec le mois précédent
+CANAUX_UTILES = [CONTRAT, REELLES, NUIT, DIMANCHE, RTT, CP, JF_R, JF_NR]
+CANAUX_FUSIONNES = [CONTRAT, REELLES, RTT, CP, JF_R]
+
+
+def jours_de_l_index(index):
+    """Dates d'un index de timesheet (chaînes "AAAA-MM-JJ" ou dates) en datetime64[D]."""
+    if isinstance(index, pd.DatetimeIndex):
+        return index.values.astype("datetime64[D]")
+    return np.array(list(index), dtype="datetime64[D]")
+
+
+def _debut_du_mois(jour):
+    return jour.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def _somme_pandas(valeurs):
+    """Somme d'une colonne comme pandas : valeurs non numériques comptées 0, sommation NumPy."""
+    return np.array([v if isinstance(v, (int, float, np.number)) else 0.0 for v in valeurs], dtype=float).sum()
+
+
+def heures_majorees_tableaux(jours, canaux, dans_le_mois=None):
+    """
+    Équivalent de heures_majorees : heures supplémentaires cumulées par semaine du lundi au
+    dimanche (dernière semaine exclue si le dernier jour n'est ni un vendredi, ni un samedi, ni un
+    dimanche), heures de nuit et de dimanche des jours du mois, agrégées en un seul bincount.
+    :param dans_le_mois: Jours du mois de paie (par défaut, ceux du mois du dernier jour)
+    :return: (hs25, hs50, heures de nuit, heures de dimanche)
+    """
+    if dans_le_mois is None:
+        dans_le_mois = jours >= _debut_du_mois(jours.max())
+    heures_sup = (canaux[REELLES] - canaux[CONTRAT]
+                  + (canaux[RTT] + canaux[CP] + canaux[JF_R]) * canaux[CONTRAT])
+    # Le 1970-01-01 (jour 0) est un jeudi : le lundi précédent est le jour -3
+    semaines = (jours.astype(np.int64) + 3) // 7
+    semaines = semaines - semaines.min()
+    nb_semaines = semaines.max() + 1
+    # Une ligne de semaines par grandeur : heures supplémentaires, de nuit, de dimanche
+    sommes = np.bincount(
+        np.concatenate([semaines, semaines + nb_semaines, semaines + 2 * nb_semaines]),
+        weights=np.concatenate([heures_sup, np.where(dans_le_mois, canaux[NUIT], 0), np.where(dans_le_mois, canaux[DIMANCHE], 0)]),
+        minlength=3 * nb_semaines,
+    ).reshape(3, nb_semaines)
+    par_semaine = sommes[0]
+    if (jours.max().astype(np.int64) + 3) % 7 not in (4, 5, 6):
+        par_semaine = par_semaine[:-1]
+
+    total_25 = 0
+    total_50 = 0
+    for hs_semaine in par_semaine.tolist():
+        total_25 += min(hs_semaine, 8)
+        total_50 += max(hs_semaine - 8, 0)
+    return total_25, total_50, sommes[1].sum(), sommes[2].sum()
+
+
+def heures_sup_tableaux(jours, canaux):
+    """Équivalent de calcul_hs (voir heures_majorees_tableaux)."""
+    return heures_majorees_tableaux(jours, canaux)[:2]
+
+
+def _jours_travailles(jours, reelles):
+    return int((reelles[jours >= _debut_du_mois(jours.min())] != 0).sum())
+
+
+def bulletin_depuis_tableaux(salarie, avantages, primes, jours, canaux, jours_prec=None, canaux_prec=None,
+                             absence_motifs=None, periode_primes=None, en_dataframe=True, avec_brut=False,
+                             centimes=False):
+    """
+    Calcule le bulletin d'un mois à partir de tableaux.
+
+    :param jours: Dates de la timesheet combinée du mois (datetime64[D], triées)
+    :param canaux: {colonne de la timesheet: tableau d'heures aligné sur jours}
+    :param jours_prec: Dates de la timesheet du mois précédent dont les heures complètent la semaine
+        à cheval, ou None (pas de fusion, comme lorsque son index n'est pas fait de dates)
+    :param canaux_prec: Canaux du mois précédent alignés sur jours_prec
+    :param en_dataframe: False pour obtenir la liste des lignes (dictionnaires) sans construire de DataFrame
+    :param avec_brut: True pour renvoyer (lignes, salaire brut non arrondi)
+    :param centimes: True pour calculer le bulletin en centimes entiers (voir rubriques_bulletin_centimes) ;
+        le salaire brut renvoyé est alors la somme des lignes arrondies
+    :return: Lignes identiques à celles de calculer_bulletin ; le salarié n'est pas modifié
+    """
+    absence_motifs = absence_motifs or {}
+    debut_mois = _debut_du_mois(jours.max())
+    periode = pd.Timestamp(debut_mois)
+    dans_le_mois = jours >= debut_mois
+
+    lignes = rubriques_salaire_de_base(salarie, *(canaux[c][dans_le_mois].sum() for c in (RTT, CP, JF_R, JF_NR)))
+    lignes += rubriques_absences_maladie(salarie, absence_motifs, periode)
+
+    mois_primes = pd.Timestamp(periode_primes).month if periode_primes is not None else int(str(jours.min())[5:7])
+    toutes_primes = calcul_primes_du_mois(salarie, primes, mois_primes,
+                                          pd.Timestamp(periode_primes) if periode_primes is not None else None)
+    avantage_nature = calcul_avantages_en_nature(salarie, avantages, None, periode=periode,
+                                                 jours_travailles_mois=_jours_travailles(jours, canaux[REELLES]))
+    lignes += rubriques_primes_et_avantages(toutes_primes, avantage_nature)
+
+    # Seuls les CANAUX_FUSIONNES sont complétés ; les heures de nuit et de dimanche ne comptent que les jours du mois
+    fusionnes = {c: canaux[c] for c in CANAUX_UTILES}
+    if jours_prec is not None and len(jours_prec):
+        communs, i, j = np.intersect1d(jours, jours_prec, return_indices=True)
+        if len(communs):
+            for c in CANAUX_FUSIONNES:
+                fusionnes[c] = fusionnes[c].astype(float)
+                fusionnes[c][i] += canaux_prec[c][j]
+    hs25, hs50, heures_nuit, heures_dimanche = heures_majorees_tableaux(jours, fusionnes, dans_le_mois)
+    lignes += rubriques_heures_sup(salarie, hs25, hs50)
+    lignes += rubriques_majorations(salarie, heures_nuit, heures_dimanche)
+
+    resto = calcul_avantages_en_nature(salarie, avantages, None, jours_travailles_mois=_jours_travailles(jours, fusionnes[REELLES]))
+    resto = resto["Détail des avantages"].get("nourriture", 0)
+    if centimes:
+        lignes, brut_centimes = rubriques_bulletin_centimes(salarie, lignes, periode, hs25, hs50, resto)
+        salaire_brut = brut_centimes / 100
+    else:
+        salaire_brut = _somme_pandas([ligne["Total (€)"] for ligne in lignes])
+        brut = float(salaire_brut)
+        debut_brut = len(lignes)
+        lignes.append({"Catégorie": "Salaire Brut", "Base": "", "Taux (%)": "", "Total (€)": salaire_brut})
+
+        lignes += rubriques_cotisations(salarie, brut, periode)
+        fillon_urssaf, fillon_retraite = calculer_reduction_fillon(salarie, None, periode, brut)
+        exoneration = exoneration_heures_sup(salarie, hs25, hs50)
+        lignes += rubriques_reductions(fillon_urssaf, fillon_retraite,
+                                       reduction_tepa_par_heure(hs25 + hs50, parametres_entreprise(salarie.entreprise).tepa_par_heure), exoneration)
+        lignes.append({"Catégorie": "Salaire Net Avant Impôts", "Base": "", "Taux (%)": "",
+                       "Total (€)": _somme_pandas([ligne["Total (€)"] for ligne in lignes[debut_brut:]]), "Part_Employeur": ""})
+
+        lignes += rubriques_transport_et_repas(salarie, resto)
+
+        cotisations = calcul_cotisations(salarie, periode, brut)
+        net_impos = net_imposable(salarie, periode, brut)
+        lignes += rubriques_sous_totaux(
+            montant_net_social(salarie, cotisations, None, periode=periode, exoneration=exoneration, salaire_brut=brut),
+            net_impos,
+            calcul_taxe_progressive(net_impos),
+            net_a_payer(salarie, periode, brut),
+        )
+        lignes.append({"Catégorie": "Sous-total Cotisations Patronales", "Base": "", "Taux (%)": "", "Total (€)": "",
+                       "Part_Employeur": -_somme_pandas([ligne.get("Part_Employeur") for ligne in lignes])})
+
+    formater_montant = _formater_centimes if centimes else _formater
+    formatees = [
+        {colonne: (ligne.get(colonne, "") if colonne == "Catégorie"
+                   else formater_montant(ligne.get(colonne)) if colonne in COLONNES_MONTANTS
+                   else _formater(ligne.get(colonne)))
+         for colonne in COLONNES_BULLETIN}
+        for ligne in lignes
+    ]
+    if en_dataframe:
+        formatees = pd.DataFrame({colonne: [ligne[colonne] for ligne in formatees] for colonne in COLONNES_BULLETIN})
+    return (formatees, salaire_brut) if avec_brut else formatees
+
+
+def _formater(valeur):
+    if isinstance(valeur, (int, float, np.number)) and not isinstance(valeur, bool) and valeur == valeur:
+        return f"{float(valeur):.2f}"
+    return ""
+
+
+def _formater_centimes(valeur):
+    if isinstance(valeur, (int, np.integer)) and not isinstance(valeur, bool):
+        return formater(valeur)
+    return ""
+
+
+def canaux_de_timesheet(timesheet):
+    """Dates et canaux utiles d'une timesheet combinée, en tableaux."""
+    return jours_de_l_index(timesheet.index), {c: timesheet[c].to_numpy() for c in CANAUX_UTILES}
+
+
+def bulletin_rapide(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs=None,
+                    periode_primes=None, en_dataframe=True, avec_brut=False, centimes=False):
+    """
+    Même signature et mêmes lignes que calculer_bulletin, sans passer par pandas pour le calcul.
+    Ni le salarié ni les timesheets fournies ne sont modifiés.
+    centimes=True calcule le bulletin en centimes entiers, lignes de rémunération comprises.
+    """
+    jours, canaux = canaux_de_timesheet(timesheet)
+    jours_prec, canaux_prec = canaux_de_timesheet(timesheet_prec)
+    return bulletin_depuis_tableaux(salarie, avantages, primes, jours, canaux, jours_prec, canaux_prec,
+                                    absence_motifs, periode_primes, en_dataframe, avec_brut, centimes)
@@ -0,0 +1,160 @@
+import dataclasses
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from parametres import baremes, registre
+from payroll import calculer_bulletin, periode_de_paie
+
+# A incrémenter à chaque modification des règles de calcul pour invalider les bulletins stockés
+VERSION_CALCUL = 5
+
+REPERTOIRE_CACHE = ".cache_bulletins"
+TAILLE_MAX_CACHE = 256 * 1024 * 1024  # 256 Mo
+
+
+def _empreinte_timesheet(h, timesheet):
+    """Ajoute à l'empreinte les dates, les colonnes et les valeurs de la timesheet combinée."""
+    dates = pd.to_datetime(timesheet.index).strftime("%Y-%m-%d")
+    h.update("|".join(dates).encode())
+    h.update("|".join(map(str, timesheet.columns)).encode())
+    h.update(np.ascontiguousarray(timesheet.to_numpy(dtype=np.float64)).tobytes())
+
+
+def cle_bulletin(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs=None, periode_primes=None,
+                 centimes=False):
+    """
+    Calcule une clé stable (SHA-256) à partir de toutes les entrées du bulletin :
+    champs du salarié et de l'entreprise, timesheets, avantages, primes, motifs d'absence, mois
+    imposé aux primes et paramètres et barèmes réglementaires en vigueur pour la période (dont
+    les SMIC des douze mois de la réduction Fillon), et du calcul en centimes entiers ou non.
+    """
+    champs_salarie = dataclasses.asdict(salarie)
+    # Le salaire brut est un résultat du calcul, pas une entrée
+    champs_salarie.pop("salaire_brut", None)
+    periode = periode_de_paie(timesheet)
+
+    entrees = {
+        "version": VERSION_CALCUL,
+        "salarie": champs_salarie,
+        "avantages": avantages,
+        "primes": primes,
+        "absence_motifs": absence_motifs or {},
+        "periode_primes": None if periode_primes is None else str(pd.Timestamp(periode_primes).date()),
+        "parametres": registre().signature(periode),
+        "smics": registre().douze_derniers("SMIC", periode),
+        "baremes": baremes().signature(periode),
+        "centimes": centimes,
+    }
+    h = hashlib.sha256()
+    h.update(json.dumps(entrees, sort_keys=True, default=str, ensure_ascii=False).encode())
+    _empreinte_timesheet(h, timesheet)
+    _empreinte_timesheet(h, timesheet_prec)
+    return h.hexdigest()
+
+
+class CacheBulletins:
+    """
+    Cache disque des bulletins calculés, adressé par le contenu des entrées.
+    Chaque bulletin est un fichier JSON (lignes et salaire brut non arrondi) ; la taille totale est
+    bornée et les bulletins les moins récemment utilisés sont supprimés en premier. Plusieurs
+    processus peuvent partager le répertoire : un bulletin écrit par un autre processus est relu.
+    """
+
+    def __init__(self, repertoire=REPERTOIRE_CACHE, taille_max=TAILLE_MAX_CACHE):
+        self.repertoire = repertoire
+        self.taille_max = taille_max
+        os.makedirs(repertoire, exist_ok=True)
+
+        # cle -> taille du fichier, du moins récemment utilisé au plus récent
+        self._index = OrderedDict()
+        fichiers = []
+        for nom in os.listdir(repertoire):
+            if nom.endswith(".json"):
+                stat = os.stat(os.path.join(repertoire, nom))
+                fichiers.append((stat.st_mtime, nom[:-5], stat.st_size))
+        for _, cle, taille in sorted(fichiers):
+            self._index[cle] = taille
+        self.taille = sum(self._index.values())
+        self.hits = 0
+        self.misses = 0
+
+    def _chemin(self, cle):
+        return os.path.join(self.repertoire, f"{cle}.json")
+
+    def lire(self, cle):
+        """(lignes, salaire brut) du bulletin stocké sous la clé, None s'il est absent."""
+        chemin = self._chemin(cle)
+        try:
+            with open(chemin, encoding="utf-8") as f:
+                contenu = json.load(f)
+        except FileNotFoundError:
+            # Jamais écrit, ou supprimé par un autre processus
+            if cle in self._index:
+                self.taille -= self._index.pop(cle)
+            self.misses += 1
+            return None
+        os.utime(chemin)
+        if cle not in self._index:
+            self._index[cle] = os.path.getsize(chemin)
+            self.taille += self._index[cle]
+        self._index.move_to_end(cle)
+        self.hits += 1
+        return contenu["lignes"], contenu["salaire_brut"]
+
+    def ecrire(self, cle, lignes, salaire_brut):
+        chemin = self._chemin(cle)
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, "w", encoding="utf-8") as f:
+            json.dump({"lignes": lignes, "salaire_brut": float(salaire_brut)}, f, ensure_ascii=False)
+        os.replace(temporaire, chemin)
+
+        if cle in self._index:
+            self.taille -= self._index[cle]
+        self._index[cle] = os.path.getsize(chemin)
+        self._index.move_to_end(cle)
+        self.taille += self._index[cle]
+        self._evincer()
+
+    def _evincer(self):
+        while self.taille > self.taille_max and len(self._index) > 1:
+            cle, taille = self._index.popitem(last=False)
+            self.taille -= taille
+            try:
+                os.remove(self._chemin(cle))
+            except FileNotFoundError:
+                pass
+
+
+def bulletin_en_cache(cache, salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs=None,
+                      periode_primes=None, moteur="pandas", en_dataframe=True, avec_brut=False):
+    """
+    Renvoie le bulletin depuis le cache si les entrées n'ont pas changé, sinon le calcule et le stocke.
+    Les moteurs pandas et numpy donnant les mêmes lignes, un bulletin stocké par l'un est relu par
+    l'autre ; ceux du moteur centimes ont leurs propres clés.
+    Mêmes arguments et même résultat que calculer_bulletin ; en_dataframe=False renvoie la liste
+    des lignes (dictionnaires), comme bulletin_rapide.
+    """
+    cle = cle_bulletin(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs, periode_primes,
+                       moteur == "centimes")
+    stocke = cache.lire(cle)
+    if stocke is not None:
+        lignes, salaire_brut = stocke
+    else:
+        if moteur in ("numpy", "centimes"):
+            from bulletin_rapide import bulletin_rapide
+            lignes, salaire_brut = bulletin_rapide(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs,
+                                                   periode_primes, en_dataframe=False, avec_brut=True,
+                                                   centimes=moteur == "centimes")
+        else:
+            df, salaire_brut = calculer_bulletin(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs,
+                                                 periode_primes, moteur=moteur, avec_brut=True)
+            lignes = df.to_dict(orient="records")
+        cache.ecrire(cle, lignes, salaire_brut)
+
+    bulletin = pd.DataFrame(lignes) if en_dataframe else lignes
+    return (bulletin, salaire_brut) if avec_brut else bulletin
@@ -0,0 +1,88 @@
+"""
+Test de charge concurrent du calcul de bulletin.
+
+    python concurrence_bulletins.py [--scenario 010] [--appels 200] [--threads 16]
+
+Le même salarié, un scénario du corpus de bulletins, est calculé `appels` fois sur `threads`
+threads avec chaque moteur. Tous les appels partagent les mêmes objets d'entrée : aucun ne doit
+modifier le salarié, les timesheets, les avantages, les primes ni les motifs d'absence, et tous
+doivent renvoyer le bulletin calculé seul au préalable. Les timesheets sont passées indexées par
+chaînes "AAAA-MM-JJ" (combine_timesheets, service de paie, corpus) puis par dates.
+"""
+import argparse
+import copy
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from corpus_bulletins import charger_corpus, entrees_scenario
+from parametres import registre
+from payroll import MOTEURS, calculer_bulletin, timesheet_en_dates
+
+# Scénario par défaut : janvier 2025 avec heures de décembre, arrêt maladie, primes et avantages
+SCENARIO = "010"
+NOMS_ENTREES = ["salarie", "avantages", "primes", "timesheet", "timesheet_prec", "absence_motifs", "periode_primes"]
+
+
+def _identiques(a, b):
+    if hasattr(a, "equals"):
+        return (a.equals(b) and a.index.equals(b.index) and type(a.index) is type(b.index)
+                and list(a.columns) == list(b.columns))
+    return a == b
+
+
+def entrees_modifiees(entrees, temoins):
+    """Noms des entrées qui ne sont plus égales à leurs copies témoins."""
+    return [nom for nom, valeur, temoin in zip(NOMS_ENTREES, entrees, temoins) if not _identiques(valeur, temoin)]
+
+
+def stresser(entrees, moteur, appels, threads):
+    """
+    Calcule `appels` fois le même bulletin en parallèle, sur les mêmes objets d'entrée.
+    :return: (nombre d'appels en erreur ou au bulletin différent du calcul de référence,
+              entrées modifiées, durée en secondes)
+    """
+    temoins = copy.deepcopy(entrees)
+    reference = calculer_bulletin(*copy.deepcopy(entrees), moteur=moteur)
+
+    def calculer(_):
+        try:
+            return calculer_bulletin(*entrees, moteur=moteur)
+        except Exception as e:
+            return e
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        bulletins = list(pool.map(calculer, range(appels)))
+    duree = time.perf_counter() - debut
+    differents = sum(isinstance(bulletin, Exception) or not bulletin.equals(reference) for bulletin in bulletins)
+    return differents, entrees_modifiees(entrees, temoins), duree
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge concurrent du calcul de bulletin")
+    parser.add_argument("--scenario", default=SCENARIO, help="Identifiant du scénario du corpus")
+    parser.add_argument("--appels", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    demande = next((s["demande"] for s in charger_corpus() if s["scenario"] == args.scenario), None)
+    if demande is None:
+        parser.error(f"Scénario inconnu : {args.scenario}")
+    registre()
+
+    echec = False
+    for index in ("chaînes", "dates"):
+        for moteur in MOTEURS:
+            entrees = list(entrees_scenario(demande))
+            if index == "dates":
+                entrees[3], entrees[4] = timesheet_en_dates(entrees[3]), timesheet_en_dates(entrees[4])
+            differents, modifiees, duree = stresser(entrees, moteur, args.appels, args.threads)
+            echec |= bool(differents or modifiees)
+            print(f"{moteur:8} index {index:7} : {args.appels} appels sur {args.threads} threads en {duree:.2f} s, "
+                  f"{differents} bulletin(s) en erreur ou différent(s), entrées modifiées : {', '.join(modifiees) or 'aucune'}")
+    sys.exit(1 if echec else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Contrôle des durées légales du travail et de la cohérence des canaux des timesheets.
+
+Les contrôles portent sur un tableau (salariés x jours x canaux), celui de TimesheetsMois, pour
+tout l'effectif à la fois : chaque règle est un masque NumPy calculé sur le tableau entier, et
+les cellules en infraction sont rassemblées en une seule table d'infractions.
+
+Les heures de nuit et de dimanche sont un détail des heures réelles normales (elles y sont
+comprises) : la durée travaillée d'un jour est celle du canal "heures réelles normales".
+
+Le repos quotidien se contrôle à partir des seules durées journalières : une journée de plus de
+24h - 11h de travail ne laisse pas 11h de repos consécutif dans la journée.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from import_pointage import TimesheetsMois, dates_du_mois
+from payroll import CANAUX_TIMESHEET, periode_de_paie
+
+REELLES = CANAUX_TIMESHEET.index("heures réelles normales")
+NUIT = CANAUX_TIMESHEET.index("heures de nuit")
+DIMANCHE = CANAUX_TIMESHEET.index("heures de dimanche")
+# Canaux d'absence, saisis en jours (1 = journée entière)
+ABSENCES = [CANAUX_TIMESHEET.index(canal) for canal in (
+    "absence rémunérée RTT", "absence rémunérée congé payé", "absence rémunérée jour férié",
+    "absence non rémunérée jour férié", "absence non rémunérée absence injustifiée", "absence maladie",
+)]
+
+# Règles contrôlées
+DUREE_QUOTIDIENNE = "durée quotidienne maximale"
+DUREE_HEBDOMADAIRE = "durée hebdomadaire maximale"
+MOYENNE_HEBDOMADAIRE = "durée hebdomadaire moyenne"
+REPOS_QUOTIDIEN = "repos quotidien"
+TRAVAIL_EN_ABSENCE = "heures travaillées un jour d'absence"
+NUIT_HORS_REELLES = "heures de nuit supérieures aux heures réelles"
+DIMANCHE_HORS_REELLES = "heures de dimanche supérieures aux heures réelles"
+DIMANCHE_EN_SEMAINE = "heures de dimanche un autre jour"
+HORS_CALENDRIER = "heures hors du mois"
+
+COLONNES_INFRACTIONS = ["salarie", "regle", "debut", "fin", "canal", "valeur", "limite"]
+
+
+@dataclass(frozen=True)
+class LimitesTempsTravail:
+    """Durées maximales (en heures), durée minimale du repos quotidien et période de la moyenne (en semaines)."""
+    duree_quotidienne: float = 10.0
+    duree_hebdomadaire: float = 48.0
+    moyenne_hebdomadaire: float = 44.0
+    semaines_moyenne: int = 12
+    repos_quotidien: float = 11.0
+
+
+class _Infractions:
+    """Accumule les cellules en infraction de chaque règle, sous forme de tableaux."""
+
+    def __init__(self, salaries):
+        self.salaries = salaries
+        self.morceaux = []
+
+    def ajouter(self, regle, masque, valeurs, limite, debuts, fins, canal=""):
+        """
+        :param masque: Tableau (salariés x périodes) des infractions
+        :param valeurs: Tableau de même forme : durée ou heures constatées
+        :param limite: Borne de la règle, ou tableau de même forme pour une borne propre à chaque cellule
+        :param debuts, fins: Premier et dernier jour de chaque période
+        """
+        i, j = np.nonzero(masque)
+        if len(i):
+            limites = limite[i, j] if np.ndim(limite) == 2 else np.full(len(i), limite, dtype=float)
+            self.morceaux.append((regle, canal, i, j, valeurs[i, j], limites, debuts[j], fins[j]))
+
+    def table(self):
+        if not self.morceaux:
+            return pd.DataFrame(columns=COLONNES_INFRACTIONS)
+        infractions = pd.DataFrame({
+            "salarie": np.concatenate([self.salaries[i] for _, _, i, *_ in self.morceaux]),
+            "regle": np.concatenate([np.full(len(i), regle, dtype=object) for regle, _, i, *_ in self.morceaux]),
+            "debut": np.concatenate([debuts for *_, debuts, _ in self.morceaux]),
+            "fin": np.concatenate([fins for *_, fins in self.morceaux]),
+            "canal": np.concatenate([np.full(len(i), canal, dtype=object) for _, canal, i, *_ in self.morceaux]),
+            "valeur": np.concatenate([valeurs for _, _, _, _, valeurs, *_ in self.morceaux]),
+            "limite": np.concatenate([limites for _, _, _, _, _, limites, *_ in self.morceaux]),
+        })
+        return infractions.sort_values(["salarie", "debut", "regle"], kind="stable").reset_index(drop=True)
+
+
+def _controler(infractions, dates, heures, limites):
+    jours = np.asarray(dates.values, dtype="datetime64[D]")
+    travail = heures[:, :, REELLES]
+
+    # Limites journalières et cohérence des canaux, jour par jour
+    infractions.ajouter(DUREE_QUOTIDIENNE, travail > limites.duree_quotidienne, travail,
+                        limites.duree_quotidienne, jours, jours)
+    repos = 24.0 - travail
+    infractions.ajouter(REPOS_QUOTIDIEN, repos < limites.repos_quotidien, repos, limites.repos_quotidien, jours, jours)
+    absence = heures[:, :, ABSENCES].sum(axis=2)
+    infractions.ajouter(TRAVAIL_EN_ABSENCE, (absence >= 1) & (travail > 0), travail, 0.0, jours, jours,
+                        CANAUX_TIMESHEET[REELLES])
+    for canal, regle in ((NUIT, NUIT_HORS_REELLES), (DIMANCHE, DIMANCHE_HORS_REELLES)):
+        infractions.ajouter(regle, heures[:, :, canal] > travail, heures[:, :, canal], travail, jours, jours,
+                            CANAUX_TIMESHEET[canal])
+    en_semaine = np.asarray(dates.weekday != 6)
+    infractions.ajouter(DIMANCHE_EN_SEMAINE, (heures[:, :, DIMANCHE] > 0) & en_semaine, heures[:, :, DIMANCHE], 0.0,
+                        jours, jours, CANAUX_TIMESHEET[DIMANCHE])
+
+    # Semaines civiles (lundi-dimanche) : jours complétés par des zéros avant le premier lundi et après le dernier dimanche
+    avant = dates[0].weekday()
+    apres = (-(avant + len(jours))) % 7
+    semaines = np.pad(travail, ((0, 0), (avant, apres))).reshape(len(travail), -1, 7).sum(axis=2)
+    lundis = jours[0] - avant + 7 * np.arange(semaines.shape[1])
+    infractions.ajouter(DUREE_HEBDOMADAIRE, semaines > limites.duree_hebdomadaire, semaines,
+                        limites.duree_hebdomadaire, lundis, lundis + 6)
+
+    n = limites.semaines_moyenne
+    if semaines.shape[1] >= n:
+        cumul = np.concatenate([np.zeros((len(semaines), 1)), semaines.cumsum(axis=1)], axis=1)
+        moyennes = (cumul[:, n:] - cumul[:, :-n]) / n
+        infractions.ajouter(MOYENNE_HEBDOMADAIRE, moyennes > limites.moyenne_hebdomadaire, moyennes,
+                            limites.moyenne_hebdomadaire, lundis[:len(lundis) - n + 1], lundis[n - 1:] + 6)
+
+
+def controler_heures(salaries, dates, heures, limites=LimitesTempsTravail()):
+    """
+    Contrôle les heures de jours consécutifs.
+
+    :param salaries: Identifiants des salariés, alignés sur la première dimension de `heures`
+    :param dates: Jours consécutifs, alignés sur la deuxième dimension
+    :param heures: Tableau (salariés x jours x CANAUX_TIMESHEET)
+    :return: DataFrame des infractions, colonnes COLONNES_INFRACTIONS (une ligne par salarié, règle et
+        jour ou semaine ; "valeur" est la durée ou les heures constatées, "limite" la borne de la règle)
+    """
+    infractions = _Infractions(np.asarray(salaries, dtype=object))
+    _controler(infractions, pd.DatetimeIndex(dates), np.asarray(heures, dtype=float), limites)
+    return infractions.table()
+
+
+def controler_mois(mois, precedents=(), limites=LimitesTempsTravail()):
+    """
+    Contrôle les timesheets d'un mois importé.
+
+    Les jours qui précèdent le premier du mois (début de la première semaine, qui appartiennent au
+    mois précédent) doivent être vides. Les mois précédents, s'ils sont fournis, complètent les
+    semaines à cheval et l'historique de la durée hebdomadaire moyenne.
+
+    :param mois: TimesheetsMois
+    :param precedents: TimesheetsMois des mois précédents, du plus ancien au plus récent
+    """
+    tous = [*precedents, mois]
+    salaries = np.array(sorted(set().union(*(m.salaries.tolist() for m in tous)), key=str), dtype=object)
+    position = {salarie: i for i, salarie in enumerate(salaries)}
+    debut = tous[0].dates[0]
+    dates = pd.date_range(debut, mois.dates[-1], freq="D")
+    heures = np.zeros((len(salaries), len(dates), len(CANAUX_TIMESHEET)))
+    for m in tous:
+        lignes = np.array([position[s] for s in m.salaries], dtype=np.int64)
+        dans_le_mois = np.asarray(m.dates >= datetime(m.annee, m.mois, 1))
+        colonnes = (m.dates[0] - debut).days + np.flatnonzero(dans_le_mois)
+        heures[lignes[:, None], colonnes] = m.heures[:, dans_le_mois]
+
+    infractions = _Infractions(salaries)
+    _controler(infractions, dates, heures, limites)
+    # Seules les infractions des jours et semaines qui touchent le mois contrôlé sont rapportées
+    infractions = infractions.table()
+    infractions = infractions[infractions["fin"] >= np.datetime64(datetime(mois.annee, mois.mois, 1), "D")]
+
+    hors_calendrier = _Infractions(mois.salaries)
+    avant_le_mois = np.asarray(mois.dates < datetime(mois.annee, mois.mois, 1))
+    jours = np.asarray(mois.dates[avant_le_mois].values, dtype="datetime64[D]")
+    heures_avant = mois.heures[:, avant_le_mois].sum(axis=2)
+    hors_calendrier.ajouter(HORS_CALENDRIER, heures_avant > 0, heures_avant, 0.0, jours, jours)
+
+    return (pd.concat([hors_calendrier.table(), infractions], ignore_index=True)
+              .sort_values(["salarie", "debut", "regle"], kind="stable").reset_index(drop=True))
+
+
+def timesheets_mois(timesheets):
+    """
+    TimesheetsMois d'un mois à partir de timesheets au format de combine_timesheets.
+    :param timesheets: {identifiant du salarié: DataFrame}, toutes du même mois
+    """
+    periode = periode_de_paie(next(iter(timesheets.values())))
+    dates = dates_du_mois(periode.year, periode.month)
+    index = dates.strftime("%Y-%m-%d")
+    salaries = np.array(sorted(timesheets, key=str), dtype=object)
+    heures = np.stack([
+        timesheets[s].set_axis(pd.Index(timesheets[s].index).astype(str))
+                     .reindex(index=index, columns=CANAUX_TIMESHEET, fill_value=0).to_numpy(dtype=float)
+        for s in salaries
+    ]) if len(salaries) else np.zeros((0, len(dates), len(CANAUX_TIMESHEET)))
+    return TimesheetsMois(annee=periode.year, mois=periode.month, salaries=salaries, dates=dates, heures=heures)
+
+
+def controler_timesheets(timesheets, timesheets_precedentes=None, limites=LimitesTempsTravail()):
+    """
+    Contrôle les timesheets d'un mois au format de combine_timesheets.
+    :param timesheets: {identifiant du salarié: DataFrame} du mois
+    :param timesheets_precedentes: {identifiant du salarié: DataFrame} du mois précédent, pour les semaines à cheval
+    """
+    precedents = [timesheets_mois(timesheets_precedentes)] if timesheets_precedentes else []
+    return controler_mois(timesheets_mois(timesheets), precedents, limites)
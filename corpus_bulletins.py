@@ -0,0 +1,467 @@
+"""
+Corpus de bulletins de référence et contrôle de non-régression des montants.
+
+    python corpus_bulletins.py verifier [--moteur numpy] [--repetitions 3] [--temps temps.csv]
+    python corpus_bulletins.py figer
+
+Le corpus (corpus_bulletins.jsonl, un scénario par ligne) fige quelques centaines de situations :
+CDI / CDD, salarié / cadre, salaires sous et au-dessus du PMSS, arrêts maladie avec et sans
+subrogation, avantages en nature et primes, heures supplémentaires d'une semaine à cheval sur
+décembre 2024 et janvier 2025, heures de nuit et de dimanche majorées avec et sans plafond.
+Chaque scénario porte sa demande, au format de bulletin_depuis_json du service de paie, et les
+lignes attendues du bulletin (Catégorie, Base, Taux, Total, Part employeur) telles que les formate
+ajouter_sous_totaux : la comparaison du texte à deux décimales est une comparaison au centime.
+
+"verifier" recalcule chaque scénario, signale toute ligne manquante, en trop ou différente, et
+mesure le temps de calcul de chaque scénario (le meilleur de `repetitions` calculs). "figer"
+régénère les bulletins attendus avec le moteur pandas, à ne lancer qu'après un changement de
+règle voulu (et relu dans le diff du corpus). Les deux commandes contrôlent d'abord que les heures
+de décembre 2024 modifient bien un bulletin de janvier 2025 ; "verifier" contrôle aussi qu'un rappel
+après changement de taux recalcule avec les nouveaux paramètres réglementaires, que le cache disque
+des bulletins relit les bulletins déjà calculés sans servir ceux d'un autre mois de primes, que les
+cotisations sur tableaux du simulateur sont celles de calcul_cotisations, et que le moteur en centimes
+reste à quelques centimes des bulletins attendus avec des totaux sommes exactes de leurs lignes.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from cache_paie import CacheBulletins, bulletin_en_cache
+from parametres import FICHIER_PARAMETRES, plafonds, registre
+from parametres_entreprise import TableEntreprises
+from payroll import Entreprise, Salarie, calcul_cotisations, calculer_bulletin, recharger_parametres
+from rappels import EntreesBulletin, calculer_rappels, cloturer
+from service_paie import timesheet_depuis_canaux
+from simulateur import cotisations_par_entreprise
+from stockage import StockagePaie
+
+FICHIER_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_bulletins.jsonl")
+COLONNES_COMPAREES = ["Catégorie", "Base", "Taux (%)", "Total (€)", "Part_Employeur"]
+COLONNES_RESULTATS = ["scenario", "statut", "ecarts", "duree_ms"]
+COLONNES_ECARTS = ["scenario", "ligne", "Catégorie", "colonne", "attendu", "obtenu"]
+
+# Écart toléré entre une cellule du moteur en centimes et le bulletin attendu (calcul en flottants)
+ECART_MAX_CENTIMES = 50
+
+# Statut d'un scénario vérifié
+OK, ECART, ERREUR = "ok", "écart", "erreur"
+
+# Dimensions du corpus : chaque scénario est une combinaison de ces valeurs
+CONTRATS = ("CDI", "CDD")
+STATUTS = ("salarié", "cadre")
+# Sous le PMSS (SMIC, salaire médian) et au-dessus (entre 1 et 4 PMSS, au-delà de 4 PMSS)
+SALAIRES = (1801.80, 2600.00, 5200.00, 17000.00)
+ARRETS = ("aucun", "maladie avec subrogation", "maladie sans subrogation")
+ELEMENTS = ("aucun", "avantages", "primes et avantages")
+# Janvier 2025 (semaine du 30 décembre à cheval sur décembre 2024) et un mois sans semaine à cheval
+PERIODES = ("2025-01", "2025-03")
+# Scénarios de majorations, numérotés à la suite : heures de nuit et de dimanche majorées sans
+# plafond, puis avec des plafonds mensuels atteints par tous les salaires du corpus
+PLAFONDS_MAJORATION = ("sans plafond", "plafonnées")
+TAUX_MAJORATION = {"taux_majoration_nuit": 0.25, "taux_majoration_dimanche": 0.50}
+PLAFONDS_ATTEINTS = {"plafond_majoration_nuit": 20.0, "plafond_majoration_dimanche": 30.0}
+
+
+def _mois(periode):
+    annee, mois = (int(x) for x in periode.split("-"))
+    precedent = (annee, mois - 1) if mois > 1 else (annee - 1, 12)
+    return (annee, mois), precedent
+
+
+def _jours_ouvres(annee, mois):
+    jour = date(annee, mois, 1)
+    while jour.month == mois:
+        if jour.weekday() < 5:
+            yield jour.isoformat()
+        jour += timedelta(days=1)
+
+
+def _heures(annee, mois, supplementaires):
+    """Canaux contractuels et réels d'un mois : 7h par jour ouvré, réelles augmentées des heures saisies."""
+    contractuelles = {jour: 7.0 for jour in _jours_ouvres(annee, mois)}
+    reelles = {**contractuelles, **supplementaires}
+    return {"contractuelles": contractuelles, "reelles": reelles}
+
+
+def _ajouter_majorations(timesheet, timesheet_prec, periode):
+    """
+    Heures de nuit et de dimanche du mois. Le mois précédent a aussi des heures de nuit le dernier
+    jour de la semaine à cheval (31 décembre, 28 février) : déjà majorées sur son bulletin, elles ne
+    doivent pas l'être sur celui du mois.
+    """
+    if periode == "2025-01":
+        veille, nuits, (dimanche, heures) = "2024-12-31", {"2025-01-02": 4.0, "2025-01-03": 4.0}, ("2025-01-05", 6.0)
+    else:
+        veille, nuits, (dimanche, heures) = ("2025-02-28", {"2025-03-04": 3.0, "2025-03-05": 3.0, "2025-03-20": 4.0},
+                                             ("2025-03-09", 7.0))
+    timesheet_prec["nuit"] = {veille: 3.0}
+    timesheet["nuit"] = nuits
+    timesheet["dimanche"] = {dimanche: heures}
+    timesheet["reelles"][dimanche] = heures
+
+
+def _demande(contrat, statut, salaire, arret, elements, periode, numero, majorations=None):
+    (annee, mois), (annee_prec, mois_prec) = _mois(periode)
+    if periode == "2025-01":
+        # Semaine du lundi 30 décembre : 2 x 10h en décembre, 3 x 10h et un samedi de 6h en janvier
+        timesheet_prec = _heures(annee_prec, mois_prec, {"2024-12-30": 10.0, "2024-12-31": 10.0})
+        timesheet = _heures(annee, mois, {"2025-01-01": 10.0, "2025-01-02": 10.0, "2025-01-03": 10.0, "2025-01-04": 6.0})
+    else:
+        timesheet_prec = _heures(annee_prec, mois_prec, {})
+        timesheet = _heures(annee, mois, {"2025-03-04": 9.5, "2025-03-05": 9.5, "2025-03-20": 11.0})
+    if majorations is not None:
+        _ajouter_majorations(timesheet, timesheet_prec, periode)
+
+    absences = {}
+    if arret != "aucun":
+        # Arrêt court (IJSS seules) ou long (maintien de salaire), selon le scénario
+        duree = 4 if numero % 2 else 10
+        debut = date(annee, mois, 10)
+        for i in range(duree):
+            jour = (debut + timedelta(days=i)).isoformat()
+            absences[jour] = "maladie"
+            if jour in timesheet["reelles"]:
+                timesheet["reelles"][jour] = 0.0
+                timesheet.setdefault("maladie", {})[jour] = 1.0
+
+    avantages, primes = {}, {}
+    if elements != "aucun":
+        avantages = {
+            "nourriture": {"type": "nourriture"},
+            "logement": {"type": "logement", "mode": "forfaitaire", "params": {"pieces principales": 2}},
+        }
+    if elements == "primes et avantages":
+        primes = {
+            "13ème mois": {"type": "13ème mois", "mode": True},
+            "ancienneté": {"type": "ancienneté"},
+            "exceptionnelle": {"type": "exceptionnelle", "valeur": 350.0},
+            "objectifs": {"type": "objectifs", "montant_cible": 800.0, "taux_atteinte": 0.85},
+        }
+
+    return {
+        "periode": periode,
+        "entreprise": {
+            "nom": "Entreprise de référence", "adresse": "1 rue de la Paie, 75001 Paris",
+            "siret": "12345678900012", "effectif": (8, 35, 120)[numero % 3], "taux_AT": (0.0097, 0.0212)[numero % 2],
+            "subrogation": arret != "maladie sans subrogation", "versement_mobilite": numero % 3 == 2,
+            "taux_versement_mobilite": 0.0295,
+            **(TAUX_MAJORATION if majorations is not None else {}),
+            **(PLAFONDS_ATTEINTS if majorations == "plafonnées" else {}),
+        },
+        "salarie": {
+            "nom": "Référence", "prenom": f"Scénario {numero}", "numero_ss": f"1{numero:014d}",
+            "date_naissance": "1985-04-12", "date_entree": "2016-09-01", "contrat": contrat, "statut": statut,
+            "horaires_par_defaut": {}, "salaire_de_base": salaire, "mutuelle": numero % 2 == 0,
+            "douze_derniers_salaires": [salaire] * 12,
+        },
+        "timesheet": timesheet,
+        "timesheet_prec": timesheet_prec,
+        "avantages": avantages,
+        "primes": primes,
+        "absences": absences,
+    }
+
+
+def generer_scenarios():
+    """Scénarios du corpus (sans bulletins attendus), dans un ordre et avec des identifiants stables."""
+    combinaisons = itertools.product(CONTRATS, STATUTS, SALAIRES, ARRETS, ELEMENTS, PERIODES)
+    for numero, (contrat, statut, salaire, arret, elements, periode) in enumerate(combinaisons):
+        yield {
+            "scenario": f"{numero:03d}",
+            "description": f"{contrat} {statut}, {salaire:.2f} €, arrêt : {arret}, {elements}, {periode}",
+            "demande": _demande(contrat, statut, salaire, arret, elements, periode, numero),
+        }
+    combinaisons = itertools.product(STATUTS, SALAIRES, PERIODES, PLAFONDS_MAJORATION)
+    for numero, (statut, salaire, periode, plafonds) in enumerate(combinaisons, start=numero + 1):
+        yield {
+            "scenario": f"{numero:03d}",
+            "description": f"CDI {statut}, {salaire:.2f} €, heures de nuit et de dimanche {plafonds}, {periode}",
+            "demande": _demande("CDI", statut, salaire, "aucun", "aucun", periode, numero, plafonds),
+        }
+
+
+def entrees_scenario(demande):
+    """
+    Arguments de calculer_bulletin pour une demande du corpus : (salarie, avantages, primes, timesheet,
+    timesheet_prec, absence_motifs, periode_primes) ; le mois de paie est imposé aux primes (ancienneté comprise).
+    """
+    (annee, mois), (annee_prec, mois_prec) = _mois(demande["periode"])
+    entreprise = Entreprise(**demande["entreprise"])
+    salarie = Salarie(**demande["salarie"], entreprise=entreprise)
+    return (
+        salarie,
+        demande["avantages"],
+        demande["primes"],
+        timesheet_depuis_canaux(annee, mois, demande["timesheet"]),
+        timesheet_depuis_canaux(annee_prec, mois_prec, demande["timesheet_prec"]),
+        demande["absences"],
+        pd.Timestamp(annee, mois, 1),
+    )
+
+
+def calculer_scenario(demande, moteur="pandas"):
+    """Bulletin d'une demande du corpus (voir entrees_scenario)."""
+    return calculer_bulletin(*entrees_scenario(demande), moteur=moteur)
+
+
+def _texte(valeur):
+    if valeur is None or valeur == "" or (isinstance(valeur, float) and pd.isna(valeur)):
+        return ""
+    return valeur if isinstance(valeur, str) else f"{valeur:.2f}"
+
+
+def lignes_comparables(lignes):
+    """Lignes d'un bulletin (DataFrame ou liste de dictionnaires) en listes de textes COLONNES_COMPAREES."""
+    if isinstance(lignes, pd.DataFrame):
+        lignes = lignes.to_dict(orient="records")
+    return [[_texte(ligne.get(colonne)) for colonne in COLONNES_COMPAREES] for ligne in lignes]
+
+
+def comparer(attendu, obtenu):
+    """
+    Écarts entre deux bulletins au format de lignes_comparables, ligne à ligne dans l'ordre.
+    :return: Liste de (ligne, catégorie, colonne, attendu, obtenu) ; une ligne manquante ou en trop
+        est signalée sur la colonne "Catégorie"
+    """
+    ecarts = []
+    for i in range(max(len(attendu), len(obtenu))):
+        ligne_attendue = attendu[i] if i < len(attendu) else None
+        ligne_obtenue = obtenu[i] if i < len(obtenu) else None
+        if ligne_attendue is None or ligne_obtenue is None or ligne_attendue[0] != ligne_obtenue[0]:
+            ecarts.append((i, (ligne_attendue or ligne_obtenue)[0], "Catégorie",
+                           ligne_attendue and ligne_attendue[0], ligne_obtenue and ligne_obtenue[0]))
+            continue
+        for colonne, valeur_attendue, valeur_obtenue in zip(COLONNES_COMPAREES[1:], ligne_attendue[1:], ligne_obtenue[1:]):
+            if valeur_attendue != valeur_obtenue:
+                ecarts.append((i, ligne_attendue[0], colonne, valeur_attendue, valeur_obtenue))
+    return ecarts
+
+
+def charger_corpus(chemin=FICHIER_CORPUS):
+    with open(chemin, encoding="utf-8") as f:
+        return [json.loads(ligne) for ligne in f if ligne.strip()]
+
+
+def controler_mois_precedent(scenarios, moteur="pandas"):
+    """
+    Contrôle que la semaine à cheval est complétée par le mois précédent : le bulletin du premier
+    scénario de janvier 2025 avec des heures en décembre doit changer quand ces heures sont retirées.
+    """
+    demande = next(s["demande"] for s in scenarios if s["demande"]["periode"] == "2025-01" and s["demande"]["timesheet_prec"])
+    avec = lignes_comparables(calculer_scenario(demande, moteur))
+    sans = lignes_comparables(calculer_scenario({**demande, "timesheet_prec": {}}, moteur))
+    assert avec != sans, "Les heures de décembre 2024 sont sans effet sur le bulletin de janvier 2025"
+
+
+def controler_parite_cotisations(scenarios):
+    """
+    Contrôle que simulateur.cotisations_par_entreprise donne exactement les cotisations de calcul_cotisations
+    (0 pour une rubrique absente) pour l'entreprise, le statut et la période de chaque scénario, sur les
+    salaires du corpus et de part et d'autre de chaque plafond et seuil.
+    """
+    vus = set()
+    for scenario in scenarios:
+        salarie, *_, periode = entrees_scenario(scenario["demande"])
+        cle = (json.dumps(scenario["demande"]["entreprise"], sort_keys=True), salarie.statut, periode)
+        if cle in vus:
+            continue
+        vus.add(cle)
+        seuils = [valeur for nom, valeur in plafonds(periode).items() if nom != "SMIC"]
+        bruts = sorted({*SALAIRES, *(seuil + ecart for seuil in seuils for ecart in (-0.01, 0.0, 0.01))})
+        pe = TableEntreprises([salarie.entreprise]).par_salarie([salarie] * len(bruts))
+        vectorisees = cotisations_par_entreprise(np.array(bruts), np.full(len(bruts), salarie.statut.lower() == "cadre"),
+                                                 pe, periode)
+        for i, brut in enumerate(bruts):
+            unitaires = calcul_cotisations(salarie, periode, brut)
+            for part, rubriques in vectorisees.items():
+                for rubrique, montants in rubriques.items():
+                    assert unitaires[part].get(rubrique, 0.0) == montants[i], \
+                        (f"Cotisation {part} {rubrique} à {brut:.2f} € (scénario {scenario['scenario']}) : "
+                         f"{unitaires[part].get(rubrique, 0.0)} par calcul_cotisations, {montants[i]} sur tableaux")
+                assert set(unitaires[part]) <= set(rubriques), \
+                    f"Rubriques {part} absentes des cotisations sur tableaux : {set(unitaires[part]) - set(rubriques)}"
+
+
+def _en_centimes(texte):
+    """Montant formaté à deux décimales ("-12.34") en centimes, sans passer par un flottant."""
+    return int(texte.replace(".", "")) if texte else 0
+
+
+def controler_centimes(scenarios):
+    """
+    Contrôle le moteur en centimes sur chaque scénario : mêmes lignes que le bulletin attendu, à au plus
+    ECART_MAX_CENTIMES par cellule, salaire brut somme exacte des lignes de rémunération et total
+    patronal somme exacte des parts employeur affichées.
+    """
+    for scenario in scenarios:
+        obtenu = lignes_comparables(calculer_scenario(scenario["demande"], "centimes"))
+        assert [ligne[0] for ligne in obtenu] == [ligne[0] for ligne in scenario["attendu"]], \
+            f"Scénario {scenario['scenario']} : lignes du moteur en centimes différentes du bulletin attendu"
+        for ligne_attendue, ligne_obtenue in zip(scenario["attendu"], obtenu):
+            for colonne, attendu, valeur in zip(COLONNES_COMPAREES[1:], ligne_attendue[1:], ligne_obtenue[1:]):
+                assert abs(_en_centimes(attendu) - _en_centimes(valeur)) <= ECART_MAX_CENTIMES, \
+                    f"Scénario {scenario['scenario']}, {ligne_attendue[0]} / {colonne} : {valeur} au lieu de {attendu}"
+        categories = [ligne[0] for ligne in obtenu]
+        brut = categories.index("Salaire Brut")
+        assert sum(_en_centimes(ligne[3]) for ligne in obtenu[:brut]) == _en_centimes(obtenu[brut][3]), \
+            f"Scénario {scenario['scenario']} : le salaire brut en centimes n'est pas la somme des lignes"
+        assert -sum(_en_centimes(ligne[4]) for ligne in obtenu[:-1]) == _en_centimes(obtenu[-1][4]), \
+            f"Scénario {scenario['scenario']} : le total patronal en centimes n'est pas la somme des lignes"
+
+
+def controler_rappel_taux(scenarios, moteur="pandas"):
+    """
+    Contrôle qu'un rappel sans correction (changement de taux) recalcule avec les paramètres relus :
+    un scénario de mars 2025 au-dessus du PMSS est clos, le PMSS 2025 est relevé dans une copie du
+    fichier des paramètres, et le rappel doit modifier la vieillesse plafonnée. Relancé avec le
+    fichier du dépôt, le rappel ne doit plus donner d'écart.
+    """
+    demande = next(s["demande"] for s in scenarios
+                   if s["demande"]["periode"] == "2025-03" and s["demande"]["salarie"]["salaire_de_base"] > 4000)
+    entrees = EntreesBulletin(*entrees_scenario(demande))
+    with tempfile.TemporaryDirectory() as repertoire:
+        stockage = StockagePaie(os.path.join(repertoire, "rappels.db"))
+        try:
+            salarie_id = stockage.enregistrer_salarie(entrees.salarie)
+            cloturer(stockage, demande["periode"], {salarie_id: entrees}, moteur)
+            correction = {(salarie_id, demande["periode"]): None}
+
+            with open(FICHIER_PARAMETRES, newline="", encoding="utf-8") as f:
+                lignes = list(csv.DictReader(f))
+            for ligne in lignes:
+                if ligne["parametre"] == "PMSS" and ligne["date_effet"] == "2025-01-01":
+                    ligne["valeur"] = f"{float(ligne['valeur']) + 100:.2f}"
+            copie = os.path.join(repertoire, "parametres_reglementaires.csv")
+            with open(copie, "w", newline="", encoding="utf-8") as f:
+                ecriture = csv.DictWriter(f, fieldnames=list(lignes[0]))
+                ecriture.writeheader()
+                ecriture.writerows(lignes)
+
+            try:
+                ecarts = calculer_rappels(stockage, correction, "2025-04", moteur, chemin_parametres=copie).ecarts
+            finally:
+                recharger_parametres()
+            assert "Vieillesse Plafonée" in set(ecarts["Catégorie"]), \
+                "Le rappel après relèvement du PMSS reprend les anciens paramètres réglementaires"
+            ecarts = calculer_rappels(stockage, correction, "2025-04", moteur).ecarts
+            assert ecarts.empty, "Le rappel avec les paramètres du dépôt ne retrouve pas le bulletin clos"
+        finally:
+            stockage.pool.fermer()
+
+
+def controler_cache(scenarios, moteur="pandas", nombre=12):
+    """
+    Contrôle le cache disque des bulletins sur les `nombre` premiers scénarios : un premier passage ne
+    trouve rien et stocke chaque bulletin, un second relit tous les bulletins, identiques au calcul. Le
+    même scénario avec un autre mois imposé aux primes ne doit pas être relu.
+    """
+    scenarios = scenarios[:nombre]
+    with tempfile.TemporaryDirectory() as repertoire:
+        cache = CacheBulletins(repertoire)
+        calcules = [bulletin_en_cache(cache, *entrees_scenario(s["demande"]), moteur=moteur) for s in scenarios]
+        assert (cache.hits, cache.misses) == (0, len(scenarios)), \
+            f"Cache vide : {cache.hits} succès et {cache.misses} échecs pour {len(scenarios)} bulletins"
+        relus = [bulletin_en_cache(cache, *entrees_scenario(s["demande"]), moteur=moteur) for s in scenarios]
+        assert (cache.hits, cache.misses) == (len(scenarios), len(scenarios)), \
+            f"Second passage : {cache.hits} succès et {cache.misses} échecs pour {len(scenarios)} bulletins"
+        assert all(lignes_comparables(a) == lignes_comparables(b) for a, b in zip(calcules, relus)), \
+            "Un bulletin relu du cache diffère du bulletin calculé"
+        entrees = list(entrees_scenario(scenarios[0]["demande"]))
+        entrees[-1] = entrees[-1] - pd.DateOffset(months=1)
+        bulletin_en_cache(cache, *entrees, moteur=moteur)
+        assert cache.misses == len(scenarios) + 1, "Le cache sert un bulletin calculé pour un autre mois de primes"
+
+
+def figer_corpus(chemin=FICHIER_CORPUS, scenarios=None):
+    """
+    Calcule les bulletins attendus (moteur pandas) et écrit le corpus, en remplaçant l'ancien d'un bloc.
+    :param scenarios: Scénarios à figer, par défaut generer_scenarios()
+    :return: Nombre de scénarios écrits
+    """
+    scenarios = list(scenarios if scenarios is not None else generer_scenarios())
+    controler_mois_precedent(scenarios)
+    temporaire = f"{chemin}.{os.getpid()}.tmp"
+    n = 0
+    with open(temporaire, "w", encoding="utf-8") as f:
+        for scenario in scenarios:
+            attendu = lignes_comparables(calculer_scenario(scenario["demande"]))
+            f.write(json.dumps({**scenario, "attendu": attendu}, ensure_ascii=False) + "\n")
+            n += 1
+    os.replace(temporaire, chemin)
+    return n
+
+
+def verifier_corpus(chemin=FICHIER_CORPUS, moteur="pandas", repetitions=1):
+    """
+    Recalcule chaque scénario du corpus et le compare au bulletin attendu.
+    :param repetitions: Nombre de calculs par scénario ; le temps retenu est le plus court
+    :return: (DataFrame COLONNES_RESULTATS, un scénario par ligne, durée en millisecondes ;
+              DataFrame COLONNES_ECARTS des cellules différentes)
+    """
+    corpus = charger_corpus(chemin)
+    # Chargement des paramètres réglementaires et premier calcul hors mesure
+    registre()
+    if corpus:
+        calculer_scenario(corpus[0]["demande"], moteur)
+        controler_mois_precedent(corpus, moteur)
+        controler_rappel_taux(corpus, moteur)
+        controler_cache(corpus, moteur)
+        controler_parite_cotisations(corpus)
+        controler_centimes(corpus)
+
+    resultats, ecarts = [], []
+    for scenario in corpus:
+        duree = float("inf")
+        try:
+            for _ in range(max(1, repetitions)):
+                debut = time.perf_counter()
+                lignes = calculer_scenario(scenario["demande"], moteur)
+                duree = min(duree, time.perf_counter() - debut)
+        except Exception as e:
+            resultats.append((scenario["scenario"], ERREUR, 0, None))
+            ecarts.append((scenario["scenario"], None, None, None, None, f"{type(e).__name__}: {e}"))
+            continue
+        differences = comparer(scenario["attendu"], lignes_comparables(lignes))
+        resultats.append((scenario["scenario"], ECART if differences else OK, len(differences), round(duree * 1000, 3)))
+        ecarts += [(scenario["scenario"], *difference) for difference in differences]
+    return pd.DataFrame(resultats, columns=COLONNES_RESULTATS), pd.DataFrame(ecarts, columns=COLONNES_ECARTS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Corpus de bulletins de référence")
+    commandes = parser.add_subparsers(dest="commande", required=True)
+    verifier = commandes.add_parser("verifier", help="Compare les bulletins calculés au corpus")
+    verifier.add_argument("--moteur", choices=("pandas", "numpy"), default="pandas")
+    verifier.add_argument("--repetitions", type=int, default=1)
+    verifier.add_argument("--temps", default=None, help="Fichier CSV des résultats et temps par scénario")
+    verifier.add_argument("--corpus", default=FICHIER_CORPUS)
+    figer = commandes.add_parser("figer", help="Régénère les bulletins attendus (moteur pandas)")
+    figer.add_argument("--corpus", default=FICHIER_CORPUS)
+    args = parser.parse_args()
+
+    if args.commande == "figer":
+        print(f"{figer_corpus(args.corpus)} scénarios figés dans {args.corpus}")
+        return
+
+    resultats, ecarts = verifier_corpus(args.corpus, args.moteur, args.repetitions)
+    if args.temps:
+        resultats.to_csv(args.temps, index=False)
+    if len(ecarts):
+        print(ecarts.to_string(index=False))
+    durees = resultats["duree_ms"].dropna()
+    print(f"{(resultats['statut'] == OK).sum()}/{len(resultats)} scénarios identiques au centime ; "
+          f"temps par scénario : médiane {durees.median():.1f} ms, max {durees.max():.1f} ms, total {durees.sum() / 1000:.2f} s")
+    sys.exit(0 if (resultats["statut"] == OK).all() else 1)
+
+
+if __name__ == "__main__":
+    main()
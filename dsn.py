@@ -0,0 +1,361 @@
+"""
+Export de la DSN (Déclaration Sociale Nominative) mensuelle à partir des bulletins calculés.
+
+Chaque ligne de cotisation ou de réduction d'un bulletin (catégories de rubriques_cotisations et
+de rubriques_reductions) est rattachée par correspondances_dsn.csv à un organisme, un code de
+cotisation individuelle (S21.G00.81), une base assujettie (S21.G00.78) et, pour l'URSSAF, à un
+code type de personnel agrégé (S21.G00.23). Les codes sont des données : ils se tiennent à jour
+dans le fichier, avec le cahier technique de la norme en vigueur.
+
+ecrire_dsn lit les bulletins un par un : les blocs individuels sont écrits au fil de l'eau dans un
+fichier temporaire pendant que les blocs de l'entreprise (versements S21.G00.20, bordereaux
+S21.G00.22, cotisations agrégées S21.G00.23) sont cumulés ; le fichier final est assemblé à la
+fin. Un seul bulletin est en mémoire à la fois, quel que soit l'effectif.
+"""
+import csv
+import os
+import re
+import shutil
+import tempfile
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+
+import pandas as pd
+
+from parametres import plafonds
+
+FICHIER_CORRESPONDANCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "correspondances_dsn.csv")
+
+LOGICIEL = "Peppers"
+VERSION_LOGICIEL = "1.0"
+NORME = "P25V01"
+
+# Assiette (voir assiettes) du montant de chaque base assujettie S21.G00.78.001
+BASES = {"02": "plafonnee", "03": "brute", "04": "csg", "07": "chomage"}
+NATURES_CONTRAT = {"CDI": "01", "CDD": "02"}
+# Code statut catégoriel retraite complémentaire (S21.G00.40.003)
+STATUT_CADRE, STATUT_NON_CADRE = "01", "04"
+# Mode de paiement des versements aux organismes (S21.G00.20.010) : prélèvement SEPA
+MODE_PAIEMENT = "05"
+
+
+@dataclass(frozen=True)
+class CorrespondanceDSN:
+    """Rattachement d'une catégorie du bulletin aux blocs DSN (une ligne de correspondances_dsn.csv)."""
+    categorie: str
+    organisme: str
+    code_cotisation: str
+    code_base: str
+    assiette: str
+    ctp: str
+    qualifiant_assiette: str
+
+
+@lru_cache(maxsize=None)
+def correspondances(chemin=FICHIER_CORRESPONDANCES):
+    """{catégorie du bulletin: CorrespondanceDSN}, lu une fois."""
+    with open(chemin, newline="", encoding="utf-8") as f:
+        return {ligne["categorie"]: CorrespondanceDSN(**ligne) for ligne in csv.DictReader(f)}
+
+
+def _montant(valeur):
+    """Montant d'une cellule du bulletin (chaîne formatée, nombre ou vide)."""
+    if valeur in ("", None):
+        return 0.0
+    valeur = float(valeur)
+    return 0.0 if valeur != valeur else valeur
+
+
+def _centimes(valeur):
+    return int(round(valeur * 100))
+
+
+def _euros(centimes):
+    signe = "-" if centimes < 0 else ""
+    return f"{signe}{abs(centimes) // 100}.{abs(centimes) % 100:02d}"
+
+
+def _date(jour):
+    """Date au format JJMMAAAA ; les chaînes "AAAA-MM-JJ" des fiches salarié sont découpées sans conversion."""
+    if isinstance(jour, str) and len(jour) == 10:
+        return jour[8:10] + jour[5:7] + jour[:4]
+    return pd.Timestamp(jour).strftime("%d%m%Y")
+
+
+def _rubrique(code, valeur):
+    return f"{code},'{str(valeur).replace(chr(10), ' ')}'\n"
+
+
+@lru_cache(maxsize=64)
+def _bornes(periode):
+    """Premier et dernier jour du mois de la période, au format JJMMAAAA."""
+    debut = pd.Timestamp(periode).replace(day=1)
+    return _date(debut), _date(debut + pd.offsets.MonthEnd(0))
+
+
+def _adresse(adresse):
+    """(voie, code postal, localité) d'une adresse "voie, 75001 Paris" ; à défaut, tout dans la voie."""
+    trouve = re.match(r"^(.*?)[,\s]+(\d{5})\s+(.+)$", adresse.strip())
+    return trouve.groups() if trouve else (adresse.strip(), "", "")
+
+
+def assiettes(salaire_brut, periode=None, p=None):
+    """
+    Assiettes de cotisation d'un salaire brut (colonne "assiette" de correspondances_dsn.csv).
+    :param p: Plafonds de la période s'ils sont déjà connus
+    """
+    p = p or plafonds(periode)
+    return {
+        "brute": salaire_brut,
+        "plafonnee": min(salaire_brut, p["PMSS"]),
+        "chomage": min(salaire_brut, p["PLAFOND_CHOMAGE"]),
+        "apec": min(salaire_brut, p["PLAFOND_APEC"]),
+        "tranche_2": max(min(salaire_brut, p["PLAFOND_T2"]) - p["PMSS"], 0.0),
+        "csg": salaire_brut,
+        "": 0.0,
+    }
+
+
+@dataclass(frozen=True)
+class CotisationDSN:
+    """Cotisation individuelle d'un bulletin, montants en centimes (réductions négatives)."""
+    correspondance: CorrespondanceDSN
+    assiette: int
+    taux: str
+    montant: int
+
+
+@dataclass
+class BulletinDSN:
+    """Éléments d'un bulletin repris dans la DSN."""
+    salaire_brut: float
+    net_imposable: float
+    net_a_payer: float
+    prelevement_a_la_source: float
+    cotisations: list
+    assiettes: dict
+
+
+def lire_bulletin(lignes, periode=None, table=None, p=None):
+    """
+    Montants d'un bulletin (lignes d'ajouter_sous_totaux : DataFrame ou liste de dictionnaires)
+    et ses cotisations rattachées aux codes DSN. Les lignes nulles ne sont pas déclarées.
+    :param p: Plafonds de la période, pour ne les chercher qu'une fois par fichier
+    """
+    table = table or correspondances()
+    if isinstance(lignes, pd.DataFrame):
+        lignes = lignes.to_dict(orient="records")
+    totaux = {ligne["Catégorie"]: _montant(ligne.get("Total (€)")) for ligne in lignes}
+    salaire_brut = totaux.get("Salaire Brut", 0.0)
+    par_assiette = assiettes(salaire_brut, periode, p)
+
+    cotisations = []
+    for ligne in lignes:
+        correspondance = table.get(ligne["Catégorie"])
+        if correspondance is None:
+            continue
+        # Côté DSN, les cotisations sont positives et les réductions négatives
+        montant = _centimes(-(_montant(ligne.get("Total (€)")) + _montant(ligne.get("Part_Employeur"))))
+        if montant == 0:
+            continue
+        base = ligne.get("Base")
+        assiette = _montant(base) if base not in ("", None) else par_assiette[correspondance.assiette]
+        # Le taux du bulletin est le taux salarial : il n'est déclaré que s'il n'y a pas de part employeur
+        taux = ligne.get("Taux (%)")
+        if taux in ("", None) or _montant(ligne.get("Part_Employeur")):
+            taux = ""
+        cotisations.append(CotisationDSN(correspondance, _centimes(assiette),
+                                         f"{_montant(taux):.2f}" if taux != "" else "", montant))
+    return BulletinDSN(
+        salaire_brut=salaire_brut,
+        net_imposable=totaux.get("Net imposable", 0.0),
+        net_a_payer=totaux.get("Net à payer", 0.0),
+        prelevement_a_la_source=-totaux.get("Prelevement à la source", 0.0),
+        cotisations=cotisations,
+        assiettes=par_assiette,
+    )
+
+
+def rubriques_salarie(salarie, bulletin, periode, numero_contrat="00001"):
+    """Rubriques des blocs individuels S21.G00.30 à S21.G00.81 d'un salarié, dans l'ordre de la norme."""
+    debut, fin = _bornes(periode)
+    rubriques = [
+        _rubrique("S21.G00.30.001", salarie.numero_ss.replace(" ", "")),
+        _rubrique("S21.G00.30.002", salarie.nom.upper()),
+        _rubrique("S21.G00.30.004", salarie.prenom),
+        _rubrique("S21.G00.30.006", _date(salarie.date_naissance)),
+        _rubrique("S21.G00.40.001", _date(salarie.date_entree)),
+        _rubrique("S21.G00.40.003", STATUT_CADRE if salarie.statut.lower() == "cadre" else STATUT_NON_CADRE),
+        _rubrique("S21.G00.40.007", NATURES_CONTRAT.get(salarie.contrat.upper(), "01")),
+        _rubrique("S21.G00.40.009", numero_contrat),
+        _rubrique("S21.G00.40.011", "10"),
+        _rubrique("S21.G00.40.012", "151.67"),
+        _rubrique("S21.G00.40.013", f"{salarie.temps_travail:.2f}"),
+        _rubrique("S21.G00.50.001", fin),
+        _rubrique("S21.G00.50.002", _euros(_centimes(bulletin.net_imposable))),
+        _rubrique("S21.G00.50.004", _euros(_centimes(bulletin.net_a_payer))),
+    ]
+    if bulletin.net_imposable:
+        rubriques.append(_rubrique("S21.G00.50.006", f"{100 * bulletin.prelevement_a_la_source / bulletin.net_imposable:.2f}"))
+    rubriques += [
+        _rubrique("S21.G00.50.009", _euros(_centimes(bulletin.prelevement_a_la_source))),
+        _rubrique("S21.G00.51.001", debut),
+        _rubrique("S21.G00.51.002", fin),
+        _rubrique("S21.G00.51.010", numero_contrat),
+        _rubrique("S21.G00.51.011", "001"),
+        _rubrique("S21.G00.51.013", _euros(_centimes(bulletin.salaire_brut))),
+    ]
+
+    # Une base assujettie par code, suivie de ses cotisations individuelles
+    par_assiette = bulletin.assiettes
+    par_base = {}
+    for cotisation in bulletin.cotisations:
+        par_base.setdefault(cotisation.correspondance.code_base, []).append(cotisation)
+    for code_base in sorted(par_base):
+        cotisations = par_base[code_base]
+        # La base CSG est celle des lignes CSG du bulletin, les autres se déduisent du brut
+        montant_base = cotisations[0].assiette if BASES.get(code_base) == "csg" else _centimes(par_assiette[BASES.get(code_base, "brute")])
+        rubriques += [
+            _rubrique("S21.G00.78.001", code_base),
+            _rubrique("S21.G00.78.002", debut),
+            _rubrique("S21.G00.78.003", fin),
+            _rubrique("S21.G00.78.004", _euros(montant_base)),
+        ]
+        for cotisation in cotisations:
+            rubriques += [
+                _rubrique("S21.G00.81.001", cotisation.correspondance.code_cotisation),
+                _rubrique("S21.G00.81.002", cotisation.correspondance.organisme),
+                _rubrique("S21.G00.81.003", _euros(cotisation.assiette)),
+                _rubrique("S21.G00.81.004", _euros(cotisation.montant)),
+            ]
+            if cotisation.taux:
+                rubriques.append(_rubrique("S21.G00.81.007", cotisation.taux))
+    return rubriques
+
+
+class AgregatsDSN:
+    """
+    Cumul, bulletin après bulletin, des blocs de l'entreprise : montant versé à chaque organisme
+    et, pour les codes type de personnel, assiette et montant agrégés. Montants en centimes.
+    """
+
+    def __init__(self):
+        self.versements = {}
+        self.cotisations = {}
+
+    def ajouter(self, cotisations):
+        comptees = set()
+        for cotisation in cotisations:
+            c = cotisation.correspondance
+            self.versements[c.organisme] = self.versements.get(c.organisme, 0) + cotisation.montant
+            if not c.ctp:
+                continue
+            cle = (c.organisme, c.ctp, c.qualifiant_assiette)
+            cumul = self.cotisations.setdefault(cle, [0, 0])
+            # Plusieurs catégories partagent un code type de personnel : l'assiette du salarié compte une fois
+            if cle not in comptees:
+                cumul[0] += cotisation.assiette
+                comptees.add(cle)
+            cumul[1] += cotisation.montant
+
+    def rubriques(self, periode, organismes=None):
+        """Blocs S21.G00.20, S21.G00.22 et S21.G00.23, par organisme."""
+        organismes = organismes or {}
+        debut, fin = _bornes(periode)
+        rubriques = []
+        for organisme in sorted(self.versements):
+            identifiant = organismes.get(organisme, organisme)
+            montant = _euros(self.versements[organisme])
+            rubriques += [
+                _rubrique("S21.G00.20.001", identifiant),
+                _rubrique("S21.G00.20.005", montant),
+                _rubrique("S21.G00.20.006", debut),
+                _rubrique("S21.G00.20.007", fin),
+                _rubrique("S21.G00.20.010", MODE_PAIEMENT),
+                _rubrique("S21.G00.22.001", identifiant),
+                _rubrique("S21.G00.22.003", debut),
+                _rubrique("S21.G00.22.004", fin),
+                _rubrique("S21.G00.22.005", montant),
+            ]
+            for (organisme_ctp, ctp, qualifiant), (assiette, montant_ctp) in sorted(self.cotisations.items()):
+                if organisme_ctp != organisme:
+                    continue
+                rubriques += [
+                    _rubrique("S21.G00.23.001", ctp),
+                    _rubrique("S21.G00.23.002", qualifiant),
+                    _rubrique("S21.G00.23.004", _euros(assiette)),
+                    _rubrique("S21.G00.23.005", _euros(montant_ctp)),
+                ]
+        return rubriques
+
+
+def rubriques_entete(entreprise, periode, essai=False, date_constitution=None):
+    """Envoi, émetteur, déclaration, entreprise et établissement (S10 à S21.G00.11)."""
+    siren, nic = entreprise.siret[:9], entreprise.siret[9:]
+    voie, code_postal, localite = _adresse(entreprise.adresse)
+    adresse = [("004", voie)] + ([("005", code_postal), ("006", localite)] if code_postal else [])
+    rubriques = [
+        _rubrique("S10.G00.00.001", LOGICIEL),
+        _rubrique("S10.G00.00.002", LOGICIEL),
+        _rubrique("S10.G00.00.003", VERSION_LOGICIEL),
+        _rubrique("S10.G00.00.005", "02" if essai else "01"),
+        _rubrique("S10.G00.00.006", NORME),
+        _rubrique("S10.G00.00.008", "01"),
+        _rubrique("S10.G00.01.001", siren),
+        _rubrique("S10.G00.01.002", nic),
+        _rubrique("S10.G00.01.003", entreprise.nom),
+    ]
+    rubriques += [_rubrique(f"S10.G00.01.{code}", valeur) for code, valeur in adresse]
+    rubriques += [
+        _rubrique("S20.G00.05.001", "01"),
+        _rubrique("S20.G00.05.002", "01"),
+        _rubrique("S20.G00.05.003", "11"),
+        _rubrique("S20.G00.05.004", "1"),
+        _rubrique("S20.G00.05.005", _bornes(periode)[0]),
+        _rubrique("S20.G00.05.007", _date(date_constitution or date.today())),
+        _rubrique("S21.G00.06.001", siren),
+        _rubrique("S21.G00.06.002", nic),
+    ]
+    rubriques += [_rubrique(f"S21.G00.06.{code}", valeur) for code, valeur in adresse]
+    rubriques += [
+        _rubrique("S21.G00.11.001", nic),
+        _rubrique("S21.G00.11.008", int(entreprise.effectif)),
+    ]
+    return rubriques
+
+
+def ecrire_dsn(chemin, entreprise, periode, bulletins, organismes=None, essai=False, date_constitution=None):
+    """
+    Écrit la DSN mensuelle d'un établissement.
+
+    :param bulletins: Itérable de (Salarie, lignes d'ajouter_sous_totaux), consommé un par un
+        (par exemple un générateur qui calcule les bulletins au fur et à mesure)
+    :param organismes: {organisme de correspondances_dsn.csv: identifiant déclaré (SIRET de l'URSSAF...)}
+    :param essai: True pour un envoi de test
+    :return: Nombre de salariés déclarés
+    """
+    table = correspondances()
+    p = plafonds(periode)
+    agregats = AgregatsDSN()
+    nb_salaries = nb_rubriques = 0
+    with tempfile.TemporaryFile("w+", encoding="latin-1", errors="replace") as individus:
+        for salarie, lignes in bulletins:
+            bulletin = lire_bulletin(lignes, periode, table, p)
+            rubriques = rubriques_salarie(salarie, bulletin, periode)
+            individus.writelines(rubriques)
+            agregats.ajouter(bulletin.cotisations)
+            nb_salaries += 1
+            nb_rubriques += len(rubriques)
+
+        entete = rubriques_entete(entreprise, periode, essai, date_constitution) + agregats.rubriques(periode, organismes)
+        # Le total de l'envoi compte toutes les rubriques, y compris les siennes
+        total = len(entete) + nb_rubriques + 2
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, "w", encoding="latin-1", errors="replace", newline="\n") as f:
+            f.writelines(entete)
+            individus.seek(0)
+            shutil.copyfileobj(individus, f)
+            f.writelines([_rubrique("S90.G00.90.001", total), _rubrique("S90.G00.90.002", 1)])
+        os.replace(temporaire, chemin)
+    return nb_salaries
@@ -0,0 +1,207 @@
+"""
+Export en colonnes (Parquet) des lignes de bulletins, pour les outils d'analyse.
+
+Une ligne par rubrique de bulletin : salarie, categorie, base, taux, total (part salariale) et
+part_employeur, en nombres (vides -> null) ; les catégories sont encodées en dictionnaire. Le
+dossier d'export est partitionné par période puis par entreprise (SIRET), à la façon de Hive :
+
+    dossier/periode=2025-01/entreprise=12345678900012/lignes.parquet
+
+de sorte qu'une lecture filtrée sur un mois et une entreprise n'ouvre qu'un fichier, et n'en lit
+que les colonnes demandées. ExportParquet reçoit les bulletins au fil d'un calcul par lots et écrit
+chaque partition par groupes de lignes (row groups) dès qu'un groupe est plein.
+
+pyarrow est une dépendance optionnelle, importée seulement à l'utilisation.
+"""
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+from stockage import _nombre, _periode
+
+NOM_FICHIER = "lignes.parquet"
+COLONNES_LIGNES = ["salarie", "categorie", "base", "taux", "total", "part_employeur"]
+# Colonnes du bulletin (format ajouter_sous_totaux) reprises dans les colonnes numériques
+COLONNES_MONTANTS = {"base": "Base", "taux": "Taux (%)", "total": "Total (€)", "part_employeur": "Part_Employeur"}
+SOUS_TOTAL_PATRONAL = "Sous-total Cotisations Patronales"
+TAILLE_GROUPE = 65536
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("L'export Parquet nécessite pyarrow (pip install pyarrow)") from e
+    return pyarrow, pyarrow.parquet
+
+
+@lru_cache(maxsize=None)
+def schema_lignes():
+    """Schéma Arrow des fichiers d'une partition (période et entreprise sont dans le chemin)."""
+    pa, _ = _arrow()
+    return pa.schema([
+        ("salarie", pa.string()),
+        ("categorie", pa.dictionary(pa.int32(), pa.string())),
+        ("base", pa.float64()),
+        ("taux", pa.float64()),
+        ("total", pa.float64()),
+        ("part_employeur", pa.float64()),
+    ])
+
+
+def chemin_partition(dossier, periode, entreprise):
+    return os.path.join(dossier, f"periode={_periode(periode)}", f"entreprise={entreprise}")
+
+
+def colonnes_bulletin(identifiant, lignes):
+    """
+    Colonnes d'un bulletin au format de l'export.
+    :param lignes: Lignes d'ajouter_sous_totaux (DataFrame ou liste de dictionnaires)
+    """
+    if isinstance(lignes, pd.DataFrame):
+        sources = {colonne: lignes[source].tolist() for colonne, source in COLONNES_MONTANTS.items()}
+        categories = lignes["Catégorie"].tolist()
+    else:
+        lignes = list(lignes)
+        sources = {colonne: [ligne.get(source) for ligne in lignes] for colonne, source in COLONNES_MONTANTS.items()}
+        categories = [ligne["Catégorie"] for ligne in lignes]
+    colonnes = {"salarie": [identifiant] * len(categories), "categorie": categories}
+    for colonne, valeurs in sources.items():
+        colonnes[colonne] = [_nombre(valeur) for valeur in valeurs]
+    return colonnes
+
+
+class ExportParquet:
+    """
+    Écriture d'un export partitionné, bulletin par bulletin :
+
+        with ExportParquet("export") as export:
+            for salarie, periode, lignes in bulletins:
+                export.ajouter(salarie, periode, lignes)
+
+    Chaque partition garde en mémoire au plus un groupe de lignes en cours. Les fichiers sont écrits
+    sous un nom temporaire et remplacent, à la fermeture, ceux d'un export précédent des mêmes
+    partitions.
+    """
+
+    def __init__(self, dossier, taille_groupe=TAILLE_GROUPE, compression="zstd"):
+        self.pa, self.pq = _arrow()
+        self.dossier = dossier
+        self.taille_groupe = taille_groupe
+        self.compression = compression
+        # {(période, SIRET): colonnes en attente}, {(période, SIRET): (ParquetWriter, chemin temporaire)}
+        self.tampons = {}
+        self.fichiers = {}
+        self.nb_lignes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_exception, exception, trace):
+        if type_exception is None:
+            self.fermer()
+        else:
+            self.abandonner()
+
+    def ajouter(self, salarie, periode, lignes, identifiant=None):
+        """
+        Ajoute les lignes d'un bulletin à la partition de sa période et de l'entreprise du salarié.
+        :param identifiant: Identifiant du salarié dans l'export (par défaut, son numéro de sécurité sociale)
+        """
+        cle = (_periode(periode), salarie.entreprise.siret)
+        colonnes = colonnes_bulletin(identifiant if identifiant is not None else salarie.numero_ss, lignes)
+        tampon = self.tampons.setdefault(cle, {colonne: [] for colonne in COLONNES_LIGNES})
+        for colonne, valeurs in colonnes.items():
+            tampon[colonne] += valeurs
+        self.nb_lignes += len(colonnes["salarie"])
+        while len(tampon["salarie"]) >= self.taille_groupe:
+            self._vider(cle, self.taille_groupe)
+
+    def _vider(self, cle, n=None):
+        """Écrit les n premières lignes en attente de la partition (toutes par défaut) en un groupe."""
+        tampon = self.tampons[cle]
+        n = len(tampon["salarie"]) if n is None else n
+        if n == 0:
+            return
+        groupe = {colonne: valeurs[:n] for colonne, valeurs in tampon.items()}
+        for valeurs in tampon.values():
+            del valeurs[:n]
+        pa = self.pa
+        schema = schema_lignes()
+        table = pa.table({
+            "salarie": pa.array(groupe["salarie"], pa.string()),
+            "categorie": pa.array(groupe["categorie"], pa.string()).dictionary_encode(),
+            **{c: pa.array(groupe[c], pa.float64(), from_pandas=True) for c in COLONNES_MONTANTS},
+        }, schema=schema)
+        if cle not in self.fichiers:
+            dossier = chemin_partition(self.dossier, *cle)
+            os.makedirs(dossier, exist_ok=True)
+            # Préfixe "." : ignoré par les lectures du dossier tant que le fichier est en cours
+            temporaire = os.path.join(dossier, f".{NOM_FICHIER}.{os.getpid()}.tmp")
+            writer = self.pq.ParquetWriter(temporaire, schema, compression=self.compression,
+                                           use_dictionary=["salarie", "categorie"])
+            self.fichiers[cle] = (writer, temporaire)
+        self.fichiers[cle][0].write_table(table, row_group_size=self.taille_groupe)
+
+    def fermer(self):
+        """Écrit les groupes en attente et met les fichiers des partitions en place."""
+        for cle in self.tampons:
+            self._vider(cle)
+        self.tampons = {}
+        for cle, (writer, temporaire) in self.fichiers.items():
+            writer.close()
+            os.replace(temporaire, os.path.join(chemin_partition(self.dossier, *cle), NOM_FICHIER))
+        self.fichiers = {}
+
+    def abandonner(self):
+        """Ferme les fichiers en cours sans toucher à l'export précédent."""
+        for writer, temporaire in self.fichiers.values():
+            writer.close()
+            os.remove(temporaire)
+        self.fichiers, self.tampons = {}, {}
+
+
+def exporter_parquet(dossier, bulletins, taille_groupe=TAILLE_GROUPE):
+    """
+    Exporte des bulletins consommés un par un.
+    :param bulletins: Itérable de (Salarie, période, lignes d'ajouter_sous_totaux)
+    :return: Nombre de lignes exportées
+    """
+    with ExportParquet(dossier, taille_groupe) as export:
+        for salarie, periode, lignes in bulletins:
+            export.ajouter(salarie, periode, lignes)
+    return export.nb_lignes
+
+
+def lire_lignes(dossier, periode=None, entreprise=None, colonnes=None):
+    """
+    Lit l'export sous forme de table Arrow, avec les colonnes de partition periode et entreprise.
+    Seules les partitions du filtre et les colonnes demandées sont lues.
+    """
+    pa, _ = _arrow()
+    import pyarrow.dataset as ds
+
+    partitionnement = ds.partitioning(pa.schema([("periode", pa.string()), ("entreprise", pa.string())]), flavor="hive")
+    donnees = ds.dataset(dossier, format="parquet", partitioning=partitionnement)
+    filtre = None
+    if periode is not None:
+        filtre = ds.field("periode") == _periode(periode)
+    if entreprise is not None:
+        condition = ds.field("entreprise") == entreprise
+        filtre = condition if filtre is None else filtre & condition
+    return donnees.to_table(columns=colonnes, filter=filtre)
+
+
+def charges_patronales(dossier, periode, entreprise):
+    """
+    Total des cotisations patronales (nettes des réductions) d'une entreprise pour un mois : seul le
+    fichier de la partition est ouvert, et seules ses colonnes categorie et part_employeur sont lues.
+    """
+    _, pq = _arrow()
+    chemin = os.path.join(chemin_partition(dossier, periode, entreprise), NOM_FICHIER)
+    if not os.path.exists(chemin):
+        return 0.0
+    table = pq.read_table(chemin, columns=["part_employeur"], filters=[("categorie", "=", SOUS_TOTAL_PATRONAL)])
+    return float(sum(v for v in table.column("part_employeur").to_pylist() if v is not None))
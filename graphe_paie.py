@@ -0,0 +1,258 @@
+import copy
+import dataclasses
+
+import pandas as pd
+
+from parametres_entreprise import parametres_entreprise
+from payroll import (
+    CANAUX_TIMESHEET,
+    calcul_avantages_en_nature,
+    calcul_cotisations,
+    calcul_primes,
+    calcul_taxe_progressive,
+    calculer_reduction_fillon,
+    df_cotis,
+    exoneration_heures_sup,
+    heures_majorees,
+    jours_travailles,
+    lignes_absences_maladie,
+    lignes_heures_sup,
+    lignes_majorations,
+    lignes_primes_et_avantages,
+    lignes_reductions,
+    lignes_salaire_brut,
+    lignes_salaire_de_base,
+    lignes_sous_totaux,
+    merge_overlapping_days,
+    montant_net_social,
+    net_a_payer,
+    net_imposable,
+    periode_de_paie,
+    reduction_tepa_par_heure,
+)
+
+CONTRAT = "heures contractuelles"
+REELLES = "heures réelles normales"
+NUIT = "heures de nuit"
+DIMANCHE = "heures de dimanche"
+RTT = "absence rémunérée RTT"
+CP = "absence rémunérée congé payé"
+JF_R = "absence rémunérée jour férié"
+JF_NR = "absence non rémunérée jour férié"
+
+
+def canal(nom):
+    """Nom du noeud source portant une colonne de la timesheet."""
+    return f"canal:{nom}"
+
+
+def _egal(a, b):
+    if isinstance(a, (pd.DataFrame, pd.Series)) or isinstance(b, (pd.DataFrame, pd.Series)):
+        return type(a) is type(b) and a.equals(b)
+    if isinstance(a, (tuple, list)) and isinstance(b, (tuple, list)):
+        return len(a) == len(b) and all(_egal(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_egal(a[k], b[k]) for k in a)
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+
+def _timesheet(dates, canaux):
+    """Reconstruit une timesheet limitée aux canaux fournis {colonne: valeurs}."""
+    return pd.DataFrame({nom: list(valeurs) for nom, valeurs in canaux.items()},
+                        index=pd.to_datetime(list(dates)))
+
+
+# =============================================================================
+# Noeuds du calcul
+# =============================================================================
+def _periode(dates):
+    return periode_de_paie(pd.DataFrame(index=list(dates)))
+
+def _lignes_salaire(salarie, dates, rtt, cp, jf_r, jf_nr):
+    ts = _timesheet(dates, {RTT: rtt, CP: cp, JF_R: jf_r, JF_NR: jf_nr})
+    return lignes_salaire_de_base(salarie, ts)
+
+def _primes(salarie, primes, periode):
+    # Mois de paie imposé, comme calculer_bulletin(..., periode_primes=periode) : le mois du 13ème mois
+    # n'est pas celui du premier jour de la timesheet, ni l'ancienneté comptée au jour du calcul
+    return calcul_primes(salarie, primes, None, periode)
+
+def _jours_travailles(dates, reelles):
+    return int(jours_travailles(_timesheet(dates, {REELLES: reelles})))
+
+def _avantages(salarie, avantages, jours, periode):
+    return calcul_avantages_en_nature(salarie, avantages, None, jours_travailles_mois=jours, periode=periode)
+
+def _timesheet_fusionnee(dates, contrat, reelles, nuit, dimanche, rtt, cp, jf_r, timesheet_prec):
+    ts = _timesheet(dates, {CONTRAT: contrat, REELLES: reelles, NUIT: nuit, DIMANCHE: dimanche, RTT: rtt, CP: cp, JF_R: jf_r})
+    return merge_overlapping_days(timesheet_prec, ts)
+
+def _jours_travailles_fusionnes(fusionnee):
+    return int(jours_travailles(fusionnee))
+
+def _tickets_resto(salarie, avantages, jours):
+    return calcul_avantages_en_nature(salarie, avantages, None, jours_travailles_mois=jours)["Détail des avantages"].get("nourriture", 0)
+
+def _lignes_brut(salarie, lignes_salaire, lignes_maladie, primes, avantages, heures):
+    hs25, hs50, heures_nuit, heures_dimanche = heures
+    return lignes_salaire_brut(lignes_salaire, lignes_maladie,
+                               lignes_primes_et_avantages(primes, avantages),
+                               lignes_heures_sup(salarie, hs25, hs50),
+                               lignes_majorations(salarie, heures_nuit, heures_dimanche))
+
+def _lignes_cotisations(salarie, cotisations, lignes_brut, periode):
+    return df_cotis(salarie, cotisations, lignes_brut[0], periode)
+
+def _lignes_reductions(salarie, lignes_cotisations, fillon, tepa, exoneration, resto):
+    return lignes_reductions(salarie, lignes_cotisations, fillon[0], fillon[1], tepa, exoneration, resto)
+
+def _net(salarie, salaire_brut, cotisations, exoneration, periode):
+    net_impos = net_imposable(salarie, periode, salaire_brut)
+    return {
+        "Montant net social": montant_net_social(salarie, cotisations, None, periode=periode, exoneration=exoneration,
+                                                 salaire_brut=salaire_brut),
+        "Net imposable": net_impos,
+        "Prelevement à la source": calcul_taxe_progressive(net_impos),
+        "Net à payer": net_a_payer(salarie, periode, salaire_brut),
+    }
+
+def _bulletin(lignes_reductions, net):
+    return lignes_sous_totaux(lignes_reductions, net["Montant net social"], net["Net imposable"],
+                              net["Prelevement à la source"], net["Net à payer"])
+
+
+NOEUDS = {
+    "periode": (["dates"], _periode),
+    "lignes_salaire": (["salarie", "dates", canal(RTT), canal(CP), canal(JF_R), canal(JF_NR)], _lignes_salaire),
+    "lignes_maladie": (["salarie", "absence_motifs", "periode"], lignes_absences_maladie),
+    "primes": (["salarie", "primes_declarees", "periode"], _primes),
+    "jours_travailles": (["dates", canal(REELLES)], _jours_travailles),
+    "avantages": (["salarie", "avantages_declares", "jours_travailles", "periode"], _avantages),
+    "timesheet_fusionnee": (["dates", canal(CONTRAT), canal(REELLES), canal(NUIT), canal(DIMANCHE), canal(RTT), canal(CP), canal(JF_R),
+                             "timesheet_prec"], _timesheet_fusionnee),
+    "heures_majorees": (["timesheet_fusionnee"], heures_majorees),
+    "heures_sup": (["heures_majorees"], lambda heures: heures[:2]),
+    "jours_travailles_fusionnes": (["timesheet_fusionnee"], _jours_travailles_fusionnes),
+    "tickets_resto": (["salarie", "avantages_declares", "jours_travailles_fusionnes"], _tickets_resto),
+    "lignes_brut": (["salarie", "lignes_salaire", "lignes_maladie", "primes", "avantages", "heures_majorees"], _lignes_brut),
+    "salaire_brut": (["lignes_brut"], lambda lignes_brut: float(lignes_brut[1])),
+    "cotisations": (["salarie", "periode", "salaire_brut"], calcul_cotisations),
+    "lignes_cotisations": (["salarie", "cotisations", "lignes_brut", "periode"], _lignes_cotisations),
+    "fillon": (["salarie", "periode", "salaire_brut"], lambda salarie, periode, brut: calculer_reduction_fillon(salarie, None, periode, brut)),
+    "tepa": (["salarie", "heures_sup"], lambda salarie, hs: reduction_tepa_par_heure(hs[0] + hs[1], parametres_entreprise(salarie.entreprise).tepa_par_heure)),
+    "exoneration_hs": (["salarie", "heures_sup"], lambda salarie, hs: exoneration_heures_sup(salarie, hs[0], hs[1])),
+    "lignes_reductions": (["salarie", "lignes_cotisations", "fillon", "tepa", "exoneration_hs", "tickets_resto"], _lignes_reductions),
+    "net": (["salarie", "salaire_brut", "cotisations", "exoneration_hs", "periode"], _net),
+    "bulletin": (["lignes_reductions", "net"], _bulletin),
+}
+
+
+class GrapheBulletin:
+    """
+    Calcul d'un bulletin modélisé comme un graphe de noeuds nommés aux entrées explicites.
+
+    Les sources sont le salarié, les avantages et primes déclarés, les motifs d'absence,
+    la timesheet du mois précédent et chaque canal de la timesheet du mois. Modifier une source
+    n'invalide que les noeuds en aval ; un noeud recalculé dont la valeur ne change pas
+    (par exemple le nombre de jours travaillés quand seules les heures d'un jour travaillé
+    changent) ne propage rien.
+    """
+
+    def __init__(self, salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs=None):
+        self._sources = {}  # nom -> (valeur, version)
+        self._valeurs = {}  # nom -> (valeur, version, versions des entrées)
+        self._revision = 0
+        self.recalculs = []
+        self.modifier("salarie", salarie)
+        self.modifier("avantages_declares", avantages)
+        self.modifier("primes_declarees", primes)
+        self.modifier("absence_motifs", absence_motifs or {})
+        self.modifier("timesheet_prec", timesheet_prec)
+        self.modifier_timesheet(timesheet)
+
+    def modifier(self, nom, valeur):
+        """Remplace une source ; ne fait rien si la valeur est inchangée."""
+        if nom in NOEUDS:
+            raise KeyError(f"{nom} est un noeud calculé, pas une source")
+        if nom == "salarie":
+            # Le salaire brut est un résultat du graphe : on ne garde que les entrées
+            valeur = dataclasses.replace(valeur, salaire_brut=0.0)
+        elif isinstance(valeur, pd.DataFrame):
+            valeur = valeur.copy()
+        else:
+            valeur = copy.deepcopy(valeur)
+
+        if nom in self._sources and _egal(self._sources[nom][0], valeur):
+            return
+        self._revision += 1
+        self._sources[nom] = (valeur, self._revision)
+
+    def modifier_timesheet(self, timesheet):
+        """Met à jour les dates et chacun des canaux de la timesheet combinée du mois."""
+        self.modifier("dates", tuple(pd.to_datetime(timesheet.index).strftime("%Y-%m-%d")))
+        for nom in CANAUX_TIMESHEET:
+            self.modifier(canal(nom), tuple(timesheet[nom].tolist()))
+
+    def modifier_heures(self, nom_canal, date, heures):
+        """Corrige une seule cellule de la timesheet (un canal, un jour)."""
+        dates = self._sources["dates"][0]
+        valeurs = list(self._sources[canal(nom_canal)][0])
+        valeurs[dates.index(date)] = heures
+        self.modifier(canal(nom_canal), tuple(valeurs))
+
+    def valeur(self, nom):
+        self.recalculs = []
+        return self._evaluer(nom, set())
+
+    def bulletin(self):
+        """Lignes du bulletin, identiques à celles de calculer_bulletin(..., periode_primes=mois de paie)."""
+        return self.valeur("bulletin").copy()
+
+    def _version(self, nom):
+        if nom in self._sources:
+            return self._sources[nom][1]
+        return self._valeurs[nom][1]
+
+    def _evaluer(self, nom, verifies):
+        if nom in self._sources:
+            return self._sources[nom][0]
+        if nom in verifies:
+            return self._valeurs[nom][0]
+
+        entrees, fonction = NOEUDS[nom]
+        arguments = [self._evaluer(e, verifies) for e in entrees]
+        versions = tuple(self._version(e) for e in entrees)
+        verifies.add(nom)
+
+        precedent = self._valeurs.get(nom)
+        if precedent is not None and precedent[2] == versions:
+            return precedent[0]
+
+        resultat = fonction(*arguments)
+        self.recalculs.append(nom)
+        if precedent is not None and _egal(precedent[0], resultat):
+            # Valeur inchangée : les noeuds en aval restent valides
+            self._valeurs[nom] = (precedent[0], precedent[1], versions)
+        else:
+            self._revision += 1
+            self._valeurs[nom] = (resultat, self._revision, versions)
+        return self._valeurs[nom][0]
+
+
+def appliquer_corrections(graphes, corrections):
+    """
+    Applique un lot de corrections de timesheet et renvoie les bulletins des seuls salariés concernés.
+
+    :param graphes: Dictionnaire {identifiant salarié: GrapheBulletin}
+    :param corrections: Itérable de (identifiant salarié, canal, date "AAAA-MM-JJ", heures)
+    :return: Dictionnaire {identifiant salarié: bulletin recalculé}
+    """
+    concernes = []
+    for identifiant, nom_canal, date, heures in corrections:
+        graphes[identifiant].modifier_heures(nom_canal, date, heures)
+        if identifiant not in concernes:
+            concernes.append(identifiant)
+    return {identifiant: graphes[identifiant].bulletin() for identifiant in concernes}
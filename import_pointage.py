@@ -0,0 +1,171 @@
+import calendar
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from payroll import CANAUX_TIMESHEET
+
+# Colonnes attendues dans les exports de la badgeuse
+COLONNES_EXPORT = {"salarie": "employee", "date": "date", "canal": "channel", "heures": "hours"}
+
+# Même plage que les saisies du calendrier dans l'application
+HEURES_MIN = 0.0
+HEURES_MAX = 24.0
+
+# Libellés de canal acceptés : nom complet de la colonne, code court ou nom d'onglet de l'application
+ALIAS_CANAUX = {nom: i for i, nom in enumerate(CANAUX_TIMESHEET)}
+ALIAS_CANAUX.update({
+    "contractuelles": 0,
+    "reelles": 1,
+    "nuit": 2,
+    "dimanche": 3,
+    "rtt": 4,
+    "cp": 5,
+    "jf": 6,
+    "jf_r": 6,
+    "jf_nr": 7,
+    "injustifiee": 8,
+    "maladie": 9,
+})
+
+
+def dates_du_mois(annee, mois):
+    """Dates de la timesheet combinée : du lundi de la première semaine au dernier jour du mois."""
+    premier = datetime(annee, mois, 1)
+    debut = premier - timedelta(days=premier.weekday())
+    fin = datetime(annee, mois, calendar.monthrange(annee, mois)[1])
+    return pd.date_range(debut, fin, freq="D")
+
+
+@dataclass
+class TimesheetsMois:
+    """
+    Heures d'un mois pour tous les salariés importés.
+    heures[i, j, k] : heures du salarié salaries[i], au jour dates[j], sur le canal CANAUX_TIMESHEET[k].
+    """
+    annee: int
+    mois: int
+    salaries: np.ndarray
+    dates: pd.DatetimeIndex
+    heures: np.ndarray
+    rejets: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    def timesheet(self, salarie):
+        """Timesheet d'un salarié au format produit par combine_timesheets."""
+        i = int(np.searchsorted(self.salaries, salarie))
+        if i >= len(self.salaries) or self.salaries[i] != salarie:
+            raise KeyError(f"Salarié {salarie} absent de l'import")
+        df = pd.DataFrame(self.heures[i], columns=CANAUX_TIMESHEET, index=self.dates.strftime("%Y-%m-%d"))
+        df.index.name = "date"
+        return df
+
+    def timesheets(self):
+        for salarie in self.salaries:
+            yield salarie, self.timesheet(salarie)
+
+
+def _lire_par_blocs(chemin, colonnes, taille_bloc):
+    usecols = list(colonnes.values())
+    if os.path.splitext(chemin)[1].lower() in (".xlsx", ".xls"):
+        # Les fichiers Excel ne se lisent pas par blocs : on découpe après lecture
+        df = pd.read_excel(chemin, usecols=usecols, dtype={colonnes["salarie"]: str, colonnes["date"]: str})
+        for debut in range(0, len(df), taille_bloc):
+            yield df.iloc[debut:debut + taille_bloc]
+    else:
+        yield from pd.read_csv(
+            chemin,
+            usecols=usecols,
+            dtype={colonnes["salarie"]: str, colonnes["date"]: str, colonnes["canal"]: "category"},
+            chunksize=taille_bloc,
+        )
+
+
+def importer_pointages(chemin, annee, mois, colonnes=None, taille_bloc=1_000_000):
+    """
+    Importe un export de badgeuse (une ligne par salarié, date, canal et nombre d'heures) pour un mois.
+
+    Le fichier est lu par blocs ; chaque bloc est validé et ventilé en une seule passe vectorisée
+    dans un tableau (salariés x jours x canaux). Les lignes hors du mois, au canal inconnu ou aux
+    heures hors de [0, 24] sont écartées et listées dans `rejets`, de même que les cellules dont
+    le cumul dépasse 24h. Les lignes en double pour une même cellule sont additionnées.
+
+    :param chemin: Fichier CSV ou Excel
+    :param colonnes: Correspondance des colonnes du fichier, par défaut COLONNES_EXPORT
+    :return: TimesheetsMois
+    """
+    colonnes = {**COLONNES_EXPORT, **(colonnes or {})}
+    dates = dates_du_mois(annee, mois)
+    premier_jour = np.datetime64(datetime(annee, mois, 1).date())
+    dernier_jour = np.datetime64(dates[-1].date())
+    origine = np.datetime64(dates[0].date())
+    nb_jours = len(dates)
+    nb_canaux = len(CANAUX_TIMESHEET)
+
+    index_salaries = {}
+    totaux = np.zeros(0)
+    rejets = []
+
+    for bloc in _lire_par_blocs(chemin, colonnes, taille_bloc):
+        jours = pd.to_datetime(bloc[colonnes["date"]], format="ISO8601", errors="coerce").to_numpy().astype("datetime64[D]")
+        # Le libellé de canal n'est résolu qu'une fois par modalité ; le code -1 (valeur manquante) tombe sur -1
+        canaux = bloc[colonnes["canal"]].astype("category")
+        table_canaux = np.array([ALIAS_CANAUX.get(str(c).strip(), -1) for c in canaux.cat.categories] + [-1], dtype=np.int64)
+        canal = table_canaux[canaux.cat.codes.to_numpy()]
+        heures = pd.to_numeric(bloc[colonnes["heures"]], errors="coerce").to_numpy(dtype=np.float64)
+
+        salarie_connu = bloc[colonnes["salarie"]].notna().to_numpy()
+        canal_connu = canal >= 0
+        dans_le_mois = (jours >= premier_jour) & (jours <= dernier_jour)
+        heures_valides = (heures >= HEURES_MIN) & (heures <= HEURES_MAX)
+        valide = salarie_connu & canal_connu & dans_le_mois & heures_valides
+
+        if not valide.all():
+            rejet = bloc[~valide].copy()
+            rejet["motif"] = np.select(
+                [~salarie_connu[~valide], ~canal_connu[~valide], ~dans_le_mois[~valide]],
+                ["salarié manquant", "canal inconnu", "date hors du mois"],
+                default="heures hors de [0, 24]",
+            )
+            rejets.append(rejet)
+
+        # Numérotation des salariés : seules les valeurs distinctes du bloc passent par le dictionnaire
+        codes, uniques = pd.factorize(bloc[colonnes["salarie"]].to_numpy()[valide])
+        correspondance = np.empty(len(uniques), dtype=np.int64)
+        for i, salarie in enumerate(uniques):
+            correspondance[i] = index_salaries.setdefault(salarie, len(index_salaries))
+
+        taille = len(index_salaries) * nb_jours * nb_canaux
+        if len(totaux) < taille:
+            totaux = np.concatenate([totaux, np.zeros(taille - len(totaux))])
+
+        jour = (jours[valide] - origine).astype(np.int64)
+        position = (correspondance[codes] * nb_jours + jour) * nb_canaux + canal[valide]
+        totaux += np.bincount(position, weights=heures[valide], minlength=len(totaux))
+
+    heures = totaux.reshape(len(index_salaries), nb_jours, nb_canaux)
+    salaries = np.array(list(index_salaries), dtype=object)
+
+    # Cumul d'une cellule au-delà de 24h (plusieurs lignes pour le même jour et le même canal)
+    depassements = np.argwhere(heures > HEURES_MAX)
+    if len(depassements):
+        rejets.append(pd.DataFrame({
+            colonnes["salarie"]: salaries[depassements[:, 0]],
+            colonnes["date"]: dates[depassements[:, 1]].strftime("%Y-%m-%d"),
+            colonnes["canal"]: np.array(CANAUX_TIMESHEET, dtype=object)[depassements[:, 2]],
+            colonnes["heures"]: heures[depassements[:, 0], depassements[:, 1], depassements[:, 2]],
+            "motif": "cumul journalier supérieur à 24h",
+        }))
+        heures[depassements[:, 0], depassements[:, 1], depassements[:, 2]] = 0.0
+
+    ordre = np.argsort(salaries.astype(str), kind="stable")
+    return TimesheetsMois(
+        annee=annee,
+        mois=mois,
+        salaries=salaries[ordre],
+        dates=dates,
+        heures=heures[ordre],
+        rejets=pd.concat(rejets, ignore_index=True) if rejets else pd.DataFrame(),
+    )
@@ -0,0 +1,301 @@
+"""
+Mode en centimes entiers : cotisations, réduction Fillon, net imposable, prélèvement à la source et
+net à payer d'un effectif, ou bulletin complet d'un salarié (moteur "centimes" de calculer_bulletin),
+calculés en arithmétique entière exacte.
+
+Les montants sont des tableaux NumPy int64 de centimes ; les taux sont des entiers à l'échelle
+ECHELLE_TAUX (millionièmes : 0.0855 -> 85500). Chaque ligne est arrondie une fois, au centime le
+plus proche (demi-centime arrondi en s'éloignant de zéro), à la manière des bordereaux URSSAF :
+
+- chaque ligne de rémunération du bulletin est arrondie au centime, le salaire brut en est la somme ;
+- les plafonds (PMSS, tranches, seuils) et les forfaits sont convertis en centimes ;
+- l'assiette CSG/CRDS est arrondie au centime, puis chaque contribution sur cette assiette ;
+- chaque cotisation est arrondie séparément : assiette en centimes x taux ;
+- le coefficient de la réduction Fillon est arrondi au dix-millième, la réduction au centime, et la
+  part retraite arrondie au centime, la part URSSAF étant le complément (les deux parts font la réduction) ;
+- les totaux (cotisations, net imposable, net à payer) sont des sommes exactes des lignes arrondies.
+
+Un total est donc toujours la somme des lignes affichées, et le résultat ne dépend ni de l'ordre
+des additions ni de la plateforme. Les lignes de cotisations, leurs assiettes, taux et conditions
+sont celles du registre des cotisations (registre_cotisations), comme pour calcul_cotisations et
+simulateur.cotisations_par_entreprise ; seuls les arrondis diffèrent du mode en flottants, d'au
+plus quelques centimes par ligne.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from parametres import plafonds, registre
+from parametres_entreprise import TableEntreprises, parametres_entreprise
+from payroll import (
+    BAREME_PAS,
+    calcul_ijss,
+    exoneration_heures_sup,
+    reduction_tepa_par_heure,
+    rubriques_reductions,
+    rubriques_sous_totaux,
+    rubriques_transport_et_repas,
+)
+from registre_cotisations import (
+    PARTS,
+    assiettes_cotisations,
+    conditions,
+    evaluer_cotisations,
+    lignes_applicables,
+    taux_cotisations,
+)
+
+ECHELLE_TAUX = 1_000_000
+# Coefficient de la réduction Fillon, arrondi au dix-millième
+ECHELLE_FILLON = 10_000
+TAUX_RETRAITE_FILLON = 0.0601
+
+COLONNES_CENTIMES = [
+    "salaire_brut", "cotisations_salariales", "cotisations_patronales",
+    "reduction_fillon_urssaf", "reduction_fillon_retraite",
+    "net_imposable", "prelevement_a_la_source", "net_a_payer",
+]
+
+SEUILS_PAS_CENTIMES = np.array([seuil for seuil, _ in BAREME_PAS], dtype=float) * 100
+
+# Paramètres compilés de l'entreprise convertis en entiers : taux (échelle ECHELLE_TAUX) et montants (centimes)
+TAUX_ENTREPRISE = ("taux_AT", "taux_versement_mobilite", "taux_fnal", "taux_formation", "T_fillon")
+MONTANTS_ENTREPRISE = ("forfait_complementaire_sante", "forfait_mutuelle", "montant_forfait_social")
+
+# Colonnes des lignes du bulletin tenues en centimes (voir rubriques_bulletin_centimes)
+COLONNES_MONTANTS = ("Total (€)", "Part_Employeur")
+
+
+def _arrondi(valeurs, echelle):
+    """Nombres (flottants ou entiers) en entiers à l'échelle, au plus proche, demi en s'éloignant de zéro."""
+    valeurs = np.asarray(valeurs, dtype=float) * echelle
+    return (np.sign(valeurs) * np.floor(np.abs(valeurs) + 0.5)).astype(np.int64)
+
+
+def en_centimes(montants):
+    """Montants en euros (flottants) -> centimes int64."""
+    return _arrondi(montants, 100)
+
+
+def taux_entier(taux):
+    """Taux (0.0855 pour 8,55 %) -> entiers à l'échelle ECHELLE_TAUX."""
+    return _arrondi(taux, ECHELLE_TAUX)
+
+
+def diviser(numerateur, denominateur):
+    """Division entière au plus proche, demi en s'éloignant de zéro (dénominateurs positifs)."""
+    numerateur = np.asarray(numerateur, dtype=np.int64)
+    denominateur = np.asarray(denominateur, dtype=np.int64)
+    if numerateur.min(initial=0) >= 0:
+        # Cas courant (assiettes et taux positifs) : pas de signe à traiter
+        return (numerateur + denominateur // 2) // denominateur
+    quotient = (np.abs(numerateur) + denominateur // 2) // denominateur
+    return np.where(numerateur < 0, -quotient, quotient)
+
+
+def appliquer_taux(assiette, taux, echelle=ECHELLE_TAUX):
+    """Ligne de cotisation : assiette en centimes x taux entier, arrondie au centime."""
+    return diviser(np.asarray(assiette, dtype=np.int64) * np.asarray(taux, dtype=np.int64), echelle)
+
+
+def en_euros(centimes):
+    """Centimes -> euros (flottants), pour l'affichage ou la comparaison avec le mode en flottants."""
+    return np.asarray(centimes, dtype=np.int64) / 100
+
+
+def formater(centimes):
+    """Texte à deux décimales d'un montant en centimes, sans passer par un flottant."""
+    centimes = int(centimes)
+    signe = "-" if centimes < 0 else ""
+    euros, reste = divmod(abs(centimes), 100)
+    return f"{signe}{euros}.{reste:02d}"
+
+
+def parametres_en_entiers(colonnes):
+    """
+    Paramètres compilés (compiler_parametres, TableEntreprises.colonnes) avec les taux et montants
+    de TAUX_ENTREPRISE et MONTANTS_ENTREPRISE convertis en entiers. La conversion se fait une fois
+    par entreprise, avant la distribution aux salariés.
+    """
+    entiers = dict(colonnes)
+    for nom in TAUX_ENTREPRISE:
+        entiers[nom] = taux_entier(colonnes[nom])
+    for nom in MONTANTS_ENTREPRISE:
+        entiers[nom] = en_centimes(colonnes[nom])
+    return entiers
+
+
+def plafonds_centimes(periode=None):
+    """Plafonds en vigueur à la période (parametres.plafonds), en centimes."""
+    return {nom: int(en_centimes(valeur)) for nom, valeur in plafonds(periode).items()}
+
+
+def taux_cotisations_entiers(pe, periode=None):
+    """Fonction nom -> taux entier d'une ligne du registre des cotisations (voir taux_cotisations)."""
+    return taux_cotisations(pe, periode, conversion=taux_entier)
+
+
+def cotisations_centimes(brut, cadre, pe, periode=None):
+    """
+    Lignes de cotisations en centimes, une par rubrique de calcul_cotisations (0 si la rubrique ne
+    s'applique pas au salarié) : mêmes lignes, assiettes, taux et conditions que le registre des
+    cotisations, évaluées sur des assiettes en centimes avec des taux entiers.
+
+    :param brut: Salaires bruts en centimes (int64)
+    :param cadre: Booléens, True pour un statut cadre
+    :param pe: Paramètres de l'entreprise de chaque salarié, convertis par parametres_en_entiers
+    :return: {"Salarial": {ligne: centimes}, "Patronal": {ligne: centimes}}
+    """
+    p = plafonds_centimes(periode)
+    brut = np.asarray(brut, dtype=np.int64)
+    taux = taux_cotisations_entiers(pe, periode)
+    # Assiette unitaire ECHELLE_TAUX : appliquer_taux(ECHELLE_TAUX, montant) = montant (forfait social)
+    assiettes = assiettes_cotisations(brut, pe, p, taux, appliquer_taux, ECHELLE_TAUX)
+    return evaluer_cotisations(assiettes, conditions(brut, cadre, pe, p), taux, appliquer_taux)
+
+
+def reduction_fillon_centimes(brut, douze_derniers_salaires, T, periode=None):
+    """
+    Réduction Fillon en centimes : (part URSSAF, part retraite).
+    :param douze_derniers_salaires: Somme des douze derniers salaires de chaque salarié, en centimes
+    :param T: Coefficient maximal de l'entreprise de chaque salarié, à l'échelle ECHELLE_TAUX
+    """
+    brut = np.asarray(brut, dtype=np.int64)
+    salaires = np.asarray(douze_derniers_salaires, dtype=np.int64)
+    smics = int(en_centimes(registre().douze_derniers("SMIC", periode)).sum())
+    T = np.asarray(T, dtype=np.int64)
+    # C = (1,6 x SMIC annuel / salaires annuels - 1) x T / 0,6, arrondi au dix-millième :
+    # C x 10 000 = (16 x SMIC - 10 x salaires) x T / (600 x salaires) avec T à l'échelle 10^6
+    valides = salaires > 0
+    C = np.where(valides, diviser((16 * smics - 10 * salaires) * T, np.where(valides, 600 * salaires, 1)), 0)
+
+    reduction = np.where(brut > en_centimes(plafonds(periode)["SEUIL_FILLON"]), 0,
+                         appliquer_taux(brut, C, ECHELLE_FILLON))
+    retraite = np.where(T > 0, diviser(reduction * taux_entier(TAUX_RETRAITE_FILLON), np.where(T > 0, T, 1)), 0)
+    return reduction - retraite, retraite
+
+
+def prelevement_centimes(net_imposable):
+    """Prélèvement à la source en centimes : taux de la première tranche dont le plafond couvre le net imposable."""
+    net_imposable = np.asarray(net_imposable, dtype=np.int64)
+    taux = np.array([taux for _, taux in BAREME_PAS])[np.searchsorted(SEUILS_PAS_CENTIMES, net_imposable, side="left")]
+    return appliquer_taux(net_imposable, taux_entier(taux / 100))
+
+
+def effectif_en_centimes(salaries, periode=None, table=None, avec_lignes=False):
+    """
+    Équivalent en centimes de simulateur.cotisations_effectif, prolongé jusqu'au net à payer, à
+    partir du salaire brut renseigné de chaque salarié.
+
+    :param salaries: Dictionnaire {identifiant: Salarie}
+    :param table: TableEntreprises déjà compilée, réutilisable d'un lot à l'autre
+    :param avec_lignes: Renvoie aussi les lignes de cotisations (voir cotisations_centimes)
+    :return: DataFrame indexé par identifiant, colonnes COLONNES_CENTIMES en centimes int64
+    """
+    liste = list(salaries.values())
+    table = table or TableEntreprises(s.entreprise for s in liste)
+    indices = table.indices(liste)
+    pe = {nom: valeurs[indices] for nom, valeurs in parametres_en_entiers(table.colonnes).items()}
+    brut = en_centimes([s.salaire_brut for s in liste])
+    cadre = np.array([s.statut.lower() == "cadre" for s in liste], dtype=bool)
+    lignes = cotisations_centimes(brut, cadre, pe, periode)
+    salarial = np.sum(list(lignes["Salarial"].values()), axis=0, dtype=np.int64) if liste else brut
+    patronal = np.sum(list(lignes["Patronal"].values()), axis=0, dtype=np.int64) if liste else brut
+
+    # Historiques convertis en une passe : chaque mois arrondi au centime, puis sommé par salarié
+    longueurs = np.array([len(s.douze_derniers_salaires) for s in liste], dtype=np.int64)
+    mois = en_centimes(list(itertools.chain.from_iterable(s.douze_derniers_salaires for s in liste)))
+    douze_derniers = np.zeros(len(liste), dtype=np.int64)
+    remplis = longueurs > 0
+    douze_derniers[remplis] = np.add.reduceat(mois, (np.cumsum(longueurs) - longueurs)[remplis]) if len(mois) else 0
+    fillon_urssaf, fillon_retraite = reduction_fillon_centimes(brut, douze_derniers, pe["T_fillon"], periode)
+
+    # Comme net_imposable : CSG non déductible, CRDS et prévoyance patronale réintégrées
+    net_imposable = (brut - salarial + lignes["Salarial"]["CSG non Deductible"] + lignes["Salarial"]["CRDS"]
+                     + lignes["Patronal"]["Prévoyance"])
+    pas = prelevement_centimes(net_imposable)
+    df = pd.DataFrame({
+        "salaire_brut": brut,
+        "cotisations_salariales": salarial,
+        "cotisations_patronales": patronal,
+        "reduction_fillon_urssaf": fillon_urssaf,
+        "reduction_fillon_retraite": fillon_retraite,
+        "net_imposable": net_imposable,
+        "prelevement_a_la_source": pas,
+        "net_a_payer": net_imposable - pas,
+    }, index=pd.Index(list(salaries), name="salarie"), columns=COLONNES_CENTIMES)
+    return (df, lignes) if avec_lignes else df
+
+
+def _est_montant(valeur):
+    return isinstance(valeur, (int, float, np.number)) and not isinstance(valeur, bool) and valeur == valeur
+
+
+def _ligne_en_centimes(ligne):
+    """Ligne du bulletin avec ses colonnes Total (€) et Part_Employeur arrondies au centime (int)."""
+    return {**ligne, **{colonne: int(en_centimes(ligne[colonne])) for colonne in COLONNES_MONTANTS
+                        if _est_montant(ligne.get(colonne))}}
+
+
+def _somme(lignes, colonne):
+    """Somme exacte des montants en centimes d'une colonne ; les cellules vides comptent 0."""
+    return sum(ligne[colonne] for ligne in lignes if _est_montant(ligne.get(colonne)))
+
+
+def rubriques_bulletin_centimes(salarie, lignes_remuneration, periode, hs25, hs50, resto):
+    """
+    Bulletin en centimes entiers, à partir des lignes de rémunération en euros (rubriques_salaire_de_base
+    à rubriques_majorations) : chaque ligne est arrondie au centime et le salaire brut en est la somme
+    exacte ; les cotisations sont les lignes du registre, la réduction Fillon et le prélèvement à la
+    source ceux de ce module ; le salaire net, les nets et le total patronal sont des sommes exactes
+    des lignes arrondies.
+
+    Mêmes lignes que bulletin_depuis_tableaux, avant formatage : les colonnes Total (€) et
+    Part_Employeur sont en centimes (int), Base et Taux (%) en euros et en pourcentage (flottants).
+    :param resto: Participation du salarié aux tickets restaurant, en euros
+    :return: (lignes, salaire brut en centimes)
+    """
+    lignes = [_ligne_en_centimes(ligne) for ligne in lignes_remuneration]
+    brut = _somme(lignes, "Total (€)")
+    debut_brut = len(lignes)
+    lignes.append({"Catégorie": "Salaire Brut", "Base": "", "Taux (%)": "", "Total (€)": brut})
+
+    compiles = parametres_entreprise(salarie.entreprise)
+    pe = parametres_en_entiers(vars(compiles))
+    cotisations = {part: {} for part in PARTS}
+    for cotisation, assiette, parts in lignes_applicables(brut, salarie.statut.lower() == "cadre", pe,
+                                                          plafonds_centimes(periode),
+                                                          taux_cotisations_entiers(pe, periode),
+                                                          appliquer_taux, ECHELLE_TAUX):
+        parts = {part: (int(taux), int(montant)) for part, (taux, montant) in parts.items()}
+        for part, (_, montant) in parts.items():
+            cotisations[part][cotisation.rubrique] = cotisations[part].get(cotisation.rubrique, 0) + montant
+        salarial, patronal = parts.get("Salarial"), parts.get("Patronal")
+        lignes.append({
+            "Catégorie": cotisation.libelle,
+            "Base": assiette / 100 if salarial else "",
+            "Taux (%)": salarial[0] / ECHELLE_TAUX * 100 if salarial else "",
+            "Total (€)": -salarial[1] if salarial else "",
+            "Part_Employeur": -patronal[1] if patronal else "",
+        })
+
+    douze_derniers = int(en_centimes(salarie.douze_derniers_salaires).sum())
+    fillon_urssaf, fillon_retraite = reduction_fillon_centimes(brut, douze_derniers, pe["T_fillon"], periode)
+    exoneration = int(en_centimes(exoneration_heures_sup(salarie, hs25, hs50)))
+    tepa = int(en_centimes(reduction_tepa_par_heure(hs25 + hs50, compiles.tepa_par_heure)))
+    lignes += rubriques_reductions(int(fillon_urssaf), int(fillon_retraite), tepa, exoneration)
+    lignes.append({"Catégorie": "Salaire Net Avant Impôts", "Base": "", "Taux (%)": "",
+                   "Total (€)": _somme(lignes[debut_brut:], "Total (€)"), "Part_Employeur": ""})
+    lignes += [_ligne_en_centimes(ligne) for ligne in rubriques_transport_et_repas(salarie, resto)]
+
+    # Comme net_imposable et montant_net_social
+    salarial = sum(cotisations["Salarial"].values())
+    net_imposable = (brut - salarial + cotisations["Salarial"].get("CSG non Deductible", 0)
+                     + cotisations["Salarial"].get("CRDS", 0) + cotisations["Patronal"].get("Prévoyance", 0))
+    pas = int(prelevement_centimes(net_imposable))
+    ijss = int(en_centimes(calcul_ijss(salarie.douze_derniers_salaires, {}, periode=periode)[1]))
+    lignes += rubriques_sous_totaux(brut - salarial - ijss + exoneration, net_imposable, pas, net_imposable - pas)
+    lignes.append({"Catégorie": "Sous-total Cotisations Patronales", "Base": "", "Taux (%)": "", "Total (€)": "",
+                   "Part_Employeur": -_somme(lignes, "Part_Employeur")})
+    return lignes, brut
@@ -0,0 +1,190 @@
+import bisect
+import csv
+import os
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+FICHIER_PARAMETRES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parametres_reglementaires.csv")
+FICHIER_BAREMES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baremes_reglementaires.csv")
+
+
+def normaliser_periode(periode=None):
+    """
+    Ramène une période de paie à une date.
+    Accepte une date, un datetime, un Timestamp ou une chaîne "AAAA-MM" / "AAAA-MM-JJ".
+    Sans période, on prend la date la plus lointaine : la dernière valeur connue s'applique.
+    """
+    if periode is None:
+        return date.max
+    if isinstance(periode, str):
+        if len(periode) == 7:
+            periode = periode + "-01"
+        return datetime.strptime(periode, "%Y-%m-%d").date()
+    if isinstance(periode, (datetime, pd.Timestamp)):
+        return periode.date()
+    return periode
+
+
+class ParametreIndisponible(ValueError):
+    """Période antérieure à la première date d'effet d'un paramètre du registre."""
+
+
+class RegistreParametres:
+    """
+    Registre des paramètres réglementaires (SMIC, PMSS, plafonds IJSS...) indexés par date d'effet.
+    Le fichier est chargé une seule fois en tableaux triés ; chaque valeur est retrouvée
+    pour la période de paie par recherche dichotomique.
+    """
+
+    def __init__(self, chemin=FICHIER_PARAMETRES):
+        self.chemin = chemin
+        self._signatures = {}
+        lignes = {}
+        with open(chemin, newline="", encoding="utf-8") as f:
+            for ligne in csv.DictReader(f):
+                date_effet = datetime.strptime(ligne["date_effet"], "%Y-%m-%d").date()
+                lignes.setdefault(ligne["parametre"], []).append((date_effet, float(ligne["valeur"])))
+
+        self._dates = {}
+        self._valeurs = {}
+        self._derniere_date_effet = max(d for historique in lignes.values() for d, _ in historique)
+        for nom, historique in lignes.items():
+            historique.sort()
+            self._dates[nom] = [d for d, _ in historique]
+            self._valeurs[nom] = [v for _, v in historique]
+
+    def noms(self):
+        return sorted(self._dates)
+
+    def valeur(self, nom, periode=None):
+        jour = normaliser_periode(periode)
+        dates = self._dates[nom]
+        i = bisect.bisect_right(dates, jour) - 1
+        if i < 0:
+            raise ParametreIndisponible(
+                f"Aucune valeur de {nom} en vigueur au {jour} : l'historique de {os.path.basename(self.chemin)} "
+                f"commence au {dates[0]}")
+        return self._valeurs[nom][i]
+
+    def douze_derniers(self, nom, periode=None):
+        """Valeurs du paramètre pour les 12 mois se terminant à la période (du plus ancien au plus récent)."""
+        jour = normaliser_periode(periode)
+        if jour == date.max:
+            jour = self._derniere_date_effet
+        annee, mois = divmod(jour.year * 12 + jour.month - 12, 12)
+        premier_mois = date(annee, mois + 1, 1)
+        if premier_mois < self._dates[nom][0]:
+            raise ParametreIndisponible(
+                f"Les 12 derniers {nom} de {jour:%Y-%m} remontent au {premier_mois} : l'historique de "
+                f"{os.path.basename(self.chemin)} commence au {self._dates[nom][0]}. Compléter le fichier "
+                f"ou fournir les 12 dernières valeurs explicitement.")
+        valeurs = []
+        for decalage in range(11, -1, -1):
+            annee, mois = divmod(jour.year * 12 + jour.month - 1 - decalage, 12)
+            valeurs.append(self.valeur(nom, date(annee, mois + 1, 1)))
+        return valeurs
+
+    def signature(self, periode=None):
+        """
+        Toutes les valeurs en vigueur à la période, dans un ordre stable. Le registre ne change plus
+        une fois chargé : la signature de chaque jour est calculée une fois.
+        """
+        jour = normaliser_periode(periode)
+        if jour not in self._signatures:
+            self._signatures[jour] = tuple((nom, self.valeur(nom, jour)) for nom in self.noms())
+        return self._signatures[jour]
+
+
+_registre = None
+
+
+def registre():
+    global _registre
+    if _registre is None:
+        _registre = RegistreParametres()
+    return _registre
+
+
+def parametre(nom, periode=None):
+    return registre().valeur(nom, periode)
+
+
+def plafonds(periode=None):
+    """Plafonds de cotisations dérivés du SMIC et du PMSS en vigueur à la période."""
+    smic = parametre("SMIC", periode)
+    pmss = parametre("PMSS", periode)
+    return {
+        "SMIC": smic,
+        "PMSS": pmss,
+        "PLAFOND_SEUIL_MALADIE": 2.5 * smic,
+        "PLAFOND_FAMILLE": 3.5 * smic,
+        "PLAFOND_T2": 8 * pmss,
+        "PLAFOND_CHOMAGE": 4 * pmss,
+        "PLAFOND_APEC": 4 * pmss,
+        "SEUIL_FILLON": 1.6 * smic,
+    }
+
+
+class RegistreBaremes:
+    """
+    Barèmes par tranches (avantages en nature...) indexés par date d'effet.
+    Chaque version d'un barème est un couple de tableaux triés (seuils, valeurs) : une assiette
+    prend la valeur de la dernière tranche dont le seuil lui est inférieur ou égal.
+    """
+
+    def __init__(self, chemin=FICHIER_BAREMES):
+        versions = {}
+        with open(chemin, newline="", encoding="utf-8") as f:
+            for ligne in csv.DictReader(f):
+                date_effet = datetime.strptime(ligne["date_effet"], "%Y-%m-%d").date()
+                versions.setdefault(ligne["bareme"], {}).setdefault(date_effet, []).append(
+                    (float(ligne["seuil"]), float(ligne["valeur"])))
+
+        self._dates = {}
+        self._tranches = {}
+        for nom, par_date in versions.items():
+            self._dates[nom] = sorted(par_date)
+            self._tranches[nom] = []
+            for date_effet in self._dates[nom]:
+                tranches = sorted(par_date[date_effet])
+                self._tranches[nom].append((np.array([s for s, _ in tranches]), np.array([v for _, v in tranches])))
+
+    def noms(self):
+        return sorted(self._dates)
+
+    def tranches(self, nom, periode=None):
+        """(seuils, valeurs) de la version du barème en vigueur à la période."""
+        jour = normaliser_periode(periode)
+        i = bisect.bisect_right(self._dates[nom], jour) - 1
+        if i < 0:
+            raise ValueError(f"Aucun barème {nom} en vigueur au {jour}")
+        return self._tranches[nom][i]
+
+    def valeurs(self, nom, assiettes, periode=None):
+        """Valeur de la tranche de chaque assiette ; 0 sous le premier seuil."""
+        seuils, valeurs = self.tranches(nom, periode)
+        i = np.searchsorted(seuils, assiettes, side="right") - 1
+        return np.where(i >= 0, valeurs[np.maximum(i, 0)], 0.0)
+
+    def signature(self, periode=None):
+        return tuple((nom, *(tuple(t.tolist()) for t in self.tranches(nom, periode))) for nom in self.noms())
+
+
+_baremes = None
+
+
+def baremes():
+    global _baremes
+    if _baremes is None:
+        _baremes = RegistreBaremes()
+    return _baremes
+
+
+def recharger(chemin_parametres=FICHIER_PARAMETRES, chemin_baremes=FICHIER_BAREMES):
+    """Relit les paramètres et les barèmes réglementaires ; les appels suivants utilisent les nouvelles valeurs."""
+    global _registre, _baremes
+    _registre = RegistreParametres(chemin_parametres)
+    _baremes = RegistreBaremes(chemin_baremes)
+    return _registre
@@ -0,0 +1,164 @@
+"""
+Paramètres de paie propres à une entreprise.
+
+Les seuils d'effectif (FNAL, versement mobilités, formation professionnelle, effort construction,
+forfait social, coefficient T de la réduction Fillon, déduction TEPA) et les montants forfaitaires
+(mutuelle, prévoyance, transport, titres-restaurant) et les majorations des heures de nuit et de
+dimanche ne dépendent pas du salarié : ils sont
+compilés une fois par entreprise, en tableaux pour un lot d'entreprises (TableEntreprises) ou en
+ParametresEntreprise pour une seule.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+# Seuils d'effectif
+SEUIL_11_SALARIES = 11    # versement mobilités, formation professionnelle (1%), forfait social
+SEUIL_20_SALARIES = 20    # déduction forfaitaire TEPA de 1,50 € par heure
+SEUIL_50_SALARIES = 50    # FNAL 0,5%, effort construction, coefficient T de la réduction Fillon
+SEUIL_250_SALARIES = 250  # plus de déduction forfaitaire TEPA
+
+# Champs d'Entreprise dont dépendent les paramètres compilés
+CHAMPS_ENTREPRISE = [
+    "effectif", "taux_AT", "taux_versement_mobilite", "forfait_complementaire_sante", "forfait_mutuelle",
+    "taux_transport", "prix_transport", "titre_restaurant", "participation_titre_restaurant",
+    "taux_majoration_nuit", "taux_majoration_dimanche", "plafond_majoration_nuit", "plafond_majoration_dimanche",
+]
+
+
+def taux_tepa(effectif):
+    """Déduction forfaitaire patronale par heure supplémentaire selon l'effectif."""
+    return np.where(effectif < SEUIL_20_SALARIES, 1.50, np.where(effectif < SEUIL_250_SALARIES, 0.50, 0.0))
+
+
+def compiler_parametres(effectif, taux_AT, taux_versement_mobilite, forfait_complementaire_sante, forfait_mutuelle,
+                        taux_transport, prix_transport, titre_restaurant, participation_titre_restaurant,
+                        taux_majoration_nuit=0.0, taux_majoration_dimanche=0.0,
+                        plafond_majoration_nuit=None, plafond_majoration_dimanche=None):
+    """
+    Paramètres compilés d'une ou plusieurs entreprises (scalaires ou tableaux alignés, champs de
+    CHAMPS_ENTREPRISE) : {paramètre: tableau}. Un plafond de majoration absent (None) est infini.
+    """
+    effectif = np.asarray(effectif)
+    moins_de_11 = effectif < SEUIL_11_SALARIES
+    moins_de_50 = effectif < SEUIL_50_SALARIES
+    return {
+        "taux_AT": np.asarray(taux_AT, dtype=float),
+        "taux_versement_mobilite": np.asarray(taux_versement_mobilite, dtype=float),
+        "forfait_complementaire_sante": np.asarray(forfait_complementaire_sante, dtype=float),
+        "forfait_mutuelle": np.asarray(forfait_mutuelle, dtype=float),
+        "moins_de_11": moins_de_11,
+        "moins_de_50": moins_de_50,
+        "taux_fnal": np.where(moins_de_50, 0.001, 0.005),
+        "versement_transport": ~moins_de_11,
+        "taux_formation": np.where(moins_de_11, 0.0055, 0.01),
+        "taxe_apprentissage": moins_de_11,
+        "effort_construction": ~moins_de_50,
+        "forfait_social": ~moins_de_11,
+        "montant_forfait_social": (np.asarray(forfait_mutuelle, dtype=float) + forfait_complementaire_sante) * 0.08,
+        "T_fillon": np.where(moins_de_50, 0.3194 - 0.0046, 0.3234 - 0.0046) + np.minimum(taux_AT, 0.0046),
+        "tepa_par_heure": taux_tepa(effectif),
+        "navigo": np.asarray(taux_transport, dtype=float) * prix_transport,
+        "part_salariale_titre_restaurant": titre_restaurant * (1 - np.asarray(participation_titre_restaurant, dtype=float)),
+        "taux_majoration_nuit": np.asarray(taux_majoration_nuit, dtype=float),
+        "taux_majoration_dimanche": np.asarray(taux_majoration_dimanche, dtype=float),
+        "plafond_majoration_nuit": _plafond(plafond_majoration_nuit),
+        "plafond_majoration_dimanche": _plafond(plafond_majoration_dimanche),
+    }
+
+
+def _plafond(plafond):
+    plafond = np.asarray(plafond, dtype=float)
+    return np.where(np.isnan(plafond), np.inf, plafond)
+
+
+@dataclass(frozen=True)
+class ParametresEntreprise:
+    """Paramètres compilés d'une entreprise (voir compiler_parametres)."""
+    taux_AT: float
+    taux_versement_mobilite: float
+    forfait_complementaire_sante: float
+    forfait_mutuelle: float
+    moins_de_11: bool
+    moins_de_50: bool
+    taux_fnal: float
+    versement_transport: bool
+    taux_formation: float
+    taxe_apprentissage: bool
+    effort_construction: bool
+    forfait_social: bool
+    montant_forfait_social: float
+    T_fillon: float
+    tepa_par_heure: float
+    navigo: float
+    part_salariale_titre_restaurant: float
+    taux_majoration_nuit: float
+    taux_majoration_dimanche: float
+    plafond_majoration_nuit: float
+    plafond_majoration_dimanche: float
+
+
+def _cle(entreprise):
+    return tuple(getattr(entreprise, champ) for champ in CHAMPS_ENTREPRISE)
+
+
+@lru_cache(maxsize=1024)
+def _parametres(*champs):
+    return ParametresEntreprise(**{nom: valeur.item() for nom, valeur in compiler_parametres(*champs).items()})
+
+
+def parametres_entreprise(entreprise):
+    """
+    Paramètres compilés d'une entreprise. Ils sont mémorisés par valeur des champs : tous les
+    salariés d'une même entreprise partagent la même compilation.
+    """
+    return _parametres(*_cle(entreprise))
+
+
+class TableEntreprises:
+    """
+    Paramètres compilés d'un lot d'entreprises, une ligne par entreprise distincte, pour les calculs
+    par lots : les salariés sont regroupés par entreprise et chacun reçoit la ligne de la sienne.
+    """
+
+    def __init__(self, entreprises):
+        self.entreprises = []
+        self._lignes = {}
+        for entreprise in entreprises:
+            cle = _cle(entreprise)
+            if cle not in self._lignes:
+                self._lignes[cle] = len(self.entreprises)
+                self.entreprises.append(entreprise)
+        self.colonnes = compiler_parametres(
+            *(np.array([getattr(e, champ) for e in self.entreprises]) for champ in CHAMPS_ENTREPRISE))
+
+    def __len__(self):
+        return len(self.entreprises)
+
+    def ligne(self, entreprise):
+        return self._lignes[_cle(entreprise)]
+
+    def indices(self, salaries):
+        """Ligne de l'entreprise de chaque salarié."""
+        # Les salariés d'un lot partagent le plus souvent le même objet Entreprise : sa clé n'est calculée qu'une fois
+        lignes = {}
+        return np.array([lignes[id(s.entreprise)] if id(s.entreprise) in lignes
+                         else lignes.setdefault(id(s.entreprise), self.ligne(s.entreprise)) for s in salaries],
+                        dtype=np.int64)
+
+    def par_salarie(self, salaries):
+        """Paramètres de l'entreprise de chaque salarié : {paramètre: tableau aligné sur salaries}."""
+        indices = self.indices(salaries)
+        return {nom: valeurs[indices] for nom, valeurs in self.colonnes.items()}
+
+    def groupes(self, salaries):
+        """{ligne de l'entreprise: identifiants de ses salariés} pour un dictionnaire {identifiant: Salarie}."""
+        groupes = {}
+        for identifiant, salarie in salaries.items():
+            groupes.setdefault(self.ligne(salarie.entreprise), []).append(identifiant)
+        return groupes
+
+    def parametres(self, entreprise):
+        i = self.ligne(entreprise)
+        return ParametresEntreprise(**{nom: valeurs[i].item() for nom, valeurs in self.colonnes.items()})
@@ -1,8 +1,15 @@
 from dataclasses import dataclass, field
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, Optional
 from datetime import datetime, timedelta
 import calendar
 import pandas as pd
+import parametres
+from parametres import normaliser_periode, parametre, plafonds, registre
+from avantages_nature import valeurs_avantages
+from registre_cotisations import PARTS, lignes_applicables, taux_cotisations
+from registre_primes import PeriodePrimes, montants_primes
+from parametres_entreprise import parametres_entreprise, taux_tepa
 
 @dataclass
 
@@ -28,6 +35,11 @@ class Entreprise:
     titre_transport: float = 0.0
     taux_anciennete: float =0.005
     subrogation: bool = True
+    # Majorations des heures de nuit et de dimanche (0.25 = 25% du taux horaire), plafonnées par mois en euros
+    taux_majoration_nuit: float = 0.0
+    taux_majoration_dimanche: float = 0.0
+    plafond_majoration_nuit: Optional[float] = None
+    plafond_majoration_dimanche: Optional[float] = None
 
 @dataclass
 class Salarie:
@@ -112,6 +124,20 @@ def flatten_timesheet(timesheet):
         current_date += timedelta(days=1)
     return flat
 
+# Colonnes de la timesheet combinée, dans l'ordre produit par combine_timesheets
+CANAUX_TIMESHEET = [
+    "heures contractuelles",
+    "heures réelles normales",
+    "heures de nuit",
+    "heures de dimanche",
+    "absence rémunérée RTT",
+    "absence rémunérée congé payé",
+    "absence rémunérée jour férié",
+    "absence non rémunérée jour férié",
+    "absence non rémunérée absence injustifiée",
+    "absence maladie",
+]
+
 def combine_timesheets(ts_contract, ts_reelles, ts_nuit, ts_dimanche,
                       ts_RTT, ts_CP, ts_jf_r, ts_jf_nonr, ts_injust, ts_maladie,
                       manual_data=None):
@@ -177,15 +203,28 @@ def merge_overlapping_days(df_prev, df_current):
     """
     Fusionne les données de deux DataFrames (mois précédent et mois en cours)
     pour les dates communes en additionnant les valeurs.
+    Les index, chaînes "AAAA-MM-JJ" (combine_timesheets, stockage, imports) ou dates, sont comparés
+    en dates. Renvoie une copie du mois en cours indexée par dates ; les deux DataFrames fournis ne
+    sont pas modifiés.
     """
+    df_prev = timesheet_en_dates(df_prev)
+    df_current = timesheet_en_dates(df_current).copy()
     dates_communes = df_prev.index.intersection(df_current.index)
     df_current.loc[dates_communes] = df_current.loc[dates_communes].add(
         df_prev.loc[dates_communes], fill_value=0
     )
     return df_current
 
+def periode_de_paie(timesheet):
+    """Renvoie le premier jour du mois de paie couvert par la timesheet."""
+    return pd.Timestamp(max(timesheet.index)).replace(day=1)
+
+def timesheet_en_dates(timesheet):
+    """Timesheet indexée par dates, sans modifier celle fournie."""
+    return timesheet.set_axis(pd.to_datetime(timesheet.index))
+
 def filter_ts(timesheet):
-    timesheet.index = pd.to_datetime(timesheet.index)
+    timesheet = timesheet_en_dates(timesheet)
     first_day_of_month = timesheet.index.max().replace(day=1)
     timesheet_filtered = timesheet[timesheet.index>= first_day_of_month]
     return timesheet_filtered
@@ -198,6 +237,40 @@ def get_absence_motifs(timesheet_df):
         absence_motifs[date] = motif
     return absence_motifs
 
+def heures_majorees(df):
+    """
+    Heures supplémentaires (voir calcul_hs), heures de nuit et heures de dimanche du mois, en une
+    seule agrégation hebdomadaire de la timesheet. Les heures de nuit et de dimanche des jours qui
+    précèdent le premier du mois sont payées avec le mois précédent et ne sont pas comptées.
+    :return: (hs25, hs50, heures de nuit, heures de dimanche)
+    """
+    # Index en datetime, sur une vue : la timesheet fournie n'est pas modifiée
+    df = timesheet_en_dates(df)
+    dans_le_mois = df.index >= df.index.max().replace(day=1)
+    heures = pd.DataFrame({
+        "sup": (
+            df["heures réelles normales"] - df["heures contractuelles"] +
+            (df["absence rémunérée RTT"] + df["absence rémunérée congé payé"] + df["absence rémunérée jour férié"]) *
+            df["heures contractuelles"]
+        ),
+        "nuit": df["heures de nuit"].where(dans_le_mois, 0),
+        "dimanche": df["heures de dimanche"].where(dans_le_mois, 0),
+    })
+    par_semaine = heures.resample('W-SUN').sum()
+    weekly_hs = par_semaine["sup"]
+    last_date = df.index.max()
+    if last_date.weekday() not in [4, 5, 6]:  # 4: vendredi, 5: samedi, 6: dimanche
+        weekly_hs = weekly_hs.iloc[:-1]
+    total_25 = 0
+    total_50 = 0
+    for hs_semaine in weekly_hs:
+        hs_25 = min(hs_semaine, 8)
+        hs_50 = max(hs_semaine - 8, 0)
+        total_25 += hs_25
+        total_50 += hs_50
+    return total_25, total_50, par_semaine["nuit"].sum(), par_semaine["dimanche"].sum()
+
+
 def calcul_hs(df):
     """
     Calcule les heures supplémentaires journalières puis agrège par semaine.
@@ -211,31 +284,13 @@ def calcul_hs(df):
     Si la dernière date du DataFrame n'est pas un vendredi, samedi ou dimanche,
     la dernière semaine est exclue du calcul.
     """
-    # Assurer que l'index est en datetime
-    df.index = pd.to_datetime(df.index)
-    df["heures supplémentaires"] = (
-        df["heures réelles normales"] - df["heures contractuelles"] +
-        (df["absence rémunérée RTT"] + df["absence rémunérée congé payé"] + df["absence rémunérée jour férié"]) *
-        df["heures contractuelles"]
-    )
-    weekly_hs = df.resample('W-SUN')["heures supplémentaires"].sum()
-    last_date = df.index.max()
-    if last_date.weekday() not in [4, 5, 6]:  # 4: vendredi, 5: samedi, 6: dimanche
-        weekly_hs = weekly_hs.iloc[:-1]
-    total_25 = 0
-    total_50 = 0
-    for hs_semaine in weekly_hs:
-        hs_25 = min(hs_semaine, 8)
-        hs_50 = max(hs_semaine - 8, 0)
-        total_25 += hs_25
-        total_50 += hs_50
-    return total_25, total_50
+    return heures_majorees(df)[:2]
 
 
 def evolution_cp(salarie, timesheet):
     solde_debut = salarie.solde_cp
     if not isinstance(timesheet.index, pd.DatetimeIndex):
-        timesheet.index = pd.to_datetime(timesheet.index)
+        timesheet = timesheet_en_dates(timesheet)
     
     first_day_of_month = timesheet.index.min().replace(day=1)
     timesheet_filtered = timesheet[timesheet.index>= first_day_of_month]
@@ -262,11 +317,10 @@ def prime_de_treizieme_mois(salarie,mois,is_mensualise=False):
         prime = 0
     return prime
 
-def prime_anciennete(salarie):    
-    date_entree = datetime.strptime(salarie.date_entree, "%Y-%m-%d")
-    anciennete = int((datetime.now() - date_entree).days // 365)
-    taux_anciennete_reel=(salarie.entreprise.taux_anciennete)*(anciennete) 
-    prime = taux_anciennete_reel * salarie.salaire_de_base
+def prime_anciennete(salarie, date_reference=None):
+    # L'ancienneté est comptée à la date de référence (la période de paie), à défaut à aujourd'hui
+    prime = montants_primes({"ancienneté": {"type": "ancienneté"}}, salarie.salaire_de_base, salarie.date_entree,
+                            salarie.entreprise.taux_anciennete, PeriodePrimes(0, date_reference))["ancienneté"]
     return float(prime)
 
 def prime_exceptionnelle (salarie,valeur=0.0):
@@ -276,33 +330,28 @@ def prime_exceptionnelle (salarie,valeur=0.0):
         prime= 0
     return prime
 
-def calcul_primes(salarie: Salarie, primes: Dict[str, dict], timesheet) -> dict:
-    primes_totales = {}
-    total_primes = 0
-    # Récupérer le mois en se basant sur la date minimale du timesheet
-    first_day_of_month = timesheet.index.min().replace(day=1)
-    mois = first_day_of_month.month
-    
-    for prime, details in primes.items():
-        type_prime = details["type"]
-        
-        if type_prime == "13ème mois":
-            # On récupère le mode de calcul : True si mensualisé, False sinon
-            mode_calcul = details.get("mode", False)
-            valeur_13 = prime_de_treizieme_mois(salarie, mois, is_mensualise=mode_calcul)
-            primes_totales[prime] = valeur_13
-            total_primes += valeur_13
-
-        elif type_prime == "ancienneté":
-            valeur_anc = prime_anciennete(salarie)
-            primes_totales[prime] = valeur_anc
-            total_primes += valeur_anc
+def calcul_primes(salarie: Salarie, primes: Dict[str, dict], timesheet, periode=None) -> dict:
+    if periode is not None:
+        # Période de paie imposée : mois du 13ème mois et date de calcul de l'ancienneté
+        periode = pd.Timestamp(periode)
+        mois = periode.month
+    else:
+        # Récupérer le mois en se basant sur la date minimale du timesheet
+        first_day_of_month = timesheet.index.min().replace(day=1)
+        mois = first_day_of_month.month
+    return calcul_primes_du_mois(salarie, primes, mois, periode)
 
-        elif type_prime == "exceptionnelle":
-            valeur_ex = prime_exceptionnelle(salarie, details['valeur'])
-            primes_totales[prime] = valeur_ex
-            total_primes += valeur_ex
 
+def calcul_primes_du_mois(salarie: Salarie, primes: Dict[str, dict], mois, date_reference=None) -> dict:
+    """
+    Primes d'un mois donné ; l'ancienneté est comptée à date_reference (à défaut, aujourd'hui).
+    Chaque type de prime est calculé par sa fonction du registre (voir registre_primes).
+    """
+    primes_totales = montants_primes(primes, salarie.salaire_de_base, salarie.date_entree,
+                                     salarie.entreprise.taux_anciennete, PeriodePrimes(mois, date_reference))
+    total_primes = 0
+    for valeur in primes_totales.values():
+        total_primes += valeur
 
     result = {
         "Détail des primes": {k: round(v, 2) for k, v in primes_totales.items()},
@@ -312,115 +361,38 @@ def calcul_primes(salarie: Salarie, primes: Dict[str, dict], timesheet) -> dict:
 
 
 
-def calcul_avantages_en_nature(salarie: Salarie, avantages: Dict[str, dict], timesheet) -> dict:
+def jours_travailles(timesheet):
+    first_day_of_month = timesheet.index.min().replace(day=1)
+    timesheet_filtered = timesheet[timesheet.index >= first_day_of_month]
+    return (timesheet_filtered["heures réelles normales"] != 0).sum()
+
+def calcul_avantages_en_nature(salarie: Salarie, avantages: Dict[str, dict], timesheet, jours_travailles_mois=None,
+                               periode=None) -> dict:
     """
     Calcule les avantages en nature à intégrer au salaire brut et au bulletin de paie.
+    Les barèmes (forfait logement, taux du forfait véhicule...) sont ceux en vigueur à la période,
+    voir avantages_nature pour l'évaluation de tout un effectif en une passe.
 
     :param salarie: Objet Salarie contenant les informations du salarié
     :param avantages: Dictionnaire décrivant les avantages en nature (type, mode de calcul, paramètres)
     :param timesheet: DataFrame contenant les heures travaillées
+    :param jours_travailles_mois: Nombre de jours travaillés s'il est déjà connu (la timesheet n'est alors pas lue)
+    :param periode: Période de paie ; par défaut les derniers barèmes connus
     :return: Dictionnaire avec les valeurs des avantages et les impacts sur le salaire
     """
 
     avantages_totaux = {}
     total_avantages = 0
-    first_day_of_month = timesheet.index.min().replace(day=1)
-    timesheet_filtered = timesheet[timesheet.index >= first_day_of_month]
-    jours_travailles = (timesheet_filtered["heures réelles normales"] != 0).sum()
-
-    for avantage, details in avantages.items():
-        type_avantage = details["type"]
-        mode_calcul = details.get("mode", "forfaitaire")  # Par défaut, mode forfaitaire
-        params = details.get("params", {})
-
-        if type_avantage == "nourriture":
-            valeur_nourriture = 0
-            repas_par_jour = params.get("repas_par_jour", 1)
-            forfait_par_repas = salarie.entreprise.titre_restaurant * (1-salarie.entreprise.participation_titre_restaurant)
-            valeur_nourriture = repas_par_jour * forfait_par_repas * jours_travailles
-            avantages_totaux[avantage] = valeur_nourriture
-            # Ne rentre pas dans le total des avantages / sert uniquement pour déduire la part salariale à la fin du bulletin
-        
-        elif type_avantage == "logement":
-            valeur_logement = 0
-            salaire_ref = salarie.salaire_de_base
-            pieces = params.get("pieces principales", 1)
-
-            if mode_calcul == "forfaitaire":
-                if salaire_ref < 1932:
-                    valeur_logement = 77.30 if pieces == 1 else 41.40 * pieces
-                elif 1932 <= salaire_ref < 2318.39:
-                    valeur_logement = 90.20 if pieces == 1 else 57.90 * pieces
-                elif 2318.40 <= salaire_ref < 2704.79:
-                    valeur_logement = 102.90 if pieces == 1 else 77.90 * pieces
-                elif 2704.80 <= salaire_ref < 3477.59:
-                    valeur_logement = 115.80 if pieces == 1 else 96.50 * pieces
-                elif 3477.60 <= salaire_ref < 4250.39:
-                    valeur_logement = 141.90 if pieces == 1 else 122.30 * pieces
-                elif 4250.40 <= salaire_ref < 5023.19:
-                    valeur_logement = 167.40 if pieces == 1 else 147.70 * pieces
-                elif 5023.20 <= salaire_ref < 5795.99:
-                    valeur_logement = 193.30 if pieces == 1 else 178.10 * pieces
-                elif salaire_ref >= 5796:
-                    valeur_logement = 218.80 if pieces == 1 else 205.90 * pieces
-            elif mode_calcul == "reelle":
-                valeur_logement = params.get("valeur_reelle", 1000)
-
-            avantages_totaux[avantage] = valeur_logement
-            total_avantages += valeur_logement
-
-        elif type_avantage == "voiture":
-            valeur_voiture = 0
-            mode_calcul = params.get("mode", "forfaitaire")
-            type_vehicule = params.get("type_vehicule", "thermique")
-            carburant_inclus = params.get("carburant_inclus", False)
-            carburant_professionnel_et_personnel = params.get("carburant_professionnel_et_personnel", False)
-            achat_ou_location = params.get("achat_ou_location", "achat")
-
-            if mode_calcul == "forfaitaire":
-                if achat_ou_location == "achat":
-                    prix_achat_ttc = params.get("prix_achat_ttc", 25000)
-                    anciennete = params.get("anciennete", "moins_5_ans")
-
-                    if anciennete == "moins_5_ans":
-                        taux_base = 0.09 if not carburant_inclus else 0.12
-                    else:
-                        taux_base = 0.06 if not carburant_inclus else 0.09
-
-                    valeur_voiture = prix_achat_ttc * taux_base
-
-                elif achat_ou_location == "location":
-                    cout_annuel_ttc = params.get("cout_annuel_ttc", 5000)
-                    if not carburant_inclus:
-                        valeur_voiture = 0.30 * cout_annuel_ttc
-                    else:
-                        if not carburant_professionnel_et_personnel:
-                            frais_reels_carburant = params.get("frais_reels_carburant", 2000)
-                            valeur_voiture = 0.30 * cout_annuel_ttc + frais_reels_carburant
-                        else:
-                            valeur_voiture = 0.40 * cout_annuel_ttc
-
-            elif mode_calcul == "reelle":
-                amortissement = params.get("amortissement", 5000)
-                assurance = params.get("assurance", 1000)
-                entretien = params.get("entretien", 1000)
-                frais_reels_carburant = params.get("frais_reels_carburant", 2000)
-                valeur_voiture = amortissement + assurance + entretien + frais_reels_carburant
-
-            if type_vehicule == "electrique":
-                abattement = 0.50 * valeur_voiture
-                valeur_voiture -= abattement
-                valeur_voiture = max(0, valeur_voiture)
-                valeur_voiture = min(valeur_voiture, 1800)
-            
-            valeur_voiture = valeur_voiture/12
-            avantages_totaux[avantage] = valeur_voiture
-            total_avantages += valeur_voiture
+    if jours_travailles_mois is None:
+        jours_travailles_mois = jours_travailles(timesheet)
 
-        elif type_avantage == "autres":
-            valeur_autre = params.get("valeur_reelle", 0) * 0.1
-            avantages_totaux[avantage] = valeur_autre
-            total_avantages += valeur_autre
+    valeurs = valeurs_avantages(avantages, salarie.salaire_de_base, jours_travailles_mois, salarie.entreprise.titre_restaurant,
+                                salarie.entreprise.participation_titre_restaurant, periode)
+    for avantage, (type_avantage, valeur) in valeurs.items():
+        avantages_totaux[avantage] = float(valeur)
+        # La nourriture ne rentre pas dans le total des avantages / sert uniquement pour déduire la part salariale à la fin du bulletin
+        if type_avantage != "nourriture":
+            total_avantages += float(valeur)
 
     # Résumé des avantages
     result = {
@@ -432,10 +404,11 @@ def calcul_avantages_en_nature(salarie: Salarie, avantages: Dict[str, dict], tim
 
 
 
-def calcul_ijss(histo_salaire_annuel, absences, subrogation=True):
+def calcul_ijss(histo_salaire_annuel, absences, subrogation=True, periode=None):
     """
     Calcule les IJSS brutes et nettes et simule la présentation sur un bulletin de paie
     en prenant en compte les absences et les délais de carence.
+    Les plafonds journaliers sont ceux en vigueur à la période de paie.
     """
     from datetime import datetime
     
@@ -468,7 +441,7 @@ def calcul_ijss(histo_salaire_annuel, absences, subrogation=True):
     for  motif,jours in jours_absences.items():
         if motif== "maladie":
             jours_indemnises = max(0, jours - delais_carence.get(motif, 0))
-            ijss_mal_brutes = jours_indemnises * min(salaire_journalier_base * 0.5, 53.31)
+            ijss_mal_brutes = jours_indemnises * min(salaire_journalier_base * 0.5, parametre("PLAFOND_IJ_MALADIE", periode))
             ijss_mal_nettes = ijss_mal_brutes * (1 - 6.7 / 100)
             ijss_maladie_brutes += ijss_mal_brutes
             ijss_maladie_nettes += ijss_mal_nettes
@@ -478,7 +451,7 @@ def calcul_ijss(histo_salaire_annuel, absences, subrogation=True):
         
         if motif== "maternité":
             jours_indemnises = max(0, jours - delais_carence.get(motif, 0))
-            ijss_mat_brutes = jours_indemnises * min(salaire_journalier_base, 100.36)
+            ijss_mat_brutes = jours_indemnises * min(salaire_journalier_base, parametre("PLAFOND_IJ_MATERNITE", periode))
             ijss_mat_nettes = ijss_mat_brutes * (1 - 6.7 / 100)
             ijss_maternite_brutes += ijss_mat_brutes
             ijss_maternite_nettes += ijss_mat_nettes
@@ -488,7 +461,7 @@ def calcul_ijss(histo_salaire_annuel, absences, subrogation=True):
 
         if motif== "accident travail":
             jours_indemnises = max(0, jours - delais_carence.get(motif, 0))
-            ijss_acc_brutes = jours_indemnises * min(salaire_journalier_base*0.6, 232.03)
+            ijss_acc_brutes = jours_indemnises * min(salaire_journalier_base*0.6, parametre("PLAFOND_IJ_ACCIDENT_TRAVAIL", periode))
             ijss_acc_nettes = ijss_acc_brutes * (1 - 6.7 / 100)
             ijss_accident_brutes += ijss_acc_brutes
             ijss_accident_nettes += ijss_acc_nettes
@@ -539,216 +512,117 @@ def salaire_de_base(salarie: Salarie):
     total = base*taux
     return base, taux, total
 
-def absence_rtt(salarie: Salarie, timesheet):
-    timesheet_filtered = filter_ts(timesheet)
-    nb_jours_abs_rtt = timesheet_filtered["absence rémunérée RTT"].sum()
-    base = nb_jours_abs_rtt * 7
+def valoriser_jours_absence(salarie: Salarie, nb_jours):
+    base = nb_jours * 7
     taux = salarie.salaire_de_base/salarie.temps_travail
     total = base*taux
     return base, taux, total
 
+def absence_rtt(salarie: Salarie, timesheet):
+    timesheet_filtered = filter_ts(timesheet)
+    return valoriser_jours_absence(salarie, timesheet_filtered["absence rémunérée RTT"].sum())
+
 def absence_cp(salarie: Salarie, timesheet):
     timesheet_filtered = filter_ts(timesheet)
-    nb_jours_abs_cp = timesheet_filtered["absence rémunérée congé payé"].sum()
-    base = nb_jours_abs_cp * 7
-    taux = salarie.salaire_de_base/salarie.temps_travail
-    total = base*taux
-    return base, taux, total
+    return valoriser_jours_absence(salarie, timesheet_filtered["absence rémunérée congé payé"].sum())
 
 def absence_jfr(salarie: Salarie, timesheet):
     timesheet_filtered = filter_ts(timesheet)
-    nb_jours_abs_jfr = timesheet_filtered["absence rémunérée jour férié"].sum()
-    base = nb_jours_abs_jfr * 7
-    taux = salarie.salaire_de_base/salarie.temps_travail
-    total = base*taux
-    return base, taux, total
+    return valoriser_jours_absence(salarie, timesheet_filtered["absence rémunérée jour férié"].sum())
 
 def absence_jfnr(salarie: Salarie, timesheet):
     timesheet_filtered = filter_ts(timesheet)
-    nb_jours_abs_jfnr = timesheet_filtered["absence non rémunérée jour férié"].sum()
-    base = nb_jours_abs_jfnr * 7
-    taux = salarie.salaire_de_base/salarie.temps_travail
-    total = base*taux
-    return base, taux, total
+    return valoriser_jours_absence(salarie, timesheet_filtered["absence non rémunérée jour férié"].sum())
 
 def absence_maladie(salarie: Salarie, timesheet):
     timesheet_filtered = filter_ts(timesheet)
-    nb_jours_abs_jfnr = timesheet_filtered["absence maladie"].sum()
-    base = nb_jours_abs_jfnr * 7
-    taux = salarie.salaire_de_base/salarie.temps_travail
-    total = base*taux
-    return base, taux, total
-    
-    
+    return valoriser_jours_absence(salarie, timesheet_filtered["absence maladie"].sum())
+
 
+# Nombre de combinaisons d'entrées mémorisées par calcul_cotisations et calculer_reduction_fillon
+TAILLE_MEMO = 4096
 
-SMIC=1801.80
-PMSS = 3925.00  # PMSS (Plafond Mensuel de la Sécurité Sociale)
-SMIC = 1801.80
-PLAFOND_SEUIL_MALADIE = 2.5*SMIC
-PMSS_COMPLET = 3925.00
-PLAFOND_FAMILLE = 3.5*SMIC
-PLAFOND_CHOMAGE =4*PMSS
-PLAFOND_APEC =4*PMSS
 
+def salaire_brut_du_salarie(salarie, salaire_brut=None):
+    """
+    Salaire brut à retenir : celui passé explicitement, sinon le champ salaire_brut du salarié.
+    Le calcul du bulletin ne renseigne plus ce champ (fiche_de_paie ne modifie pas le salarié) :
+    un champ resté à 0 signale un appel qui n'a pas transmis le brut, plutôt qu'un brut nul.
+    """
+    if salaire_brut is not None:
+        return float(salaire_brut)
+    if not salarie.salaire_brut:
+        raise ValueError("Salaire brut inconnu : le passer en argument (salaire_brut=...), "
+                         "par exemple celui renvoyé par calcul_salaire_brut")
+    return float(salarie.salaire_brut)
 
 
-def calcul_cotisations(salarie):
+def calcul_cotisations(salarie, periode=None, salaire_brut=None):
     """
     Calcule les cotisations sociales en tenant compte de :
     - Cotisations salariales (retenues sur le salaire)
     - Cotisations patronales (charges de l'employeur)
     - Effectif de l'entreprise (impact sur FNAL, Versement Mobilités, etc.)
+    Les lignes, leurs assiettes, taux et conditions sont celles du registre des cotisations
+    (registre_cotisations) ; le SMIC, le PMSS, les plafonds et les taux sont ceux en vigueur à la
+    période de paie, les seuils d'effectif sont lus dans les paramètres compilés de l'entreprise
+    (voir parametres_entreprise).
+
+    Le résultat est mémorisé par valeur des seules entrées lues (salaire brut, statut cadre,
+    paramètres compilés de l'entreprise, période, valeurs du registre en vigueur à la période) : les
+    salariés d'un lot qui partagent une même combinaison ne la calculent qu'une fois, et un registre
+    rechargé (recharger_parametres) ne renvoie jamais les montants calculés avec les anciennes valeurs.
+    Chaque appel reçoit sa propre copie des dictionnaires.
+    Le salaire brut est celui passé en argument, à défaut celui du salarié (voir salaire_brut_du_salarie).
     """
-
-
-    salaire_brut = salarie.salaire_brut
-    salaire_plafonne = min(salaire_brut, PMSS)
-    salaire_plafonne_T2 = min(salaire_brut,8*PMSS_COMPLET)
-    effectif = salarie.entreprise.effectif
-    taux_AT = salarie.entreprise.taux_AT
-    salaire_plafonne_famille= min(salaire_brut, 3.5*SMIC)
-    salaire_plafonne_chomage = min(salaire_brut, 4*PMSS)
-    salaire_plafonne_apec = min(salaire_brut, 4*PMSS)
-    taux_versement_mobilite= salarie.entreprise.taux_versement_mobilite
-    part_patronale_prevoyance = salarie.entreprise. forfait_complementaire_sante
-    part_patronale_mutuelle = salarie.entreprise.forfait_mutuelle
-    assiette_csg= (salaire_brut + part_patronale_prevoyance + part_patronale_mutuelle)*0.9825
-
-    cotisations = {
-        "Salarial": {},
-        "Patronal": {}
-    }
-
-
-    # ✅ Sécurité Sociale
-    if salaire_brut<PLAFOND_SEUIL_MALADIE:
-        cotisations["Patronal"]["Maladie-Maternité"] = salaire_brut * 0.07  # 7% 
-    else:
-        cotisations["Patronal"]["Maladie-Maternité"] = salaire_brut * 0.07
-        cotisations["Patronal"]["Maladie-Maternité Complément"] = salaire_brut * 0.06  # 6%
-
-    cotisations["Salarial"]["Vieillesse Déplafonnée"] = salaire_brut * 0.004  # 0.4%
-    cotisations["Patronal"]["Vieillesse Déplafonnée"] = salaire_brut * 0.0202  # 2%
-
-    cotisations["Salarial"]["Vieillesse Plafonnée"] = salaire_plafonne * 0.069  # 6.9%
-    cotisations["Patronal"]["Vieillesse Plafonnée"] = salaire_plafonne * 0.0855  # 8.55%
-
-    # ✅ Accident du travail
-    cotisations["Patronal"]["Accident du travail"] = salaire_brut * taux_AT  
-
-    # ✅ Retraite complémentaire Agirc-Arrco (Tranche 1& 2)
-    cotisations["Salarial"]["Retraite Complémentaire (Tr1)"] = salaire_plafonne * 0.0315  # 3.15%
-    cotisations["Patronal"]["Retraite Complémentaire (Tr1)"] = salaire_plafonne * 0.0472  # 4.72%
-    
-    if PMSS< salaire_brut:
-        cotisations["Salarial"]["Retraite Complémentaire (Tr2)"] =(salaire_plafonne_T2-PMSS) * 0.0864
-        cotisations["Patronal"]["Retraite Complémentaire (Tr2)"] =(salaire_plafonne_T2-PMSS) * 0.1295
-
-    # ✅ CET
-    if PMSS< salaire_brut:
-        cotisations["Salarial"]["CET"] = salaire_plafonne_T2*0.0014
-        cotisations["Patronal"]["CET"] = salaire_plafonne_T2*0.0021
-
-    
-    # ✅ CEG(TU1)
-    
-    cotisations["Salarial"]["CEG_T1"] = salaire_plafonne *0.0086
-    cotisations["Patronal"]["CEG_T1"] = salaire_plafonne* 0.0129
-    
-    # ✅ CEG(TU2)
-    if PMSS< salaire_brut:
-        cotisations["Salarial"]["CEG_T2"] = (salaire_plafonne_T2-PMSS) *0.0108
-        cotisations["Patronal"]["CEG_T2"] = (salaire_plafonne_T2-PMSS)*0.0162
-    
-
-    # ✅ Famille(TU2)
-    if salaire_brut<PLAFOND_FAMILLE:
-        cotisations["Patronal"]["FAMILLE"] = salaire_plafonne_famille*0.0345
-    else:
-        cotisations["Patronal"]["FAMILLE"] = salaire_plafonne_famille*0.525
-
-
-    # ✅ Assurance chômage (hors fonction publique)
-    cotisations["Patronal"]["Assurance Chômage"] = salaire_plafonne_chomage * 0.0405 # 4,05%
-    cotisations["Patronal"]["AGS"] = salaire_plafonne_chomage * 0.0025 # 0.25%
-
-
-    # ✅ APEC (Cadres uniquement)
-    if salarie.statut.lower() == "cadre":
-        cotisations["Salarial"]["APEC"] = salaire_plafonne_apec * 0.0024  # 0.24%
-        cotisations["Patronal"]["APEC"] = salaire_plafonne_apec * 0.0036  # 0.36%
-        cotisations["Patronal"]["Prévoyance"] = salaire_plafonne * 0.015  # 1.5%
-
-
-    # ✅ FNAL (varie selon effectif)
-    if effectif < 50:
-        cotisations["Patronal"]["FNAL"] = salaire_plafonne * 0.001  # 0.1% (<50 salariés)
-    else:
-        cotisations["Patronal"]["FNAL"] = salaire_plafonne  * 0.005  # 0.5% (≥50 salariés)
-
-    # ✅ Versement Mobilités (varie selon effectif)
-    if effectif >= 11:
-        cotisations["Patronal"]["Versement Transport"] = salaire_brut * taux_versement_mobilite 
-
-    # ✅ Cotisations solidarité autonomie
-    cotisations["Patronal"]["Solidarité autonomie"] = salaire_brut * 0.003
-    
-
-    # ✅ Financement Dialogue social
-    cotisations["Patronal"]["Dialogue social"] = salaire_brut *0.00016 
-
-    # ✅ Contribution à la formation professionnelle (varie selon effectif)
-    if effectif >= 11:
-        cotisations["Patronal"]["Formation professionnelle"] = salaire_brut * 0.01  
-    else:
-        cotisations["Patronal"]["Formation professionnelle"] = salaire_brut*0.0055 
-    
-    # ✅ Taxe d'apprentissage 
-        cotisations["Patronal"]["Taxe d'Apprentissage"] = salaire_brut*0.0059
-        cotisations["Patronal"]["Taxe d'Apprentissage libératoire"] = salaire_brut*0.0009
-
-    # ✅ Participation à l'effort construction (entreprises ≥50 salariés)
-    if effectif >= 50:
-        cotisations["Patronal"]["Effort Construction"] = salaire_brut * 0.0045  # 0.45%
-    
-
-    # ✅ CSG
-    cotisations["Salarial"]["CSG Deductible"] = assiette_csg * (0.068)
-    cotisations["Salarial"]["CSG non Deductible"] = assiette_csg * 0.029
-    cotisations["Salarial"]["CRDS"] = assiette_csg * 0.005
-
-    #✅ forfait social 
-    if effectif >=11:
-        cotisations["Patronal"]["Forfait social 8%"] = (part_patronale_mutuelle+part_patronale_prevoyance) * 0.08
-
-
+    periode = normaliser_periode(periode)
+    cotisations = _cotisations(salaire_brut_du_salarie(salarie, salaire_brut), salarie.statut.lower() == "cadre",
+                               parametres_entreprise(salarie.entreprise), periode, registre().signature(periode))
+    return {"Salarial": dict(cotisations["Salarial"]), "Patronal": dict(cotisations["Patronal"])}
+
+
+@lru_cache(maxsize=TAILLE_MEMO)
+def _cotisations(salaire_brut, cadre, pe, periode, signature):
+    # signature : valeurs du registre en vigueur à la période, seulement lue comme clé de mémorisation
+    pe = vars(pe)
+    cotisations = {part: {} for part in PARTS}
+    for cotisation, _, parts in lignes_applicables(salaire_brut, cadre, pe, plafonds(periode), taux_cotisations(pe, periode)):
+        for part, (_, montant) in parts.items():
+            cotisations[part][cotisation.rubrique] = float(montant)
     return cotisations
 
 
 
-smics = [1766.92,1766.92,1766.92,1766.92,1766.92,1766.92,1766.92,1766.92,1766.92,1801.80,1801.80,1801.80]
-
+def calculer_reduction_fillon(salarie, douze_derniers_smics=None, periode=None, salaire_brut=None):
+    """
+    Réduction Fillon (part URSSAF, part retraite), mémorisée comme calcul_cotisations. Sans historique
+    fourni, les SMIC des 12 mois précédant la période sont lus dans le registre avant la mémorisation :
+    ils font partie de la clé, comme les valeurs du registre en vigueur à la période.
+    """
+    periode = normaliser_periode(periode)
+    if douze_derniers_smics is None:
+        douze_derniers_smics = registre().douze_derniers("SMIC", periode)
+    return _reduction_fillon(
+        salaire_brut_du_salarie(salarie, salaire_brut),
+        tuple(salarie.douze_derniers_salaires),
+        tuple(douze_derniers_smics),
+        parametres_entreprise(salarie.entreprise).T_fillon,
+        periode,
+        registre().signature(periode),
+    )
 
 
-def calculer_reduction_fillon(salarie, douze_derniers_smics):
-    # Calcul de T
-    if salarie.entreprise.effectif < 50:
-        T = 0.3194 - 0.0046
-    else:
-        T = 0.3234 - 0.0046
-    
-    T += min(salarie.entreprise.taux_AT, 0.0046)
-    
-    # Calcul de C
-    C = (1.6 * sum(douze_derniers_smics) / sum(salarie.douze_derniers_salaires) - 1) * (T / 0.6)
+@lru_cache(maxsize=TAILLE_MEMO)
+def _reduction_fillon(salaire_brut, douze_derniers_salaires, douze_derniers_smics, T, periode, signature):
+    # Calcul de C (T est compilé avec les paramètres de l'entreprise)
+    C = (1.6 * sum(douze_derniers_smics) / sum(douze_derniers_salaires) - 1) * (T / 0.6)
     
     # Calcul de la réduction Fillon
-    if salarie.salaire_brut> 1.6*SMIC:
+    if salaire_brut> plafonds(periode)["SEUIL_FILLON"]:
         return 0,0
     
     else:
-        reduction = C * salarie.salaire_brut
+        reduction = C * salaire_brut
         
         # Répartition de la réduction Fillon
         taux_retraite = 0.0601
@@ -756,36 +630,62 @@ def calculer_reduction_fillon(salarie, douze_derniers_smics):
         
         reduction_urssaf = reduction * (taux_urssaf / T)
         reduction_retraite = reduction * (taux_retraite / T)
-        
+
         return reduction_urssaf, reduction_retraite
 
 
+def statistiques_memo():
+    """Succès, échecs et remplissage de la mémorisation des cotisations et de la réduction Fillon."""
+    return {nom: memo.cache_info()._asdict() for nom, memo in
+            (("calcul_cotisations", _cotisations), ("calculer_reduction_fillon", _reduction_fillon))}
+
+
+def vider_memo():
+    """Vide la mémorisation des cotisations et de la réduction Fillon."""
+    _cotisations.cache_clear()
+    _reduction_fillon.cache_clear()
+
+
+def recharger_parametres(chemin_parametres=parametres.FICHIER_PARAMETRES, chemin_baremes=parametres.FICHIER_BAREMES):
+    """
+    Relit les paramètres et les barèmes réglementaires (après une correction du fichier CSV, par exemple)
+    et vide la mémorisation : les bulletins suivants sont calculés avec les nouvelles valeurs.
+    :return: le nouveau registre des paramètres
+    """
+    nouveau = parametres.recharger(chemin_parametres, chemin_baremes)
+    vider_memo()
+    return nouveau
+
+
 
 def reduction_tepa(timesheet,salarie):
     hs_25, hs_50 = calcul_hs(timesheet)
-    hs=hs_25+hs_50
-    effectif=salarie.entreprise.effectif
-    if effectif < 20:
-        reduction_tepa =  hs* 1.50  # 1,50€ par heure
-    elif effectif < 250:
-        reduction_tepa = hs * 0.50  # 0,50€ par heure
-    else:
-        reduction_tepa = 0.0  # Pas de réduction si +250 salariés
-    return reduction_tepa
+    return reduction_tepa_par_heure(hs_25+hs_50, parametres_entreprise(salarie.entreprise).tepa_par_heure)
+
+def reduction_tepa_heures(hs, effectif):
+    return reduction_tepa_par_heure(hs, float(taux_tepa(effectif)))
+
+def reduction_tepa_par_heure(hs, taux):
+    # 1,50€ par heure sous 20 salariés, 0,50€ sous 250, pas de réduction au-delà
+    if taux == 0:
+        return 0.0
+    return hs * taux
 
 
 
 
 def exoneration_hs(timesheet, salarie):
     hs_25, hs_50 = calcul_hs(timesheet)
-    hs=hs_25+hs_50
+    return exoneration_heures_sup(salarie, hs_25, hs_50)
+
+def exoneration_heures_sup(salarie, hs_25, hs_50):
     rem_hs = (salarie.salaire_de_base/salarie.temps_travail)*(1.25*hs_25+1.5*hs_50)
     exoneration = rem_hs*0.1131
     return exoneration
 
 
-def retirer_tickets_resto(salarie, avantages, timesheet):
-    dic_avantages = calcul_avantages_en_nature(salarie, avantages, timesheet)
+def retirer_tickets_resto(salarie, avantages, timesheet, periode=None):
+    dic_avantages = calcul_avantages_en_nature(salarie, avantages, timesheet, periode=periode)
     if not dic_avantages or 'Détail des avantages' not in dic_avantages:
         return 0
         
@@ -796,9 +696,33 @@ def retirer_tickets_resto(salarie, avantages, timesheet):
     return montant_a_deduire_tickets_resto
 
 def navigo(salarie):
-    navigo= salarie.entreprise.taux_transport*salarie.entreprise.prix_transport
-    return navigo
-
+    return parametres_entreprise(salarie.entreprise).navigo
+
+
+
+# Barème du prélèvement à la source : (plafond de la tranche, taux en %)
+BAREME_PAS = [
+    (1591, 0.0),
+    (1653, 0.5),
+    (1759, 1.3),
+    (1877, 2.1),
+    (2006, 2.9),
+    (2113, 3.5),
+    (2253, 4.1),
+    (2666, 5.3),
+    (3052, 7.5),
+    (3476, 9.9),
+    (3913, 11.9),
+    (4566, 13.8),
+    (5475, 15.8),
+    (6851, 17.9),
+    (8557, 20.0),
+    (11877, 24.0),
+    (16086, 28.0),
+    (25251, 33.0),
+    (54088, 38.0),
+    (float('inf'), 43.0),
+]
 
 
 def calcul_taxe_progressive(revenu: float) -> float:
@@ -809,32 +733,9 @@ def calcul_taxe_progressive(revenu: float) -> float:
     :return: Montant total de la taxe due.
     """
 
-    tranches = [
-        (1591, 0.0),
-        (1653, 0.5),
-        (1759, 1.3),
-        (1877, 2.1),
-        (2006, 2.9),
-        (2113, 3.5),
-        (2253, 4.1),
-        (2666, 5.3),
-        (3052, 7.5),
-        (3476, 9.9),
-        (3913, 11.9),
-        (4566, 13.8),
-        (5475, 15.8),
-        (6851, 17.9),
-        (8557, 20.0),
-        (11877, 24.0),
-        (16086, 28.0),
-        (25251, 33.0),
-        (54088, 38.0),
-        (float('inf'), 43.0),
-    ]
-
     taxe_totale = 0.0
 
-    for seuil, taux in tranches:
+    for seuil, taux in BAREME_PAS:
         if revenu <= seuil:
             taxe_totale = revenu * (taux / 100)
             return round(taxe_totale, 2)
@@ -842,9 +743,9 @@ def calcul_taxe_progressive(revenu: float) -> float:
     return round(taxe_totale, 2)
 
 
-def net_imposable(salarie):
-    salaire_brut = salarie.salaire_brut
-    cotisations = calcul_cotisations(salarie)
+def net_imposable(salarie, periode=None, salaire_brut=None):
+    salaire_brut = salaire_brut_du_salarie(salarie, salaire_brut)
+    cotisations = calcul_cotisations(salarie, periode, salaire_brut)
     somme_cotis = sum(cotisations['Salarial'].values())
     a_reintegrer = cotisations['Salarial'].get('CSG non Deductible',0) + cotisations["Patronal"].get("Prévoyance",0) + cotisations["Salarial"].get("CRDS", 0)
     net_imposable = salaire_brut - somme_cotis + a_reintegrer
@@ -852,19 +753,21 @@ def net_imposable(salarie):
 
 
 
-def montant_net_social(salarie, cotisations,timesheet,absences={}):
-    s= salarie.salaire_brut - sum(cotisations['Salarial'].values()) - calcul_ijss(salarie.douze_derniers_salaires,absences)[1] + exoneration_hs(timesheet,salarie)
+def montant_net_social(salarie, cotisations,timesheet,absences={}, periode=None, exoneration=None, salaire_brut=None):
+    if exoneration is None:
+        exoneration = exoneration_hs(timesheet,salarie)
+    s= salaire_brut_du_salarie(salarie, salaire_brut) - sum(cotisations['Salarial'].values()) - calcul_ijss(salarie.douze_derniers_salaires,absences,periode=periode)[1] + exoneration
     return s
 
-def net_a_payer(salarie):
-    base= net_imposable(salarie)
+def net_a_payer(salarie, periode=None, salaire_brut=None):
+    base= net_imposable(salarie, periode, salaire_brut)
     pas= calcul_taxe_progressive(base)
     return base-pas
 
 
 
-def cout_entreprise(salarie, cotisations, timesheet):
-    s= salarie.salaire_brut + sum(cotisations['Salarial'].values()) + navigo(salarie) + salarie.entreprise.titre_restaurant
+def cout_entreprise(salarie, cotisations, timesheet, salaire_brut=None):
+    s= salaire_brut_du_salarie(salarie, salaire_brut) + sum(cotisations['Salarial'].values()) + navigo(salarie) + salarie.entreprise.titre_restaurant
     return s
     
 
@@ -872,276 +775,242 @@ def cout_entreprise(salarie, cotisations, timesheet):
 
 import pandas as pd
 
-def fiche_de_paie(salarie, avantages, primes,timesheet, timesheet_prec, absence_motifs=None):
-    # Initialisation sécurisée
-    if absence_motifs is None:
-        absence_motifs = {}
-    
-    
-    timesheet_filtered = filter_ts(timesheet)
-    salaire_mensuel_3_mois = [salarie.douze_derniers_salaires[-3], salarie.douze_derniers_salaires[-2], salarie.douze_derniers_salaires[-1]]
+# Colonnes des lignes de rémunération, avant l'ajout des cotisations
+COLONNES_LIGNES = ["Catégorie", "Base", "Taux (%)", "Total (€)"]
+
+# Les fonctions rubriques_* renvoient les lignes du bulletin sous forme de liste de dictionnaires ;
+# les fonctions lignes_* correspondantes en font des DataFrames.
 
+def rubriques_salaire_de_base(salarie, jours_rtt, jours_cp, jours_jfr, jours_jfnr):
+    """Salaire de base et absences rémunérées / non rémunérées, à partir des nombres de jours du mois."""
     base_sdb,taux_sdb, total_sdb = salaire_de_base(salarie)
-    base_rtt,taux_rtt, total_rtt =    absence_rtt(salarie,timesheet)
-    base_cp,taux_cp, total_cp = absence_cp(salarie,timesheet)
-    base_jfr,taux_jfr, total_jfr = absence_jfr(salarie,timesheet)
-    base_jfnr,taux_jfnr, total_jfnr = absence_jfnr(salarie,timesheet)
-
-    data = {"Catégorie": ["Salaire de base", "absence RTT", "indemnisation absence RTT", "absence congés payés", "indemnisation absence congés payés", "absence jour ferié", "indemnisation absence jour férié", "absence jour ferié non rémunéré"],
-        "Base": [ base_sdb, -base_rtt, base_rtt, -base_cp, base_cp, -base_jfr, base_jfr, -base_jfnr],
-        "Taux (%)": [taux_sdb, taux_rtt, taux_rtt, taux_cp, taux_cp, taux_jfr, taux_jfr, taux_jfnr],
-        "Total (€)": [total_sdb, -total_rtt, total_rtt, -total_cp,total_cp,  -total_jfr, total_jfr, -total_jfnr],}
-    
-    df= pd.DataFrame(data)
+    base_rtt,taux_rtt, total_rtt = valoriser_jours_absence(salarie, jours_rtt)
+    base_cp,taux_cp, total_cp = valoriser_jours_absence(salarie, jours_cp)
+    base_jfr,taux_jfr, total_jfr = valoriser_jours_absence(salarie, jours_jfr)
+    base_jfnr,taux_jfnr, total_jfnr = valoriser_jours_absence(salarie, jours_jfnr)
+
+    return [
+        {"Catégorie": "Salaire de base", "Base": base_sdb, "Taux (%)": taux_sdb, "Total (€)": total_sdb},
+        {"Catégorie": "absence RTT", "Base": -base_rtt, "Taux (%)": taux_rtt, "Total (€)": -total_rtt},
+        {"Catégorie": "indemnisation absence RTT", "Base": base_rtt, "Taux (%)": taux_rtt, "Total (€)": total_rtt},
+        {"Catégorie": "absence congés payés", "Base": -base_cp, "Taux (%)": taux_cp, "Total (€)": -total_cp},
+        {"Catégorie": "indemnisation absence congés payés", "Base": base_cp, "Taux (%)": taux_cp, "Total (€)": total_cp},
+        {"Catégorie": "absence jour ferié", "Base": -base_jfr, "Taux (%)": taux_jfr, "Total (€)": -total_jfr},
+        {"Catégorie": "indemnisation absence jour férié", "Base": base_jfr, "Taux (%)": taux_jfr, "Total (€)": total_jfr},
+        {"Catégorie": "absence jour ferié non rémunéré", "Base": -base_jfnr, "Taux (%)": taux_jfnr, "Total (€)": -total_jfnr},
+    ]
+
+
+def lignes_salaire_de_base(salarie, timesheet):
+    """Lignes du salaire de base et des absences rémunérées / non rémunérées du mois."""
+    timesheet_filtered = filter_ts(timesheet)
+    jours = [timesheet_filtered[colonne].sum() for colonne in (
+        "absence rémunérée RTT", "absence rémunérée congé payé",
+        "absence rémunérée jour férié", "absence non rémunérée jour férié")]
+    return pd.DataFrame(rubriques_salaire_de_base(salarie, *jours), columns=COLONNES_LIGNES)
 
 
+def rubriques_absences_maladie(salarie, absence_motifs, periode=None):
+    """Absences maladie / accident / maternité, avec maintien de salaire et IJSS selon la subrogation."""
+    base_sdb,taux_sdb, total_sdb = salaire_de_base(salarie)
+    salaire_mensuel_3_mois = [salarie.douze_derniers_salaires[-3], salarie.douze_derniers_salaires[-2], salarie.douze_derniers_salaires[-1]]
     absences_rangees = regrouper_absences(absence_motifs)
-    
+    lignes = []
 
     if salarie.entreprise.subrogation:
         for absence in absences_rangees: # Cas avec subrogation
             duree = (datetime.strptime(absence[2], "%Y-%m-%d") - datetime.strptime(absence[1], "%Y-%m-%d")).days + 1
             total_absence = duree*total_sdb/30.42
-            df = df.reset_index(drop=True)
-            new_row=pd.DataFrame({"Catégorie": f"Abs. {absence[0]} {duree} jours", "Base": duree*7, "Taux (%)": taux_sdb, "Total (€)": -total_absence},index=[0])
-            df = pd.concat([df, new_row], ignore_index=True)
+            lignes.append({"Catégorie": f"Abs. {absence[0]} {duree} jours", "Base": duree*7, "Taux (%)": taux_sdb, "Total (€)": -total_absence})
 
-            ijss_brutes, ijss_nettes = calcul_ijss(salaire_mensuel_3_mois, reconstruire_dictionnaire(absence), salarie.entreprise.subrogation)
+            ijss_brutes, ijss_nettes = calcul_ijss(salaire_mensuel_3_mois, reconstruire_dictionnaire(absence), salarie.entreprise.subrogation, periode)
             if duree > 7: # Il y a donc maintien
                 maintien = total_absence*0.9
-                df = df.reset_index(drop=True)
-                new_row=pd.DataFrame({"Catégorie": "Subrogation - maintien de salaire à 90%", "Base": maintien, "Taux (%)": 1, "Total (€)": maintien},index=[0])
-                df = pd.concat([df, new_row], ignore_index=True)
-                df = df.reset_index(drop=True)
-                new_row=pd.DataFrame({"Catégorie": "IJSS brutes", "Base": ijss_brutes, "Taux (%)": 1, "Total (€)": ijss_brutes},index=[0])
-                df = pd.concat([df, new_row], ignore_index=True)
-    
             else:
                 maintien = ijss_brutes
-                df = df.reset_index(drop=True)
-                new_row=pd.DataFrame({"Catégorie": "Subrogation - maintien de salaire à 90%", "Base": maintien, "Taux (%)": 1, "Total (€)": maintien},index=[0])
-                df = pd.concat([df, new_row], ignore_index=True)
-                df = df.reset_index(drop=True)
-                new_row=pd.DataFrame({"Catégorie": "IJSS brutes", "Base": ijss_brutes, "Taux (%)": 1, "Total (€)": ijss_brutes},index=[0])
-                df = pd.concat([df, new_row], ignore_index=True)
-            
+            lignes.append({"Catégorie": "Subrogation - maintien de salaire à 90%", "Base": maintien, "Taux (%)": 1, "Total (€)": maintien})
+            lignes.append({"Catégorie": "IJSS brutes", "Base": ijss_brutes, "Taux (%)": 1, "Total (€)": ijss_brutes})
 
     else:
         for absence in absences_rangees: # Cas sans subrogation
             duree = (datetime.strptime(absence[2], "%Y-%m-%d") - datetime.strptime(absence[1], "%Y-%m-%d")).days + 1
             total_absence = duree*total_sdb/30.42
-            df = df.reset_index(drop=True)
-            new_row=pd.DataFrame({"Catégorie": f"Absence {absence[0]} - {duree} jours", "Base": duree*7, "Taux (%)": taux_sdb, "Total (€)": -total_absence},index=[0])
-            df = pd.concat([df, new_row], ignore_index=True)
-            
+            lignes.append({"Catégorie": f"Absence {absence[0]} - {duree} jours", "Base": duree*7, "Taux (%)": taux_sdb, "Total (€)": -total_absence})
+
             if duree > 7: # Il y a donc maintien
-                ijss_brutes, ijss_nettes = calcul_ijss(salaire_mensuel_3_mois, reconstruire_dictionnaire(absence), salarie.entreprise.subrogation)
+                ijss_brutes, ijss_nettes = calcul_ijss(salaire_mensuel_3_mois, reconstruire_dictionnaire(absence), salarie.entreprise.subrogation, periode)
                 maintien = total_absence*0.9-ijss_brutes
-                df = df.reset_index(drop=True)
-                new_row=pd.DataFrame({"Catégorie": "Maintien de salaire à 90%", "Base": maintien, "Taux (%)": 1, "Total (€)": maintien},index=[0])
-                df = pd.concat([df, new_row], ignore_index=True)
-    
+                lignes.append({"Catégorie": "Maintien de salaire à 90%", "Base": maintien, "Taux (%)": 1, "Total (€)": maintien})
 
-    toutes_primes = calcul_primes(salarie,primes,timesheet)
-    for prime, valeur in toutes_primes["Détail des primes"].items():
-        new_row = pd.DataFrame({
-            "Catégorie": [f"{prime}"],
-            "Base": [valeur],
-            "Taux (%)": [1],
-            "Total (€)": [valeur]
-        })
-        df = pd.concat([df, new_row], ignore_index=True)
+    return lignes
 
-    avantage_nature = calcul_avantages_en_nature(salarie,avantages,timesheet)
+
+def lignes_absences_maladie(salarie, absence_motifs, periode=None):
+    """Lignes d'absence maladie / accident / maternité, avec maintien de salaire et IJSS selon la subrogation."""
+    return pd.DataFrame(rubriques_absences_maladie(salarie, absence_motifs, periode), columns=COLONNES_LIGNES)
+
+
+def rubriques_primes_et_avantages(toutes_primes, avantage_nature):
+    """Primes puis avantages en nature (hors nourriture, déduite en fin de bulletin)."""
+    lignes = []
+    for prime, valeur in toutes_primes["Détail des primes"].items():
+        lignes.append({"Catégorie": f"{prime}", "Base": valeur, "Taux (%)": 1, "Total (€)": valeur})
     for avantage, valeur in avantage_nature["Détail des avantages"].items():
         if avantage != "nourriture":
-            new_row = pd.DataFrame({
-                "Catégorie": [f"Avantage {avantage}"],
-                "Base": [valeur],
-                "Taux (%)": [1],
-                "Total (€)": [valeur]
-            })
-            df = pd.concat([df, new_row], ignore_index=True)
-    
-    merged_ts = merge_overlapping_days(timesheet_prec, timesheet)
-    hs25, hs50 = calcul_hs(merged_ts)
+            lignes.append({"Catégorie": f"Avantage {avantage}", "Base": valeur, "Taux (%)": 1, "Total (€)": valeur})
+    return lignes
+
+
+def lignes_primes_et_avantages(toutes_primes, avantage_nature):
+    """Lignes des primes puis des avantages en nature (hors nourriture, déduite en fin de bulletin)."""
+    return pd.DataFrame(rubriques_primes_et_avantages(toutes_primes, avantage_nature), columns=COLONNES_LIGNES)
+
+
+def rubriques_heures_sup(salarie, hs25, hs50):
+    taux_sdb = salaire_de_base(salarie)[1]
+    lignes = []
     if hs25 > 0:
         taux_hs25 = taux_sdb*1.25
         montant_hs25 = hs25*taux_hs25
-        new_row=pd.DataFrame({"Catégorie": "Heures supplémentaires maj. 25%", "Base": hs25, "Taux (%)": taux_hs25, "Total (€)": montant_hs25},index=[0])
-        df = pd.concat([df, new_row], ignore_index=True)
+        lignes.append({"Catégorie": "Heures supplémentaires maj. 25%", "Base": hs25, "Taux (%)": taux_hs25, "Total (€)": montant_hs25})
 
     if hs50 > 0:
         taux_hs50 = taux_sdb*1.50
         montant_hs50 = hs50*taux_hs50
-        new_row=pd.DataFrame({"Catégorie": "Heures supplémentaires maj. 50%", "Base": hs50, "Taux (%)": taux_hs50, "Total (€)": montant_hs50},index=[0])
-        df = pd.concat([df, new_row], ignore_index=True)
-    
+        lignes.append({"Catégorie": "Heures supplémentaires maj. 50%", "Base": hs50, "Taux (%)": taux_hs50, "Total (€)": montant_hs50})
+    return lignes
+
+
+def lignes_heures_sup(salarie, hs25, hs50):
+    return pd.DataFrame(rubriques_heures_sup(salarie, hs25, hs50), columns=COLONNES_LIGNES)
+
+
+def rubriques_majorations(salarie, heures_nuit, heures_dimanche):
+    """Majorations des heures de nuit et de dimanche aux taux de l'entreprise, dans la limite de ses plafonds mensuels."""
+    taux_sdb = salaire_de_base(salarie)[1]
+    pe = parametres_entreprise(salarie.entreprise)
+    lignes = []
+    for categorie, heures, taux, plafond in (
+        ("Majoration heures de nuit", heures_nuit, pe.taux_majoration_nuit, pe.plafond_majoration_nuit),
+        ("Majoration heures de dimanche", heures_dimanche, pe.taux_majoration_dimanche, pe.plafond_majoration_dimanche),
+    ):
+        if heures > 0 and taux > 0:
+            taux_majoration = taux_sdb*taux
+            lignes.append({"Catégorie": categorie, "Base": heures, "Taux (%)": taux_majoration,
+                           "Total (€)": min(heures*taux_majoration, plafond)})
+    return lignes
+
+
+def lignes_majorations(salarie, heures_nuit, heures_dimanche):
+    return pd.DataFrame(rubriques_majorations(salarie, heures_nuit, heures_dimanche), columns=COLONNES_LIGNES)
+
+
+def lignes_salaire_brut(*morceaux):
+    """Concatène les lignes de rémunération et ajoute la ligne "Salaire Brut". Renvoie (lignes, salaire brut)."""
+    df = pd.concat([m for m in morceaux if not m.empty], ignore_index=True)
+    salaire_brut = df["Total (€)"].sum()
     new_row = pd.DataFrame({
         "Catégorie": "Salaire Brut",
         "Base": "" ,
         "Taux (%)":"" ,
-        "Total (€)": df["Total (€)"].sum()
+        "Total (€)": salaire_brut
     },index=[0])
-    
-    df = pd.concat([df, pd.DataFrame(new_row)], ignore_index=True)
-    salaire_brut_index = df[df["Catégorie"] == "Salaire Brut"].index[0]
-    df_brut = df.iloc[:salaire_brut_index].copy()
-    salarie.salaire_brut = df_brut["Total (€)"].sum()
-
-
-    return df
 
+    df = pd.concat([df, pd.DataFrame(new_row)], ignore_index=True)
+    return df, salaire_brut
 
 
-def df_cotis(salarie,cotisations,df_salaire):
-    df= df_salaire
+def calcul_salaire_brut(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs=None, periode_primes=None):
+    """
+    Lignes de rémunération du mois jusqu'au salaire brut. Aucune des entrées n'est modifiée.
+    :return: (lignes, salaire brut, timesheet du mois indexée par dates et complétée par le mois précédent)
+    """
+    # Initialisation sécurisée
+    if absence_motifs is None:
+        absence_motifs = {}
 
-    PMSS = 3925.00  # PMSS (Plafond Mensuel de la Sécurité Sociale)
-    SMIC = 1801.80
-    PLAFOND_SEUIL_MALADIE = 2.5*SMIC
-    PMSS_COMPLET = 3925.00
-    PLAFOND_FAMILLE = 3.5*SMIC
-    PLAFOND_CHOMAGE =4*PMSS
-    PLAFOND_APEC =4*PMSS
-    
-    salaire_brut = float(df_salaire.loc[df_salaire["Catégorie"] == "Salaire Brut", "Total (€)"].values[0])
-    salaire_plafonne = min(salaire_brut, PMSS)
-    salaire_plafonne_T2 = min(salaire_brut,8*PMSS_COMPLET)
-    effectif = salarie.entreprise.effectif
-    taux_AT = salarie.entreprise.taux_AT
-    salaire_plafonne_famille= min(salaire_brut, 3.5*SMIC)
-    salaire_plafonne_chomage = min(salaire_brut, 4*PMSS)
-    salaire_plafonne_apec = min(salaire_brut, 4*PMSS)
-    taux_versement_mobilite= salarie.entreprise.taux_versement_mobilite
-    part_patronale_prevoyance = salarie.entreprise. forfait_complementaire_sante
-    part_patronale_mutuelle = salarie.entreprise.forfait_mutuelle
-    assiette_csg= (salaire_brut + part_patronale_prevoyance + part_patronale_mutuelle)*0.9825
-
-    if salaire_brut< PLAFOND_SEUIL_MALADIE:
-        new_row= {"Catégorie": "Maladie Maternité", "Base": "", "Taux (%)": "", "Total (€)": "","Part_Employeur":-salaire_brut*0.07}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    else: 
-        new_row= {"Catégorie": "Maladie Maternité", "Base": "", "Taux (%)": "", "Total (€)": "","Part_Employeur":-salaire_brut*0.07}
-        df =  pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-        new_row= {"Catégorie": "Maladie Maternité Complément", "Base": "", "Taux (%)": "", "Total (€)": "","Part_Employeur":-salaire_brut*0.06}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    
-    new_row= {"Catégorie": "Vieillesse Déplafonnée", "Base": salaire_brut, "Taux (%)": 0.4, "Total (€)": -salaire_brut*0.004,"Part_Employeur":-salaire_brut*0.0202}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    new_row= {"Catégorie": "Vieillesse Plafonée", "Base": salaire_plafonne, "Taux (%)": 6.9, "Total (€)": -salaire_plafonne*0.069,"Part_Employeur":-salaire_brut*0.0855}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+    timesheet = timesheet_en_dates(timesheet)
+    timesheet_filtered = filter_ts(timesheet)
+    periode = periode_de_paie(timesheet_filtered)
 
-    new_row= {"Catégorie": "Accident du travail", "Base": "", "Taux (%)": "", "Total (€)": "","Part_Employeur":-salaire_brut*taux_AT}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    
-    new_row= {"Catégorie": "Retraite Complémentaire", "Base": salaire_plafonne, "Taux (%)": 3.15, "Total (€)": -salaire_plafonne*0.0315,"Part_Employeur":-salaire_plafonne*0.0472}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+    df_base = lignes_salaire_de_base(salarie, timesheet)
+    df_absences = lignes_absences_maladie(salarie, absence_motifs, periode)
 
-    if PMSS <salaire_brut:
-        new_row= {"Catégorie": "Retraite Complémentaire T2", "Base": (salaire_plafonne_T2 - PMSS), "Taux (%)": 8.64, "Total (€)": -(salaire_plafonne_T2 - PMSS)*0.0864,"Part_Employeur":-(salaire_plafonne_T2 - PMSS)*0.1285}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-        new_row= {"Catégorie": "CET", "Base": salaire_plafonne_T2, "Taux (%)": 0.14, "Total (€)": -salaire_plafonne_T2*0.0014,"Part_Employeur":-salaire_plafonne_T2*0.0021}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+    toutes_primes = calcul_primes(salarie,primes,timesheet,periode_primes)
+    avantage_nature = calcul_avantages_en_nature(salarie,avantages,timesheet,periode=periode)
+    df_primes_avantages = lignes_primes_et_avantages(toutes_primes, avantage_nature)
 
-    
-    new_row = {"Catégorie": "CEG T1", "Base": salaire_plafonne, "Taux (%)": 0.86, "Total (€)": -salaire_plafonne*0.0086,"Part_Employeur":-salaire_plafonne*0.0129}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+    merged_ts = merge_overlapping_days(timesheet_prec, timesheet)
+    hs25, hs50, heures_nuit, heures_dimanche = heures_majorees(merged_ts)
+    df_hs = lignes_heures_sup(salarie, hs25, hs50)
+    df_majorations = lignes_majorations(salarie, heures_nuit, heures_dimanche)
 
-    if PMSS<salaire_brut:
-        new_row = {"Catégorie": "CEG T2", "Base": (salaire_plafonne_T2 -PMSS), "Taux (%)": 1.08, "Total (€)": -(salaire_plafonne_T2 -PMSS)*0.0108,"Part_Employeur":-(salaire_plafonne_T2 -PMSS)*0.0162}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    
-    if salaire_brut<PLAFOND_FAMILLE:
-        new_row= {"Catégorie": "Famille", "Base": "", "Taux (%)": "", "Total (€)": "","Part_Employeur":-salaire_plafonne_famille*0.0345}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    else: 
-        new_row= {"Catégorie": "Famille", "Base": "", "Taux (%)": "", "Total (€)": "","Part_Employeur":-salaire_plafonne_famille*0.0525}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    
-    new_row= {"Catégorie": "Chomage", "Base": "", "Taux (%)": "", "Total (€)": "","Part_Employeur":-salaire_plafonne_chomage*0.0405}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    
-    new_row= {"Catégorie": "AGS", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_plafonne_chomage*0.0025}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+    df, salaire_brut = lignes_salaire_brut(df_base, df_absences, df_primes_avantages, df_hs, df_majorations)
+    return df, salaire_brut, merged_ts
 
-    if salarie.statut.lower() == "cadre":
-        new_row= {"Catégorie": "APEC", "Base": salaire_plafonne_apec, "Taux (%)":0.24, "Total (€)":-salaire_plafonne_apec*0.0024,"Part_Employeur":-salaire_plafonne_apec*0.0036}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-        new_row= {"Catégorie": "Prévoyance", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_plafonne*0.015}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
-    if salarie.entreprise.effectif < 50:
-        new_row= {"Catégorie": "FNAL", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_plafonne*0.001}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    else:
-        new_row= {"Catégorie": "FNAL", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_plafonne*0.005}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    
-    if salarie.entreprise.effectif >= 11:
-        new_row= {"Catégorie": "Versement transport", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_brut*taux_versement_mobilite}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    
-    new_row= {"Catégorie": "Solidarité autonomie", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_brut*0.03}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+def fiche_de_paie(salarie, avantages, primes,timesheet, timesheet_prec, absence_motifs=None, periode_primes=None):
+    """Lignes de rémunération jusqu'au salaire brut (voir calcul_salaire_brut)."""
+    return calcul_salaire_brut(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs, periode_primes)[0]
 
-    new_row= {"Catégorie": "Dialogue social", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_brut*0.00016}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
-    if salarie.entreprise.effectif >= 11:
-        new_row= {"Catégorie": "Formation professionnelle", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_brut*0.01}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    else:
-        new_row= {"Catégorie": "Formation professionnelle", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_brut*0.0055}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
-    new_row= {"Catégorie": "Taxe d'apprentissage", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_brut*0.0059}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+def rubriques_cotisations(salarie, salaire_brut, periode=None):
+    """
+    Lignes de cotisations salariales et patronales pour un salaire brut donné, une par ligne applicable
+    du registre des cotisations : assiette et taux affichés pour les cotisations salariales.
+    """
+    pe = vars(parametres_entreprise(salarie.entreprise))
+    lignes = []
+    for cotisation, assiette, parts in lignes_applicables(salaire_brut, salarie.statut.lower() == "cadre", pe,
+                                                          plafonds(periode), taux_cotisations(pe, periode)):
+        salarial, patronal = parts.get("Salarial"), parts.get("Patronal")
+        lignes.append({
+            "Catégorie": cotisation.libelle,
+            "Base": assiette if salarial else "",
+            "Taux (%)": salarial[0] * 100 if salarial else "",
+            "Total (€)": -salarial[1] if salarial else "",
+            "Part_Employeur": -patronal[1] if patronal else "",
+        })
+    return lignes
 
-    new_row= {"Catégorie": "Taxe d'apprentissage libératoire", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_brut*0.0009}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
-    if salarie.entreprise.effectif >= 11:
-        new_row= {"Catégorie": "Effort construction", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_brut*0.0045}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    else:
-        new_row= {"Catégorie": "Effort construction", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-salaire_brut*0.0055}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    
-    new_row = {"Catégorie": "CSG déductible", "Base": assiette_csg, "Taux (%)": 6.8, "Total (€)": -assiette_csg*0.068,"Part_Employeur":""}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+def df_cotis(salarie,cotisations,df_salaire,periode=None):
+    salaire_brut = float(df_salaire.loc[df_salaire["Catégorie"] == "Salaire Brut", "Total (€)"].values[0])
+    return pd.concat([df_salaire, pd.DataFrame(rubriques_cotisations(salarie, salaire_brut, periode))], ignore_index=True)
 
-    new_row = {"Catégorie": "CSG non déductible", "Base": assiette_csg, "Taux (%)": 2.9, "Total (€)": -assiette_csg*0.029,"Part_Employeur":""}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
-    new_row = {"Catégorie": "CRDS", "Base": assiette_csg, "Taux (%)": 0.5, "Total (€)": -assiette_csg*0.005,"Part_Employeur":""}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
-    if salarie.entreprise.effectif >= 11:
-        new_row= {"Catégorie": "Forfait social 8%", "Base": "", "Taux (%)":"", "Total (€)":"","Part_Employeur":-(part_patronale_mutuelle+part_patronale_prevoyance)*0.08}
-        df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
-    
-    return df
+def df_reductions(salarie, df_cotisations,timesheet,avantages,douze_derniers_smics=None, salaire_brut=None):
+    periode = periode_de_paie(timesheet)
+    fillon_urssaf, fillon_retraite = calculer_reduction_fillon(salarie, douze_derniers_smics, periode, salaire_brut)
+    tepa = reduction_tepa(timesheet, salarie)
+    exo_hs = exoneration_hs(timesheet, salarie)
+    resto = retirer_tickets_resto(salarie, avantages, timesheet, periode)
+    return lignes_reductions(salarie, df_cotisations, fillon_urssaf, fillon_retraite, tepa, exo_hs, resto)
 
 
+def rubriques_reductions(fillon_urssaf, fillon_retraite, tepa, exo_hs):
+    return [
+        {"Catégorie": "Réduction Fillon - URSSAF", "Base":"", "Taux (%)":"", "Total (€)":"","Part_Employeur":fillon_urssaf},
+        {"Catégorie": "Réduction Fillon - Retraite", "Base":"", "Taux (%)":"", "Total (€)":"","Part_Employeur":fillon_retraite},
+        {"Catégorie": "Réduction TEPA", "Base":"", "Taux (%)":"", "Total (€)":"","Part_Employeur":tepa},
+        {"Catégorie": "Exonération Heures supplémentaires", "Base":"", "Taux (%)":"", "Total (€)":"","Part_Employeur":exo_hs},
+    ]
 
 
-def df_reductions(salarie, df_cotisations,timesheet,avantages,douze_derniers_smics=[1766.92,1766.92,1766.92,1766.92,1766.92,1766.92,1766.92,1766.92,1766.92,1801.80,1801.80,1801.80]):
-    df = df_cotisations
-    fillon_urssaf, fillon_retraite = calculer_reduction_fillon(salarie, douze_derniers_smics)
-    new_row = {"Catégorie": "Réduction Fillon - URSSAF", "Base":"", "Taux (%)":"", "Total (€)":"","Part_Employeur":fillon_urssaf}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-    new_row = {"Catégorie": "Réduction Fillon - Retraite", "Base":"", "Taux (%)":"", "Total (€)":"","Part_Employeur":fillon_retraite}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+def rubriques_transport_et_repas(salarie, resto):
+    """Navigo et participation aux tickets restaurant, après le salaire net avant impôts."""
+    return [
+        {"Catégorie": " Navigo", "Base":88.80, "Taux (%)": 50, "Total (€)": -44.40,"Part_Employeur":-44.40},
+        {"Catégorie": " Participation tickets restaurant", "Base":"", "Taux (%)": "", "Total (€)": -resto,"Part_Employeur":-resto*salarie.entreprise.participation_titre_restaurant/(1-salarie.entreprise.participation_titre_restaurant)},
+    ]
 
-    tepa = reduction_tepa(timesheet, salarie)
-    new_row = {"Catégorie": "Réduction TEPA", "Base":"", "Taux (%)":"", "Total (€)":"","Part_Employeur":tepa}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
-    exo_hs = exoneration_hs(timesheet, salarie)
-    new_row = {"Catégorie": "Exonération Heures supplémentaires", "Base":"", "Taux (%)":"", "Total (€)":"","Part_Employeur":exo_hs}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+def lignes_reductions(salarie, df_cotisations, fillon_urssaf, fillon_retraite, tepa, exo_hs, resto):
+    """Ajoute les réductions, le salaire net avant impôts, le Navigo et les tickets restaurant."""
+    df = pd.concat([df_cotisations, pd.DataFrame(rubriques_reductions(fillon_urssaf, fillon_retraite, tepa, exo_hs))], ignore_index=True)
 
 # Sélectionner les lignes après "Salaire Brut"
     salaire_brut_index = df[df["Catégorie"] == "Salaire Brut"].index[0]
@@ -1165,36 +1034,34 @@ def df_reductions(salarie, df_cotisations,timesheet,avantages,douze_derniers_smi
     # Ajouter la ligne au DataFrame
     df = pd.concat([df, new_row], ignore_index=True)
 
-    new_row = {"Catégorie": " Navigo", "Base":88.80, "Taux (%)": 50, "Total (€)": -44.40,"Part_Employeur":-44.40}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-
-    resto = retirer_tickets_resto(salarie, avantages, timesheet)
-    new_row = {"Catégorie": " Participation tickets restaurant", "Base":"", "Taux (%)": "", "Total (€)": -resto,"Part_Employeur":-resto*salarie.entreprise.participation_titre_restaurant/(1-salarie.entreprise.participation_titre_restaurant)}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+    df = pd.concat([df, pd.DataFrame(rubriques_transport_et_repas(salarie, resto))], ignore_index=True)
 
     return df
 
 
-def ajouter_sous_totaux(df_reduc, salarie, timesheet):
-    df= df_reduc
+def ajouter_sous_totaux(df_reduc, salarie, timesheet, salaire_brut=None):
+    periode = periode_de_paie(timesheet)
 
-    cotisations = calcul_cotisations(salarie)
-    mns = montant_net_social(salarie, cotisations, timesheet)
-    new_row = {"Catégorie": "Montant net social", "Base":"", "Taux (%)":"", "Total (€)":mns,"Part_Employeur":""}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+    cotisations = calcul_cotisations(salarie, periode, salaire_brut)
+    mns = montant_net_social(salarie, cotisations, timesheet, periode=periode, salaire_brut=salaire_brut)
+    net_impos = net_imposable(salarie, periode, salaire_brut)
+    pas = calcul_taxe_progressive(net_impos)
+    net_paye = net_a_payer(salarie, periode, salaire_brut)
+    return lignes_sous_totaux(df_reduc, mns, net_impos, pas, net_paye)
 
-    net_impos = net_imposable(salarie)
-    new_row = {"Catégorie": "Net imposable", "Base":"", "Taux (%)":"", "Total (€)":net_impos,"Part_Employeur":""}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
+def rubriques_sous_totaux(mns, net_impos, pas, net_paye):
+    return [
+        {"Catégorie": "Montant net social", "Base":"", "Taux (%)":"", "Total (€)":mns,"Part_Employeur":""},
+        {"Catégorie": "Net imposable", "Base":"", "Taux (%)":"", "Total (€)":net_impos,"Part_Employeur":""},
+        {"Catégorie": "Prelevement à la source", "Base":"", "Taux (%)":"", "Total (€)":-pas,"Part_Employeur":""},
+        {"Catégorie": "Net à payer", "Base":"", "Taux (%)":"", "Total (€)":net_paye,"Part_Employeur":""},
+    ]
 
-    pas = calcul_taxe_progressive(net_impos)
-    new_row = {"Catégorie": "Prelevement à la source", "Base":"", "Taux (%)":"", "Total (€)":-pas,"Part_Employeur":""}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
 
-    net_paye = net_a_payer(salarie)
-    new_row = {"Catégorie": "Net à payer", "Base":"", "Taux (%)":"", "Total (€)":net_paye,"Part_Employeur":""}
-    df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
+def lignes_sous_totaux(df_reduc, mns, net_impos, pas, net_paye):
+    """Ajoute les sous-totaux (net social, net imposable, PAS, net à payer, total patronal) et formate les montants."""
+    df = pd.concat([df_reduc, pd.DataFrame(rubriques_sous_totaux(mns, net_impos, pas, net_paye))], ignore_index=True)
 
     new_row = {"Catégorie": "Sous-total Cotisations Patronales", "Base":"", "Taux (%)":"", "Total (€)":"","Part_Employeur":-pd.to_numeric(df['Part_Employeur'], errors='coerce').sum()}
     df = pd.concat([df, pd.DataFrame(new_row, index=[0])], ignore_index=True)
@@ -1216,5 +1083,38 @@ def ajouter_sous_totaux(df_reduc, salarie, timesheet):
     return df_formatted
 
 
+# Moteurs de calcul d'un bulletin : "pandas" (fonctions ci-dessus), "numpy" (bulletin_rapide, mêmes lignes)
+# ou "centimes" (bulletin_rapide en centimes entiers, voir paie_centimes)
+MOTEURS = ("pandas", "numpy", "centimes")
 
 
+def calculer_bulletin(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs=None, periode_primes=None,
+                      moteur="pandas", avec_brut=False):
+    """
+    Enchaîne le calcul complet d'un bulletin : salaire brut, cotisations, réductions et sous-totaux.
+    Renvoie les lignes telles que produites par ajouter_sous_totaux.
+    periode_primes impose le mois de paie aux primes (13ème mois, ancienneté) au lieu de le déduire de la timesheet.
+    moteur="numpy" calcule les mêmes lignes sans DataFrame intermédiaire, environ vingt fois plus vite.
+    moteur="centimes" arrondit chaque ligne au centime et calcule la suite en centimes entiers : chaque
+    total est la somme exacte des lignes affichées, à quelques centimes près du calcul en flottants.
+
+    Les entrées ne sont pas modifiées : un même salarié ou une même timesheet peut être partagé
+    entre threads ou mis en cache. Le salaire brut est passé explicitement aux étapes suivantes ;
+    avec_brut=True renvoie (lignes, salaire brut non arrondi).
+    """
+    if moteur not in MOTEURS:
+        raise ValueError(f"Moteur inconnu : {moteur} (attendu : {', '.join(MOTEURS)})")
+    if moteur in ("numpy", "centimes"):
+        from bulletin_rapide import bulletin_rapide
+        return bulletin_rapide(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs, periode_primes,
+                               avec_brut=avec_brut, centimes=moteur == "centimes")
+
+    df_pay, salaire_brut, timesheet_fusionnee = calcul_salaire_brut(salarie, avantages, primes, timesheet, timesheet_prec,
+                                                                    absence_motifs, periode_primes)
+    periode = periode_de_paie(timesheet_fusionnee)
+    cotis = calcul_cotisations(salarie, periode, salaire_brut)
+    df_cotisations = df_cotis(salarie, cotis, df_pay, periode)
+    # Les réductions (TEPA, exonération, tickets restaurant) portent sur la timesheet complétée par le mois précédent
+    df_reduc = df_reductions(salarie, df_cotisations, timesheet_fusionnee, avantages, salaire_brut=salaire_brut)
+    lignes = ajouter_sous_totaux(df_reduc, salarie, timesheet_fusionnee, salaire_brut)
+    return (lignes, salaire_brut) if avec_brut else lignes
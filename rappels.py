@@ -0,0 +1,327 @@
+"""
+Rappels de paie sur périodes closes.
+
+À la clôture d'un mois, les entrées de chaque bulletin (salarié, avantages, primes, timesheets,
+motifs d'absence) et les lignes versées sont conservées (StockagePaie.enregistrer_clotures).
+Quand une correction arrive après la clôture (timesheet corrigée, taux modifié dans les
+paramètres réglementaires), seuls les mois-salariés concernés sont recalculés à partir des
+entrées conservées, corrigées ; leurs lignes sont comparées ligne à ligne aux lignes versées
+et les écarts donnent les lignes de régularisation du mois courant.
+"""
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from bulletin_rapide import CANAUX_UTILES, bulletin_depuis_tableaux, bulletin_rapide
+from cache_paie import bulletin_en_cache
+from parametres import FICHIER_PARAMETRES
+from payroll import Entreprise, MOTEURS, Salarie, calculer_bulletin, recharger_parametres
+
+# Lignes calculées à partir des autres : leurs écarts sont rapportés mais ne donnent pas de régularisation
+SOUS_TOTAUX = (
+    "Salaire Brut", "Salaire Net Avant Impôts", "Montant net social", "Net imposable", "Net à payer",
+    "Sous-total Cotisations Patronales",
+)
+
+COLONNES_ECARTS = [
+    "salarie", "periode_rappel", "Catégorie", "rang",
+    "ancien_total", "nouveau_total", "ecart_total",
+    "ancienne_part_employeur", "nouvelle_part_employeur", "ecart_part_employeur",
+]
+COLONNES_REGULARISATION = ["salarie", "periode", "Catégorie", "Base", "Taux (%)", "Total (€)", "Part_Employeur"]
+
+
+@dataclasses.dataclass
+class EntreesBulletin:
+    """Tout ce qui détermine le bulletin d'un mois, tel que passé à calculer_bulletin."""
+    salarie: Salarie
+    avantages: dict
+    primes: dict
+    timesheet: pd.DataFrame
+    timesheet_prec: pd.DataFrame
+    absence_motifs: dict = dataclasses.field(default_factory=dict)
+    periode_primes: Optional[str] = None
+
+
+def _timesheet_vers_json(timesheet):
+    # Les types des canaux (entiers ou réels) et la nature de l'index changent le bulletin : on les garde
+    return {
+        "dates": [str(jour)[:10] for jour in timesheet.index],
+        "index_dates": isinstance(timesheet.index, pd.DatetimeIndex),
+        "nom_index": timesheet.index.name,
+        "canaux": {canal: timesheet[canal].tolist() for canal in timesheet.columns},
+    }
+
+
+def _timesheet_depuis_json(donnees):
+    index = pd.DatetimeIndex(pd.to_datetime(donnees["dates"])) if donnees["index_dates"] else pd.Index(donnees["dates"])
+    df = pd.DataFrame(donnees["canaux"], index=index, columns=list(donnees["canaux"]))
+    df.index.name = donnees["nom_index"]
+    return df
+
+
+def entrees_vers_json(entrees):
+    """Entrées d'un bulletin sous forme de dictionnaire sérialisable en JSON."""
+    salarie = dataclasses.asdict(entrees.salarie)
+    salarie.pop("salaire_brut", None)
+    return {
+        "salarie": salarie,
+        "avantages": entrees.avantages,
+        "primes": entrees.primes,
+        "timesheet": _timesheet_vers_json(entrees.timesheet),
+        "timesheet_prec": _timesheet_vers_json(entrees.timesheet_prec),
+        "absence_motifs": entrees.absence_motifs,
+        "periode_primes": None if entrees.periode_primes is None else str(entrees.periode_primes)[:10],
+    }
+
+
+def _salarie_depuis_json(donnees):
+    champs = dict(donnees)
+    entreprise = Entreprise(**champs.pop("entreprise"))
+    return Salarie(**champs, entreprise=entreprise)
+
+
+def entrees_depuis_json(donnees):
+    return EntreesBulletin(
+        salarie=_salarie_depuis_json(donnees["salarie"]),
+        avantages=donnees["avantages"],
+        primes=donnees["primes"],
+        timesheet=_timesheet_depuis_json(donnees["timesheet"]),
+        timesheet_prec=_timesheet_depuis_json(donnees["timesheet_prec"]),
+        absence_motifs=donnees["absence_motifs"],
+        periode_primes=donnees["periode_primes"],
+    )
+
+
+def calculer_lignes(entrees, moteur="numpy"):
+    """Lignes du bulletin (liste de dictionnaires, montants formatés) ; les entrées ne sont pas modifiées."""
+    if moteur == "numpy":
+        return bulletin_rapide(entrees.salarie, entrees.avantages, entrees.primes, entrees.timesheet, entrees.timesheet_prec,
+                               entrees.absence_motifs, entrees.periode_primes, en_dataframe=False)
+    df = calculer_bulletin(entrees.salarie, entrees.avantages, entrees.primes, entrees.timesheet, entrees.timesheet_prec,
+                           entrees.absence_motifs, periode_primes=entrees.periode_primes, moteur=moteur)
+    return df.to_dict(orient="records")
+
+
+def _lignes_depuis_json(donnees, moteur, cache=None):
+    """
+    Lignes du bulletin d'entrées conservées ; le moteur numpy part directement des tableaux, sans DataFrame.
+    Avec un cache (CacheBulletins), le bulletin est relu s'il a déjà été calculé pour les mêmes entrées.
+    """
+    if cache is not None:
+        entrees = entrees_depuis_json(donnees)
+        return bulletin_en_cache(cache, entrees.salarie, entrees.avantages, entrees.primes, entrees.timesheet,
+                                 entrees.timesheet_prec, entrees.absence_motifs, entrees.periode_primes,
+                                 moteur=moteur, en_dataframe=False)
+    if moteur != "numpy":
+        return calculer_lignes(entrees_depuis_json(donnees), moteur)
+
+    def tableaux(timesheet):
+        # Même dtype par canal que la colonne du DataFrame reconstruit
+        return (np.array(timesheet["dates"], dtype="datetime64[D]"),
+                {canal: np.array(timesheet["canaux"][canal]) for canal in CANAUX_UTILES})
+
+    jours, canaux = tableaux(donnees["timesheet"])
+    jours_prec, canaux_prec = tableaux(donnees["timesheet_prec"])
+    return bulletin_depuis_tableaux(_salarie_depuis_json(donnees["salarie"]), donnees["avantages"], donnees["primes"],
+                                    jours, canaux, jours_prec, canaux_prec, donnees["absence_motifs"],
+                                    donnees["periode_primes"], en_dataframe=False)
+
+
+def cloturer(stockage, periode, entrees_par_salarie, moteur="numpy"):
+    """
+    Calcule et clôt les bulletins d'un mois : entrées et lignes versées sont conservées pour les rappels.
+    :param entrees_par_salarie: {identifiant salarié (stockage): EntreesBulletin}
+    :return: {identifiant salarié: lignes du bulletin}
+    """
+    lignes = {salarie_id: calculer_lignes(entrees, moteur) for salarie_id, entrees in entrees_par_salarie.items()}
+    stockage.enregistrer_clotures(
+        (salarie_id, periode, entrees_vers_json(entrees), lignes[salarie_id])
+        for salarie_id, entrees in entrees_par_salarie.items()
+    )
+    return lignes
+
+
+@dataclasses.dataclass
+class CorrectionTimesheet:
+    """
+    Correction remplaçant des heures de la timesheet du mois, à passer à calculer_rappels.
+    :param saisies: {"AAAA-MM-JJ": {canal: heures}}
+    """
+    saisies: dict
+
+    def __call__(self, entrees):
+        timesheet = entrees.timesheet.copy()
+        jours = [str(d)[:10] for d in timesheet.index]
+        for jour, canaux in self.saisies.items():
+            if jour not in jours:
+                raise ValueError(f"Date hors de la timesheet : {jour}")
+            for canal, heures in canaux.items():
+                timesheet.iloc[jours.index(jour), timesheet.columns.get_loc(canal)] = heures
+        return dataclasses.replace(entrees, timesheet=timesheet)
+
+
+def _montant(valeur):
+    return float(valeur) if valeur not in ("", None) else 0.0
+
+
+def _brut(lignes):
+    return next((_montant(ligne["Total (€)"]) for ligne in lignes if ligne["Catégorie"] == "Salaire Brut"), 0.0)
+
+
+def _ecart_en_mois(periode, anterieure):
+    return (int(periode[:4]) - int(anterieure[:4])) * 12 + int(periode[5:7]) - int(anterieure[5:7])
+
+
+def _recalculer_salarie(salarie_id, mois, moteur, cache=None):
+    """
+    Recalcule les mois d'un salarié, du plus ancien au plus récent. Le brut recalculé d'un mois
+    remplace le sien dans l'historique des douze derniers salaires des mois suivants recalculés.
+    :param mois: Liste triée de (période, entrées conservées (JSON), correction ou None)
+    """
+    bruts_recalcules = {}
+    resultats = []
+    for periode, donnees, correction in mois:
+        if correction is not None:
+            donnees = entrees_vers_json(correction(entrees_depuis_json(donnees)))
+        historique = list(donnees["salarie"]["douze_derniers_salaires"])
+        for anterieure, brut in bruts_recalcules.items():
+            decalage = _ecart_en_mois(periode, anterieure)
+            if 1 <= decalage <= len(historique):
+                historique[-decalage] = brut
+        donnees = {**donnees, "salarie": {**donnees["salarie"], "douze_derniers_salaires": historique}}
+        lignes = _lignes_depuis_json(donnees, moteur, cache)
+        bruts_recalcules[periode] = _brut(lignes)
+        resultats.append((periode, donnees, lignes))
+    return salarie_id, resultats
+
+
+def _recalculer_salarie_args(args):
+    return _recalculer_salarie(*args)
+
+
+def _table_lignes(lignes_par_mois, prefixe):
+    """Lignes de plusieurs bulletins à plat, avec le rang de chaque catégorie dans son bulletin (doublons)."""
+    enregistrements = [
+        (salarie_id, periode, ligne["Catégorie"], _montant(ligne["Total (€)"]), _montant(ligne["Part_Employeur"]))
+        for (salarie_id, periode), lignes in lignes_par_mois.items()
+        for ligne in lignes
+    ]
+    df = pd.DataFrame(enregistrements, columns=["salarie", "periode_rappel", "Catégorie", f"{prefixe}_total", f"{prefixe}_pe"])
+    df["rang"] = df.groupby(["salarie", "periode_rappel", "Catégorie"], sort=False).cumcount()
+    return df
+
+
+def ecarts_de_lignes(anciennes, nouvelles):
+    """
+    Compare ligne à ligne des bulletins versés et recalculés, appariés par (salarié, période, catégorie, rang).
+    Une ligne apparue ou disparue est comparée à 0.
+
+    :param anciennes: {(salarié, période): lignes versées}
+    :param nouvelles: {(salarié, période): lignes recalculées}
+    :return: DataFrame des lignes dont le montant salarial ou patronal change, colonnes COLONNES_ECARTS
+    """
+    cles = ["salarie", "periode_rappel", "Catégorie", "rang"]
+    df = _table_lignes(anciennes, "ancien").merge(_table_lignes(nouvelles, "nouveau"), on=cles, how="outer", sort=False)
+    df = df.fillna({"ancien_total": 0.0, "ancien_pe": 0.0, "nouveau_total": 0.0, "nouveau_pe": 0.0})
+    df = df.rename(columns={"ancien_pe": "ancienne_part_employeur", "nouveau_pe": "nouvelle_part_employeur"})
+    df["ecart_total"] = (df["nouveau_total"] - df["ancien_total"]).round(2)
+    df["ecart_part_employeur"] = (df["nouvelle_part_employeur"] - df["ancienne_part_employeur"]).round(2)
+    df = df[(df["ecart_total"] != 0) | (df["ecart_part_employeur"] != 0)]
+    return df[COLONNES_ECARTS].reset_index(drop=True)
+
+
+def lignes_regularisation(ecarts, periode_courante):
+    """
+    Lignes de régularisation du mois courant : une ligne "Rappel AAAA-MM <catégorie>" par rubrique
+    modifiée (hors sous-totaux), portant l'écart salarial et patronal.
+    """
+    rubriques = ecarts[~ecarts["Catégorie"].isin(SOUS_TOTAUX)]
+    return pd.DataFrame({
+        "salarie": rubriques["salarie"],
+        "periode": periode_courante,
+        "Catégorie": "Rappel " + rubriques["periode_rappel"] + " " + rubriques["Catégorie"],
+        "Base": "",
+        "Taux (%)": "",
+        "Total (€)": rubriques["ecart_total"],
+        "Part_Employeur": rubriques["ecart_part_employeur"],
+    }, columns=COLONNES_REGULARISATION).reset_index(drop=True)
+
+
+@dataclasses.dataclass
+class ResultatRappel:
+    """Écarts ligne à ligne, lignes de régularisation du mois courant et bulletins recalculés."""
+    ecarts: pd.DataFrame
+    regularisations: pd.DataFrame
+    bulletins: dict
+
+    def totaux(self):
+        """Rappel de brut, de net à payer et de cotisations patronales par salarié."""
+        sous_totaux = self.ecarts[self.ecarts["Catégorie"].isin(["Salaire Brut", "Net à payer"])]
+        totaux = sous_totaux.pivot_table(index="salarie", columns="Catégorie", values="ecart_total", aggfunc="sum", fill_value=0.0)
+        patronal = self.ecarts[self.ecarts["Catégorie"] == "Sous-total Cotisations Patronales"]
+        totaux["Cotisations patronales"] = patronal.groupby("salarie")["ecart_part_employeur"].sum()
+        return totaux.reindex(columns=["Salaire Brut", "Net à payer", "Cotisations patronales"], fill_value=0.0).fillna(0.0).round(2)
+
+
+def calculer_rappels(stockage, corrections, periode_courante, moteur="numpy", workers=1, mettre_a_jour=False,
+                     recharger=True, chemin_parametres=FICHIER_PARAMETRES, cache=None):
+    """
+    Recalcule les mois-salariés clos concernés par une correction et en déduit les rappels.
+
+    :param stockage: StockagePaie contenant les clôtures
+    :param corrections: {(identifiant salarié, "AAAA-MM"): correction} ; une correction est une fonction
+        EntreesBulletin -> EntreesBulletin (voir CorrectionTimesheet), ou None pour recalculer le mois tel
+        quel avec les paramètres réglementaires actuels (changement de taux). Pour qu'un brut corrigé
+        se répercute sur la réduction Fillon des mois suivants, ces mois doivent aussi être listés.
+    :param periode_courante: Mois qui porte les régularisations
+    :param workers: Nombre de processus ; les corrections doivent alors être définies au niveau d'un module
+    :param mettre_a_jour: Remplace les clôtures par les entrées et lignes recalculées, pour qu'un rappel
+        ultérieur parte des montants régularisés
+    :param recharger: Relit les paramètres réglementaires (chemin_parametres) et vide la mémorisation des
+        cotisations avant de recalculer, dans ce processus et dans chaque processus de calcul : un taux
+        corrigé dans le fichier depuis le chargement du registre est bien pris en compte. Le registre
+        rechargé reste celui du processus après le rappel.
+    :param cache: CacheBulletins où relire et stocker les bulletins recalculés, ou None. Sa clé contient
+        les paramètres réglementaires : un bulletin calculé avant un changement de taux n'est pas relu.
+    :return: ResultatRappel
+    """
+    if moteur not in MOTEURS:
+        raise ValueError(f"Moteur inconnu : {moteur}")
+    if recharger:
+        recharger_parametres(chemin_parametres)
+    corrections = {(salarie_id, str(periode)[:7]): correction for (salarie_id, periode), correction in corrections.items()}
+    clotures = stockage.charger_clotures(corrections)
+    non_clos = sorted(set(corrections) - set(clotures))
+    if non_clos:
+        raise ValueError(f"Mois non clos : {', '.join(f'{s} {p}' for s, p in non_clos)}")
+
+    par_salarie = {}
+    for (salarie_id, periode), correction in sorted(corrections.items(), key=lambda c: (str(c[0][0]), c[0][1])):
+        par_salarie.setdefault(salarie_id, []).append((periode, clotures[(salarie_id, periode)][0], correction))
+    taches = [(salarie_id, mois, moteur, cache) for salarie_id, mois in par_salarie.items()]
+    if workers > 1:
+        initialisation = {"initializer": recharger_parametres, "initargs": (chemin_parametres,)} if recharger else {}
+        with ProcessPoolExecutor(max_workers=workers, **initialisation) as pool:
+            resultats = list(pool.map(_recalculer_salarie_args, taches, chunksize=max(1, len(taches) // (workers * 4))))
+    else:
+        resultats = [_recalculer_salarie(*tache) for tache in taches]
+
+    anciennes, nouvelles, nouvelles_entrees = {}, {}, {}
+    for salarie_id, mois in resultats:
+        for periode, entrees, lignes in mois:
+            anciennes[(salarie_id, periode)] = clotures[(salarie_id, periode)][1]
+            nouvelles[(salarie_id, periode)] = lignes
+            nouvelles_entrees[(salarie_id, periode)] = entrees
+
+    ecarts = ecarts_de_lignes(anciennes, nouvelles)
+    if mettre_a_jour:
+        stockage.enregistrer_clotures((s, p, nouvelles_entrees[(s, p)], lignes) for (s, p), lignes in nouvelles.items())
+    return ResultatRappel(
+        ecarts=ecarts,
+        regularisations=lignes_regularisation(ecarts, str(periode_courante)[:7]),
+        bulletins=nouvelles,
+    )
@@ -0,0 +1,178 @@
+"""
+Registre des cotisations sociales.
+
+Chaque ligne de cotisation est déclarée une fois dans COTISATIONS : rubrique (clé de
+calcul_cotisations), libellé du bulletin, assiette, taux salarial et patronal, condition. Un taux
+en majuscules est un paramètre réglementaire (parametres_reglementaires.csv, par date d'effet) ; un
+taux en minuscules est un paramètre compilé de l'entreprise (accident du travail, FNAL, formation
+professionnelle, versement mobilités, montant du forfait social). Le calcul d'un salarié
+(calcul_cotisations), les lignes du bulletin (rubriques_cotisations) et les calculs sur tableaux
+(simulateur.cotisations_par_entreprise) lisent tous ce registre, comme le mode en centimes entiers
+(paie_centimes), qui passe des plafonds en centimes, des taux entiers et un produit arrondi :
+
+    taux = taux_cotisations(pe, periode)
+    montants = evaluer_cotisations(assiettes_cotisations(brut, pe, plafonds(periode), taux),
+                                   conditions(brut, cadre, pe, plafonds(periode)), taux)
+"""
+import operator
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from parametres import parametre
+
+PARTS = ("Salarial", "Patronal")
+
+
+@dataclass(frozen=True)
+class Cotisation:
+    """Une ligne de cotisation : montant = assiette x taux de chaque part, si la condition est remplie."""
+    rubrique: str
+    libelle: str
+    assiette: str
+    taux_salarial: Optional[str] = None
+    taux_patronal: Optional[str] = None
+    condition: Optional[str] = None
+
+    def taux(self, part):
+        return self.taux_salarial if part == "Salarial" else self.taux_patronal
+
+
+# Dans l'ordre des lignes du bulletin. Une rubrique déclarée deux fois (Famille) a des conditions exclusives.
+COTISATIONS = (
+    Cotisation("Maladie-Maternité", "Maladie Maternité", "brut", taux_patronal="TAUX_MALADIE_PATRONAL"),
+    Cotisation("Maladie-Maternité Complément", "Maladie Maternité Complément", "brut",
+               taux_patronal="TAUX_MALADIE_COMPLEMENT_PATRONAL", condition="au_dela_seuil_maladie"),
+    Cotisation("Vieillesse Déplafonnée", "Vieillesse Déplafonnée", "brut",
+               "TAUX_VIEILLESSE_DEPLAFONNEE_SALARIAL", "TAUX_VIEILLESSE_DEPLAFONNEE_PATRONAL"),
+    Cotisation("Vieillesse Plafonnée", "Vieillesse Plafonée", "plafonne",
+               "TAUX_VIEILLESSE_PLAFONNEE_SALARIAL", "TAUX_VIEILLESSE_PLAFONNEE_PATRONAL"),
+    Cotisation("Accident du travail", "Accident du travail", "brut", taux_patronal="taux_AT"),
+    Cotisation("Retraite Complémentaire (Tr1)", "Retraite Complémentaire", "plafonne",
+               "TAUX_RETRAITE_T1_SALARIAL", "TAUX_RETRAITE_T1_PATRONAL"),
+    Cotisation("Retraite Complémentaire (Tr2)", "Retraite Complémentaire T2", "tranche_2",
+               "TAUX_RETRAITE_T2_SALARIAL", "TAUX_RETRAITE_T2_PATRONAL", "au_dela_pmss"),
+    Cotisation("CET", "CET", "plafonne_T2", "TAUX_CET_SALARIAL", "TAUX_CET_PATRONAL", "au_dela_pmss"),
+    Cotisation("CEG_T1", "CEG T1", "plafonne", "TAUX_CEG_T1_SALARIAL", "TAUX_CEG_T1_PATRONAL"),
+    Cotisation("CEG_T2", "CEG T2", "tranche_2", "TAUX_CEG_T2_SALARIAL", "TAUX_CEG_T2_PATRONAL", "au_dela_pmss"),
+    Cotisation("FAMILLE", "Famille", "plafonne_famille", taux_patronal="TAUX_FAMILLE_REDUIT",
+               condition="sous_seuil_famille"),
+    Cotisation("FAMILLE", "Famille", "plafonne_famille", taux_patronal="TAUX_FAMILLE",
+               condition="au_dela_seuil_famille"),
+    Cotisation("Assurance Chômage", "Chomage", "plafonne_chomage", taux_patronal="TAUX_CHOMAGE"),
+    Cotisation("AGS", "AGS", "plafonne_chomage", taux_patronal="TAUX_AGS"),
+    Cotisation("APEC", "APEC", "plafonne_apec", "TAUX_APEC_SALARIAL", "TAUX_APEC_PATRONAL", "cadre"),
+    Cotisation("Prévoyance", "Prévoyance", "plafonne", taux_patronal="TAUX_PREVOYANCE_CADRE", condition="cadre"),
+    Cotisation("FNAL", "FNAL", "plafonne", taux_patronal="taux_fnal"),
+    Cotisation("Versement Transport", "Versement transport", "brut", taux_patronal="taux_versement_mobilite",
+               condition="versement_transport"),
+    Cotisation("Solidarité autonomie", "Solidarité autonomie", "brut", taux_patronal="TAUX_SOLIDARITE_AUTONOMIE"),
+    Cotisation("Dialogue social", "Dialogue social", "brut", taux_patronal="TAUX_DIALOGUE_SOCIAL"),
+    Cotisation("Formation professionnelle", "Formation professionnelle", "brut", taux_patronal="taux_formation"),
+    Cotisation("Taxe d'Apprentissage", "Taxe d'apprentissage", "brut", taux_patronal="TAUX_TAXE_APPRENTISSAGE"),
+    Cotisation("Taxe d'Apprentissage libératoire", "Taxe d'apprentissage libératoire", "brut",
+               taux_patronal="TAUX_TAXE_APPRENTISSAGE_LIBERATOIRE"),
+    Cotisation("Effort Construction", "Effort construction", "brut", taux_patronal="TAUX_EFFORT_CONSTRUCTION",
+               condition="effort_construction"),
+    Cotisation("CSG Deductible", "CSG déductible", "csg", "TAUX_CSG_DEDUCTIBLE"),
+    Cotisation("CSG non Deductible", "CSG non déductible", "csg", "TAUX_CSG_NON_DEDUCTIBLE"),
+    Cotisation("CRDS", "CRDS", "csg", "TAUX_CRDS"),
+    # Montant forfaitaire : assiette unitaire, "taux" égal au montant compilé de l'entreprise
+    Cotisation("Forfait social 8%", "Forfait social 8%", "unite", taux_patronal="montant_forfait_social",
+               condition="forfait_social"),
+)
+
+
+def taux_cotisations(pe, periode=None, conversion=float):
+    """
+    Fonction nom -> taux d'une ligne de COTISATIONS : paramètre réglementaire en vigueur à la période,
+    converti par `conversion`, pour un nom en majuscules ; paramètre compilé de l'entreprise sinon.
+    :param pe: Paramètres compilés de l'entreprise (dictionnaire de scalaires ou de tableaux)
+    """
+    return lambda nom: conversion(parametre(nom, periode)) if nom.isupper() else pe[nom]
+
+
+def assiettes_cotisations(brut, pe, p, taux, produit=operator.mul, unite=1):
+    """
+    Assiettes dans l'unité de `brut` (euros ou centimes), scalaires ou tableaux alignés sur `brut`.
+    :param pe: Paramètres compilés de l'entreprise (dictionnaire)
+    :param p: Plafonds en vigueur (parametres.plafonds), dans l'unité de `brut`
+    :param taux: Fonction nom -> taux (taux_cotisations), pour l'abattement d'assiette de la CSG
+    :param produit: Fonction (assiette, taux) -> montant, comme pour evaluer_cotisations
+    :param unite: Assiette des montants forfaitaires, telle que produit(unite, montant) = montant
+    """
+    plafonne_T2 = np.minimum(brut, p["PLAFOND_T2"])
+    return {
+        "brut": brut,
+        "plafonne": np.minimum(brut, p["PMSS"]),
+        "plafonne_T2": plafonne_T2,
+        "tranche_2": plafonne_T2 - p["PMSS"],
+        "plafonne_famille": np.minimum(brut, p["PLAFOND_FAMILLE"]),
+        "plafonne_chomage": np.minimum(brut, p["PLAFOND_CHOMAGE"]),
+        "plafonne_apec": np.minimum(brut, p["PLAFOND_APEC"]),
+        "csg": produit(brut + pe["forfait_complementaire_sante"] + pe["forfait_mutuelle"], taux("ASSIETTE_CSG")),
+        "unite": np.full_like(brut, unite),
+    }
+
+
+def conditions(brut, cadre, pe, p):
+    """Conditions des lignes de COTISATIONS (booléens scalaires ou tableaux) ; les seuils sont dans l'unité de `brut`."""
+    return {
+        "cadre": cadre,
+        "au_dela_pmss": p["PMSS"] < brut,
+        "au_dela_seuil_maladie": brut >= p["PLAFOND_SEUIL_MALADIE"],
+        "sous_seuil_famille": brut < p["PLAFOND_FAMILLE"],
+        "au_dela_seuil_famille": brut >= p["PLAFOND_FAMILLE"],
+        "versement_transport": pe["versement_transport"],
+        "effort_construction": pe["effort_construction"],
+        "forfait_social": pe["forfait_social"],
+    }
+
+
+def evaluer_cotisations(assiettes, conditions, taux, produit=np.multiply):
+    """
+    Montants de toutes les lignes sur des tableaux : {"Salarial": {rubrique: tableau}, "Patronal": {...}},
+    0 là où la condition n'est pas remplie ; les lignes d'une même rubrique s'additionnent.
+    :param produit: Fonction (assiette, taux) -> montant, par exemple un produit arrondi en centimes
+    """
+    montants = {part: {} for part in PARTS}
+    for cotisation in COTISATIONS:
+        condition = True if cotisation.condition is None else conditions[cotisation.condition]
+        for part in PARTS:
+            nom = cotisation.taux(part)
+            if nom is None:
+                continue
+            montant = np.where(condition, produit(assiettes[cotisation.assiette], taux(nom)), 0)
+            rubriques = montants[part]
+            rubriques[cotisation.rubrique] = (rubriques[cotisation.rubrique] + montant
+                                              if cotisation.rubrique in rubriques else montant)
+    return montants
+
+
+def _scalaire(valeur):
+    """Assiette NumPy en nombre Python : float pour des euros, int pour des centimes."""
+    return valeur.item() if hasattr(valeur, "item") else valeur
+
+
+def lignes_applicables(brut, cadre, pe, p, taux, produit=operator.mul, unite=1):
+    """
+    Lignes de COTISATIONS applicables à un salarié (brut scalaire), avec leurs montants dans l'unité
+    de `brut` : liste de (Cotisation, assiette, {part: (taux, montant)}) dans l'ordre du bulletin.
+    `produit` et `unite` sont ceux d'assiettes_cotisations.
+    """
+    assiettes = assiettes_cotisations(brut, pe, p, taux, produit, unite)
+    remplies = conditions(brut, cadre, pe, p)
+    lignes = []
+    for cotisation in COTISATIONS:
+        if cotisation.condition is not None and not remplies[cotisation.condition]:
+            continue
+        assiette = _scalaire(assiettes[cotisation.assiette])
+        parts = {}
+        for part in PARTS:
+            nom = cotisation.taux(part)
+            if nom is not None:
+                valeur = taux(nom)
+                parts[part] = (valeur, produit(assiette, valeur))
+        lignes.append((cotisation, assiette, parts))
+    return lignes
@@ -0,0 +1,210 @@
+"""
+Registre des types de primes.
+
+Chaque type de prime est une fonction de calcul vectorisée calcul(colonnes, periode) : `colonnes`
+est un dictionnaire de tableaux NumPy alignés (une ligne par prime déclarée) contenant les
+colonnes du salarié (salaire_de_base, date_entree, taux_anciennete) et les paramètres déclarés
+du type ; elle renvoie le montant de chaque ligne. Un nouveau type s'ajoute avec le décorateur
+type_de_prime, sans toucher au calcul des primes du bulletin :
+
+    @type_de_prime("panier", montant_jour=0.0, jours=0)
+    def prime_panier(colonnes, periode):
+        return colonnes["montant_jour"] * colonnes["jours"]
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+# Colonnes du salarié fournies à toutes les fonctions de calcul
+COLONNES_SALARIE = ["salaire_de_base", "date_entree", "taux_anciennete"]
+
+
+@dataclass(frozen=True)
+class PeriodePrimes:
+    """Mois de paie (13ème mois) et date à laquelle l'ancienneté est comptée (None : aujourd'hui)."""
+    mois: int
+    date_reference: object = None
+
+    def jour_de_reference(self):
+        jour = date.today() if self.date_reference is None else pd.Timestamp(self.date_reference).date()
+        return np.datetime64(jour, "D")
+
+
+def periode_primes(periode):
+    """PeriodePrimes d'une période de paie (date, Timestamp ou "AAAA-MM")."""
+    periode = pd.Timestamp(periode)
+    return PeriodePrimes(periode.month, periode)
+
+
+@dataclass(frozen=True)
+class TypePrime:
+    nom: str
+    calcul: Callable
+    # Paramètres lus dans la déclaration de la prime, avec leur valeur par défaut
+    parametres: dict
+
+
+TYPES_PRIMES = {}
+
+
+def type_de_prime(nom, **parametres):
+    """Enregistre une fonction de calcul vectorisée sous le nom de type `nom`."""
+    def enregistrer(calcul):
+        TYPES_PRIMES[nom] = TypePrime(nom, calcul, parametres)
+        return calcul
+    return enregistrer
+
+
+@type_de_prime("13ème mois", mode=False)
+def prime_treizieme_mois(colonnes, periode):
+    """Un douzième du salaire de base chaque mois si mensualisé, sinon le salaire de base en décembre."""
+    base = colonnes["salaire_de_base"]
+    mensualise = colonnes["mode"] == True  # noqa: E712 (mode peut être un booléen ou un entier)
+    return np.where(mensualise, base / 12, np.where(periode.mois == 12, base, 0.0))
+
+
+@type_de_prime("ancienneté")
+def prime_anciennete_vectorisee(colonnes, periode):
+    """Taux d'ancienneté de l'entreprise par année complète (365 jours) de présence, sur le salaire de base."""
+    jours = (periode.jour_de_reference() - colonnes["date_entree"]).astype(np.int64)
+    anciennete = jours // 365
+    return (colonnes["taux_anciennete"] * anciennete) * colonnes["salaire_de_base"]
+
+
+@type_de_prime("exceptionnelle", valeur=0.0)
+def prime_exceptionnelle_vectorisee(colonnes, periode):
+    return np.asarray(colonnes["valeur"], dtype=float)
+
+
+@type_de_prime("objectifs", montant_cible=0.0, taux_atteinte=0.0, seuil=0.0, plafond=1.0)
+def prime_sur_objectifs(colonnes, periode):
+    """
+    Montant cible proportionnel au taux d'atteinte des objectifs (1 = objectifs atteints),
+    nul sous le seuil de déclenchement et plafonné au taux `plafond`.
+    """
+    atteinte = np.asarray(colonnes["taux_atteinte"], dtype=float)
+    taux = np.where(atteinte >= colonnes["seuil"], np.minimum(atteinte, colonnes["plafond"]), 0.0)
+    return np.asarray(colonnes["montant_cible"], dtype=float) * taux
+
+
+def _colonnes_du_type(type_prime, colonnes_salarie, declarations):
+    colonnes = dict(colonnes_salarie)
+    for parametre, defaut in type_prime.parametres.items():
+        colonnes[parametre] = np.array([d.get(parametre, defaut) for d in declarations])
+    return colonnes
+
+
+def montants_primes(primes, salaire_de_base, date_entree, taux_anciennete, periode):
+    """
+    Montant (non arrondi) de chaque prime déclarée d'un salarié, dans l'ordre de `primes`.
+    Les types inconnus sont ignorés.
+    """
+    par_type = {}
+    for prime, details in primes.items():
+        if details["type"] in TYPES_PRIMES:
+            par_type.setdefault(details["type"], []).append((prime, details))
+
+    montants = {}
+    for nom, declarees in par_type.items():
+        n = len(declarees)
+        colonnes_salarie = {
+            "salaire_de_base": np.full(n, float(salaire_de_base)),
+            "date_entree": np.full(n, np.datetime64(date_entree, "D")),
+            "taux_anciennete": np.full(n, float(taux_anciennete)),
+        }
+        type_prime = TYPES_PRIMES[nom]
+        valeurs = type_prime.calcul(_colonnes_du_type(type_prime, colonnes_salarie, [d for _, d in declarees]), periode)
+        for (prime, _), valeur in zip(declarees, np.broadcast_to(valeurs, n).tolist()):
+            montants[prime] = valeur
+    return {prime: montants[prime] for prime in primes if prime in montants}
+
+
+def montants_primes_par_salaire(primes, salaires_de_base, date_entree, taux_anciennete, periode):
+    """
+    Montant (non arrondi) de chaque prime déclarée d'un même salarié pour un tableau de salaires de base.
+    :return: {prime: tableau aligné sur salaires_de_base} dans l'ordre de `primes`
+    """
+    salaires_de_base = np.asarray(salaires_de_base, dtype=float)
+    n = len(salaires_de_base)
+    colonnes_salarie = {
+        "salaire_de_base": salaires_de_base,
+        "date_entree": np.full(n, np.datetime64(date_entree, "D")),
+        "taux_anciennete": np.full(n, float(taux_anciennete)),
+    }
+    montants = {}
+    for prime, details in primes.items():
+        type_prime = TYPES_PRIMES.get(details["type"])
+        if type_prime is None:
+            continue
+        colonnes = dict(colonnes_salarie)
+        for parametre, defaut in type_prime.parametres.items():
+            colonnes[parametre] = np.full(n, details.get(parametre, defaut))
+        montants[prime] = np.broadcast_to(type_prime.calcul(colonnes, periode), n)
+    return montants
+
+
+def declarations_primes(primes_par_salarie, salaries):
+    """
+    Table des primes déclarées de tout un effectif, une ligne par prime : salarie, prime, type,
+    colonnes du salarié et paramètres de tous les types présents.
+
+    :param primes_par_salarie: {identifiant: primes au format de calcul_primes}
+    :param salaries: {identifiant: Salarie}
+    """
+    lignes = []
+    for identifiant, primes in primes_par_salarie.items():
+        salarie = salaries[identifiant]
+        for prime, details in primes.items():
+            ligne = {k: v for k, v in details.items() if k != "type"}
+            ligne.update({
+                "salarie": identifiant,
+                "prime": prime,
+                "type": details["type"],
+                "salaire_de_base": salarie.salaire_de_base,
+                "date_entree": salarie.date_entree,
+                "taux_anciennete": salarie.entreprise.taux_anciennete,
+            })
+            lignes.append(ligne)
+    declarations = pd.DataFrame(lignes)
+    if len(declarations):
+        # Dates d'entrée converties une fois pour tout l'effectif
+        declarations["date_entree"] = pd.to_datetime(declarations["date_entree"]).values.astype("datetime64[D]")
+    return declarations
+
+
+def calculer_primes(declarations, periode):
+    """
+    Montant de chaque prime d'une table de déclarations, calculé type par type sur des colonnes entières.
+
+    :param declarations: Table au format de declarations_primes
+    :param periode: PeriodePrimes, ou période de paie
+    :return: Copie des déclarations avec une colonne "montant" (0 pour les types inconnus)
+    """
+    if not isinstance(periode, PeriodePrimes):
+        periode = periode_primes(periode)
+    montants = np.zeros(len(declarations))
+    types = declarations["type"].to_numpy() if len(declarations) else np.array([])
+    for nom, type_prime in TYPES_PRIMES.items():
+        masque = types == nom
+        if not masque.any():
+            continue
+        lignes = declarations[masque]
+        colonnes = {c: lignes[c].to_numpy() for c in COLONNES_SALARIE}
+        colonnes["salaire_de_base"] = colonnes["salaire_de_base"].astype(float)
+        colonnes["date_entree"] = colonnes["date_entree"].astype("datetime64[D]")
+        colonnes["taux_anciennete"] = colonnes["taux_anciennete"].astype(float)
+        for parametre, defaut in type_prime.parametres.items():
+            valeurs = lignes[parametre] if parametre in lignes else pd.Series(defaut, index=lignes.index)
+            colonnes[parametre] = valeurs.where(valeurs.notna(), defaut).to_numpy()
+        montants[masque] = type_prime.calcul(colonnes, periode)
+    resultat = declarations.copy()
+    resultat["montant"] = montants
+    return resultat
+
+
+def totaux_primes(calculees):
+    """Total des primes par salarié, arrondi comme calcul_primes."""
+    return calculees.groupby("salarie", sort=False)["montant"].sum().round(2)
@@ -0,0 +1,214 @@
+"""
+Service HTTP local de calcul de bulletins.
+
+    python service_paie.py --port 8080 --workers 4 --moteur numpy [--cache .cache_bulletins]
+
+POST /payslip         : un bulletin (objet JSON décrit dans bulletin_depuis_json)
+POST /payslips:batch  : {"bulletins": [...]} -> {"bulletins": [...]} dans le même ordre
+
+Avec --cache, les workers partagent un cache disque des bulletins (cache_paie) : une demande déjà
+calculée avec les mêmes entrées et les mêmes paramètres réglementaires n'est pas recalculée.
+"""
+import argparse
+import json
+import os
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from cache_paie import CacheBulletins, bulletin_en_cache
+from import_pointage import ALIAS_CANAUX, dates_du_mois
+from parametres import registre
+from bulletin_rapide import bulletin_rapide
+from payroll import CANAUX_TIMESHEET, MOTEURS, Entreprise, Salarie, calculer_bulletin
+
+
+class RequeteInvalide(ValueError):
+    pass
+
+
+# Nature des erreurs renvoyées par _calculer, et statut HTTP de /payslip pour chacune
+REQUETE_INVALIDE = "requete_invalide"
+CALCUL_IMPOSSIBLE = "calcul_impossible"
+STATUTS_ERREUR = {REQUETE_INVALIDE: 400, CALCUL_IMPOSSIBLE: 500}
+
+
+def timesheet_depuis_canaux(annee, mois, canaux=None):
+    """
+    Construit une timesheet au format combine_timesheets à partir de saisies par canal.
+    :param canaux: {canal: {"AAAA-MM-JJ": heures}} ; le canal est un nom de colonne ou un alias d'import
+    """
+    dates = dates_du_mois(annee, mois).strftime("%Y-%m-%d")
+    df = pd.DataFrame(0.0, index=dates, columns=CANAUX_TIMESHEET)
+    for nom, saisies in (canaux or {}).items():
+        if nom not in ALIAS_CANAUX:
+            raise RequeteInvalide(f"Canal inconnu : {nom}")
+        colonne = CANAUX_TIMESHEET[ALIAS_CANAUX[nom]]
+        for jour, heures in saisies.items():
+            try:
+                date_jour = date.fromisoformat(jour).isoformat()
+            except (TypeError, ValueError) as e:
+                raise RequeteInvalide(f"Date invalide : {jour}") from e
+            if date_jour not in df.index:
+                raise RequeteInvalide(f"Date hors de la timesheet de {annee}-{mois:02d} : {jour}")
+            df.loc[date_jour, colonne] = heures
+    df.index.name = "date"
+    return df
+
+
+def bulletin_depuis_json(demande, moteur="numpy", cache=None):
+    """
+    Calcule un bulletin à partir d'une demande JSON :
+        {"salarie": {...champs de Salarie...}, "entreprise": {...champs d'Entreprise...},
+         "periode": "AAAA-MM", "timesheet": {canal: {date: heures}},
+         "timesheet_prec": {canal: {date: heures}}, "avantages": {...}, "primes": {...},
+         "absences": {date: motif}}
+    Renvoie les lignes d'ajouter_sous_totaux sous forme de liste d'objets.
+    Avec le moteur "numpy", les lignes sont produites directement, sans DataFrame.
+    :param cache: CacheBulletins où relire et stocker le bulletin, ou None
+    """
+    try:
+        annee, mois = (int(x) for x in demande["periode"].split("-"))
+        entreprise = Entreprise(**demande["entreprise"])
+        salarie = Salarie(**demande["salarie"], entreprise=entreprise)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise RequeteInvalide(f"Salarié, entreprise ou période invalide : {e}") from e
+
+    annee_prec, mois_prec = (annee, mois - 1) if mois > 1 else (annee - 1, 12)
+    timesheet = timesheet_depuis_canaux(annee, mois, demande.get("timesheet"))
+    timesheet_prec = timesheet_depuis_canaux(annee_prec, mois_prec, demande.get("timesheet_prec"))
+    # Ancienneté et mois des primes sont ceux de la période demandée, pas ceux du jour du calcul
+    periode_primes = pd.Timestamp(annee, mois, 1)
+
+    if cache is not None:
+        return bulletin_en_cache(cache, salarie, demande.get("avantages", {}), demande.get("primes", {}),
+                                 timesheet, timesheet_prec, demande.get("absences", {}), periode_primes,
+                                 moteur=moteur, en_dataframe=False)
+    if moteur == "numpy":
+        return bulletin_rapide(salarie, demande.get("avantages", {}), demande.get("primes", {}),
+                               timesheet, timesheet_prec, demande.get("absences", {}), periode_primes,
+                               en_dataframe=False)
+    df = calculer_bulletin(
+        salarie,
+        demande.get("avantages", {}),
+        demande.get("primes", {}),
+        timesheet,
+        timesheet_prec,
+        demande.get("absences", {}),
+        periode_primes,
+        moteur=moteur,
+    )
+    return df.to_dict(orient="records")
+
+
+# Moteur de calcul et cache du processus worker, fixés par _initialiser_worker
+_moteur = "numpy"
+_cache = None
+
+
+def _calculer(demande):
+    """
+    Exécuté dans un worker : les erreurs sont renvoyées, pas levées, pour traverser le pool sans
+    interrompre le lot ni le thread de la requête HTTP.
+    """
+    try:
+        return {"lignes": bulletin_depuis_json(demande, _moteur, _cache)}
+    except RequeteInvalide as e:
+        return {"erreur": str(e), "code": REQUETE_INVALIDE}
+    except Exception as e:
+        return {"erreur": f"Calcul impossible : {type(e).__name__}: {e}", "code": CALCUL_IMPOSSIBLE}
+
+
+def _initialiser_worker(moteur="numpy", repertoire_cache=None):
+    # Charge les paramètres réglementaires et chauffe le pipeline une fois par processus
+    global _moteur, _cache
+    _moteur = moteur
+    _cache = CacheBulletins(repertoire_cache) if repertoire_cache else None
+    registre()
+    _calculer({
+        "periode": "2025-01",
+        "entreprise": {"nom": "", "adresse": "", "siret": "", "effectif": 1, "taux_AT": 0.0},
+        "salarie": {"nom": "", "prenom": "", "numero_ss": "", "date_naissance": "2000-01-01",
+                    "date_entree": "2020-01-01", "contrat": "CDI", "statut": "salarié",
+                    "horaires_par_defaut": {}, "salaire_de_base": 1801.80,
+                    "douze_derniers_salaires": [1801.80] * 12},
+    })
+
+
+class ServicePaie(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, adresse, workers=None, moteur="numpy", repertoire_cache=None):
+        if moteur not in MOTEURS:
+            raise ValueError(f"Moteur inconnu : {moteur}")
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_initialiser_worker,
+                                        initargs=(moteur, repertoire_cache))
+        # Démarre les workers immédiatement plutôt qu'à la première requête
+        list(self.pool.map(len, [""] * self.workers))
+        super().__init__(adresse, GestionnaireRequetes)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+
+class GestionnaireRequetes(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _repondre(self, statut, contenu):
+        corps = json.dumps(contenu, ensure_ascii=False).encode()
+        self.send_response(statut)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def do_POST(self):
+        try:
+            longueur = int(self.headers.get("Content-Length", 0))
+            demande = json.loads(self.rfile.read(longueur) or b"{}")
+        except ValueError:
+            return self._repondre(400, {"erreur": "Corps JSON invalide"})
+
+        pool = self.server.pool
+        if self.path == "/payslip":
+            resultat = pool.submit(_calculer, demande).result()
+            return self._repondre(STATUTS_ERREUR.get(resultat.get("code"), 200), resultat)
+
+        if self.path == "/payslips:batch":
+            demandes = demande.get("bulletins") if isinstance(demande, dict) else None
+            if not isinstance(demandes, list):
+                return self._repondre(400, {"erreur": "Champ 'bulletins' attendu (liste)"})
+            taille_lot = max(1, len(demandes) // (self.server.workers * 4))
+            return self._repondre(200, {"bulletins": list(pool.map(_calculer, demandes, chunksize=taille_lot))})
+
+        self._repondre(404, {"erreur": f"Route inconnue : {self.path}"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP local de calcul de bulletins de paie")
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--moteur", choices=MOTEURS, default="numpy")
+    parser.add_argument("--cache", default=None, help="Répertoire du cache disque des bulletins")
+    args = parser.parse_args()
+
+    serveur = ServicePaie((args.hote, args.port), args.workers, args.moteur, args.cache)
+    print(f"Service de paie sur http://{args.hote}:{serveur.server_address[1]}")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        serveur.server_close()
+
+
+if __name__ == "__main__":
+    main()
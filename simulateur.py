@@ -0,0 +1,302 @@
+import dataclasses
+
+import numpy as np
+import pandas as pd
+
+from avantages_nature import valeurs_avantages
+from parametres import normaliser_periode, plafonds, registre
+from parametres_entreprise import CHAMPS_ENTREPRISE, TableEntreprises, compiler_parametres
+from payroll import BAREME_PAS, Entreprise, Salarie, navigo
+from registre_cotisations import assiettes_cotisations, conditions, evaluer_cotisations, taux_cotisations
+from registre_primes import PeriodePrimes, montants_primes_par_salaire
+
+SEUILS_PAS = np.array([seuil for seuil, _ in BAREME_PAS])
+TAUX_PAS = np.array([taux for _, taux in BAREME_PAS]) / 100
+
+COLONNES_COTISATIONS_EFFECTIF = [
+    "salaire_brut", "cotisations_salariales", "cotisations_patronales",
+    "reduction_fillon_urssaf", "reduction_fillon_retraite",
+]
+
+COLONNES_SIMULATION = [
+    "salaire_de_base", "statut", "effectif", "taux_AT",
+    "primes", "avantages", "salaire_brut",
+    "cotisations_salariales", "cotisations_patronales",
+    "reduction_fillon_urssaf", "reduction_fillon_retraite",
+    "net_imposable", "prelevement_a_la_source", "net_a_payer", "cout_entreprise",
+]
+
+
+def _periode_simulee(periode):
+    if periode is None:
+        return pd.Timestamp.today().normalize().replace(day=1)
+    return pd.Timestamp(normaliser_periode(periode)).replace(day=1)
+
+
+def cotisations_vectorisees(brut, cadre, effectif, taux_AT, entreprise, periode=None):
+    """
+    Équivalent de calcul_cotisations sur des tableaux : mêmes lignes, mêmes taux, mêmes seuils.
+    Une ligne absente pour un point de la grille (par exemple APEC pour un non-cadre) y vaut 0.
+
+    :param brut: Salaires bruts
+    :param cadre: Booléens, True pour un statut cadre
+    :param effectif: Effectifs de l'entreprise
+    :param taux_AT: Taux accident du travail
+    :param entreprise: Entreprise fournissant les autres paramètres (mobilité, forfaits santé)
+    :return: {"Salarial": {ligne: tableau}, "Patronal": {ligne: tableau}}
+    """
+    champs = {champ: getattr(entreprise, champ) for champ in CHAMPS_ENTREPRISE}
+    champs.update(effectif=effectif, taux_AT=taux_AT)
+    return cotisations_par_entreprise(brut, cadre, compiler_parametres(**champs), periode)
+
+
+def cotisations_par_entreprise(brut, cadre, pe, periode=None):
+    """
+    Cotisations sur des tableaux à partir des paramètres compilés de l'entreprise de chaque point
+    (voir parametres_entreprise.compiler_parametres et TableEntreprises.par_salarie) : les lignes
+    du registre des cotisations, comme calcul_cotisations.
+    """
+    p = plafonds(periode)
+    brut = np.asarray(brut, dtype=float)
+    taux = taux_cotisations(pe, periode)
+    return evaluer_cotisations(assiettes_cotisations(brut, pe, p, taux), conditions(brut, cadre, pe, p), taux)
+
+
+def reduction_fillon_vectorisee(brut, douze_derniers_salaires, effectif, taux_AT, periode=None):
+    """Équivalent de calculer_reduction_fillon sur des tableaux : (part URSSAF, part retraite)."""
+    T = np.where(np.asarray(effectif) < 50, 0.3194 - 0.0046, 0.3234 - 0.0046) + np.minimum(taux_AT, 0.0046)
+    return reduction_fillon_par_entreprise(brut, douze_derniers_salaires, T, periode)
+
+
+def reduction_fillon_par_entreprise(brut, douze_derniers_salaires, T, periode=None):
+    """Réduction Fillon sur des tableaux, coefficient T compilé par entreprise : (part URSSAF, part retraite)."""
+    brut = np.asarray(brut, dtype=float)
+    smics = sum(registre().douze_derniers("SMIC", periode))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        C = (1.6 * smics / np.asarray(douze_derniers_salaires, dtype=float) - 1) * (T / 0.6)
+        reduction = np.where(brut > plafonds(periode)["SEUIL_FILLON"], 0.0, C * brut)
+    taux_retraite = 0.0601
+    return reduction * ((T - taux_retraite) / T), reduction * (taux_retraite / T)
+
+
+def cotisations_effectif(salaries, periode=None, table=None):
+    """
+    Cotisations et réduction Fillon de tout un effectif, éventuellement réparti entre plusieurs
+    entreprises, à partir du salaire brut renseigné de chaque salarié. Les paramètres de chaque
+    entreprise sont compilés une seule fois (TableEntreprises) puis distribués à ses salariés.
+
+    :param salaries: Dictionnaire {identifiant: Salarie}
+    :param table: TableEntreprises déjà compilée, réutilisable d'un lot à l'autre
+    :return: DataFrame indexé par identifiant, colonnes COLONNES_COTISATIONS_EFFECTIF
+    """
+    liste = list(salaries.values())
+    table = table or TableEntreprises(s.entreprise for s in liste)
+    pe = table.par_salarie(liste)
+    brut = np.array([s.salaire_brut for s in liste], dtype=float)
+    cadre = np.array([s.statut.lower() == "cadre" for s in liste], dtype=bool)
+    cotisations = cotisations_par_entreprise(brut, cadre, pe, periode)
+    douze_derniers = np.array([sum(s.douze_derniers_salaires) for s in liste], dtype=float)
+    fillon_urssaf, fillon_retraite = reduction_fillon_par_entreprise(brut, douze_derniers, pe["T_fillon"], periode)
+    return pd.DataFrame({
+        "salaire_brut": brut,
+        "cotisations_salariales": sum(cotisations["Salarial"].values()),
+        "cotisations_patronales": sum(cotisations["Patronal"].values()),
+        "reduction_fillon_urssaf": fillon_urssaf,
+        "reduction_fillon_retraite": fillon_retraite,
+    }, index=pd.Index(list(salaries), name="salarie"), columns=COLONNES_COTISATIONS_EFFECTIF)
+
+
+def taxe_progressive_vectorisee(revenu):
+    """Équivalent de calcul_taxe_progressive : taux de la première tranche dont le plafond couvre le revenu."""
+    revenu = np.asarray(revenu, dtype=float)
+    taux = TAUX_PAS[np.searchsorted(SEUILS_PAS, revenu, side="left")]
+    return np.round(revenu * taux, 2)
+
+
+def _modeles(salarie, entreprise, periode):
+    entreprise = entreprise or (salarie.entreprise if salarie is not None and salarie.entreprise is not None
+                                else Entreprise(nom="", adresse="", siret="", effectif=0, taux_AT=0.0))
+    salarie = salarie or Salarie(nom="", prenom="", numero_ss="", date_naissance="", date_entree=periode.strftime("%Y-%m-%d"),
+                                 contrat="CDI", statut="salarié", horaires_par_defaut={}, salaire_de_base=0.0)
+    return dataclasses.replace(salarie, entreprise=entreprise)
+
+
+def evaluer(base, cadre, effectif, taux_AT, salarie, primes=None, avantages=None, periode=None):
+    """
+    Évaluation allégée du bulletin d'un mois complet travaillé, point par point.
+
+    :param base: Salaires de base (tableau) ; cadre, effectif et taux_AT sont des tableaux ou des scalaires
+    :param salarie: Salarié modèle, rattaché à son entreprise
+    :param periode: Premier jour du mois de paie (Timestamp)
+    :return: Dictionnaire {grandeur: tableau} des colonnes calculées de COLONNES_SIMULATION
+    """
+    base = np.asarray(base, dtype=float)
+    entreprise = salarie.entreprise
+
+    montant_primes = np.zeros_like(base)
+    if primes:
+        # Comme calcul_primes sur une timesheet du mois : ancienneté comptée à la date du jour
+        uniques, inverse = np.unique(base, return_inverse=True)
+        total = np.zeros_like(uniques)
+        for valeur in montants_primes_par_salaire(primes, uniques, salarie.date_entree, entreprise.taux_anciennete,
+                                                  PeriodePrimes(periode.month)).values():
+            total = total + valeur
+        montant_primes = np.array([round(v, 2) for v in total.tolist()])[inverse]
+    montant_avantages = np.zeros_like(base)
+    if avantages:
+        # Avantages évalués en tableaux sur les salaires distincts, arrondis comme calcul_avantages_en_nature
+        uniques, inverse = np.unique(base, return_inverse=True)
+        total = np.zeros_like(uniques)
+        for type_avantage, valeur in valeurs_avantages(avantages, uniques, 0, entreprise.titre_restaurant,
+                                                        entreprise.participation_titre_restaurant, periode).values():
+            if type_avantage != "nourriture":
+                total = total + valeur
+        montant_avantages = np.array([round(v, 2) for v in total.tolist()])[inverse]
+
+    brut = base + montant_primes + montant_avantages
+    cotisations = cotisations_vectorisees(brut, cadre, effectif, taux_AT, entreprise, periode)
+    salarial = sum(cotisations["Salarial"].values())
+    patronal = sum(cotisations["Patronal"].values())
+    fillon_urssaf, fillon_retraite = reduction_fillon_vectorisee(brut, 12 * brut, effectif, taux_AT, periode)
+
+    imposable = (brut - salarial + cotisations["Salarial"]["CSG non Deductible"]
+                 + cotisations["Patronal"]["Prévoyance"] + cotisations["Salarial"]["CRDS"])
+    pas = taxe_progressive_vectorisee(imposable)
+
+    return {
+        "primes": montant_primes,
+        "avantages": montant_avantages,
+        "salaire_brut": brut,
+        "cotisations_salariales": salarial,
+        "cotisations_patronales": patronal,
+        "reduction_fillon_urssaf": fillon_urssaf,
+        "reduction_fillon_retraite": fillon_retraite,
+        "net_imposable": imposable,
+        "prelevement_a_la_source": pas,
+        "net_a_payer": imposable - pas,
+        "cout_entreprise": brut + salarial + navigo(salarie) + entreprise.titre_restaurant,
+    }
+
+
+def simuler(salaires_de_base, statuts=("salarié",), effectifs=(10,), taux_AT=(0.0,),
+            primes=None, avantages=None, periode=None, salarie=None, entreprise=None):
+    """
+    Simule le bulletin d'un mois complet travaillé sur la grille de tous les croisements
+    salaire de base x statut x effectif x taux AT, sans construire de bulletin.
+
+    Chaque grandeur (brut, cotisations, réduction Fillon, net imposable, prélèvement à la source,
+    net à payer, coût entreprise) est calculée par les mêmes formules que payroll, appliquées
+    en une fois à des tableaux NumPy. Primes et avantages suivent les formats de calcul_primes
+    et calcul_avantages_en_nature ; ils ne dépendent que du salaire de base et sont évalués une
+    fois par salaire distinct. L'historique des douze derniers salaires est supposé égal à douze
+    fois le salaire brut simulé.
+
+    :param salarie: Salarié modèle (date d'entrée, temps de travail) ; le salaire de base est remplacé
+    :param entreprise: Entreprise modèle (forfaits, mobilité, transport) ; effectif et taux AT sont remplacés
+    :return: DataFrame d'une ligne par point de la grille, colonnes COLONNES_SIMULATION
+    """
+    periode = _periode_simulee(periode)
+    salarie = _modeles(salarie, entreprise, periode)
+
+    statuts = np.asarray(statuts, dtype=object)
+    grille = np.meshgrid(
+        np.asarray(salaires_de_base, dtype=float),
+        np.arange(len(statuts)),
+        np.asarray(effectifs, dtype=float),
+        np.asarray(taux_AT, dtype=float),
+        indexing="ij",
+    )
+    base, code_statut, effectif, taux = (axe.ravel() for axe in grille)
+    cadre = np.array([str(s).lower() == "cadre" for s in statuts])[code_statut]
+
+    return pd.DataFrame({
+        "salaire_de_base": base,
+        "statut": pd.Categorical.from_codes(code_statut, categories=statuts),
+        "effectif": effectif,
+        "taux_AT": taux,
+        **evaluer(base, cadre, effectif, taux, salarie, primes, avantages, periode),
+    }, columns=COLONNES_SIMULATION)
+
+
+# =============================================================================
+# Du net au brut
+# =============================================================================
+CIBLES = ("net_a_payer", "net_imposable", "cout_entreprise")
+
+
+def bruts_pour_nets(nets_cibles, salarie_template, cible="net_a_payer", primes=None, avantages=None,
+                    periode=None, pas_grille=1.0, precision=0.01):
+    """
+    Mode lot de brut_pour_net : un salaire de base par montant cible, pour un même salarié modèle.
+
+    Le résultat n'est ni continu ni monotone en fonction du salaire de base (entrée de la tranche 2
+    au PMSS, complément maladie à 2,5 SMIC, sortie de la réduction Fillon à 1,6 SMIC, taux par
+    tranche du prélèvement à la source). On cherche donc le plus petit salaire de base dont le
+    résultat atteint la cible : une grille régulière évaluée une seule fois, dont le maximum
+    cumulé est trié, donne pour chaque cible l'intervalle où le seuil est franchi pour la première
+    fois ; une dichotomie vectorisée sur tous les intervalles à la fois le resserre ensuite
+    jusqu'à `precision`. Quand la cible tombe dans un saut (aucun salaire ne la donne exactement),
+    le salaire renvoyé est celui juste après le saut et `ecart` est positif.
+
+    :param nets_cibles: Montants visés
+    :param salarie_template: Salarié modèle (statut, entreprise, date d'entrée) ; son salaire de base est ignoré
+    :param cible: "net_a_payer", "net_imposable" (net avant impôt) ou "cout_entreprise"
+    :param pas_grille: Pas en euros de la grille d'encadrement
+    :return: DataFrame net_cible, salaire_de_base, salaire_brut, resultat, ecart
+    """
+    if cible not in CIBLES:
+        raise ValueError(f"Cible inconnue : {cible} (attendu : {', '.join(CIBLES)})")
+    periode = _periode_simulee(periode)
+    salarie = _modeles(salarie_template, None, periode)
+    cadre = salarie.statut.lower() == "cadre"
+    effectif = salarie.entreprise.effectif
+    taux_AT = salarie.entreprise.taux_AT
+    nets_cibles = np.atleast_1d(np.asarray(nets_cibles, dtype=float))
+
+    def resultat(base):
+        return evaluer(base, cadre, effectif, taux_AT, salarie, primes, avantages, periode)[cible]
+
+    # Grille d'encadrement, étendue jusqu'à dépasser la plus haute cible
+    haut = max(4 * plafonds(periode)["PMSS"], 2 * float(nets_cibles.max(initial=0.0)))
+    while True:
+        grille = np.arange(0.0, haut + pas_grille, pas_grille)
+        maximum_cumule = np.maximum.accumulate(resultat(grille))
+        if maximum_cumule[-1] >= nets_cibles.max(initial=0.0):
+            break
+        haut *= 2
+
+    i = np.searchsorted(maximum_cumule, nets_cibles, side="left")
+    bas = grille[np.maximum(i - 1, 0)]
+    haut = grille[i]
+    # Dichotomie : resultat(haut) atteint toujours la cible, resultat(bas) non (sauf cible <= resultat(0))
+    while (haut - bas).max(initial=0.0) > precision:
+        milieu = (bas + haut) / 2
+        atteint = resultat(milieu) >= nets_cibles
+        haut = np.where(atteint, milieu, haut)
+        bas = np.where(atteint, bas, milieu)
+
+    # Arrondi au centime supérieur ; l'arrondi du prélèvement à la source peut encore coûter
+    # un centime au net, d'où quelques pas d'un centime au plus
+    base = np.ceil(np.round(haut * 100, 6)) / 100
+    valeurs = evaluer(base, cadre, effectif, taux_AT, salarie, primes, avantages, periode)
+    for _ in range(5):
+        manque = np.round(valeurs[cible], 2) < np.round(nets_cibles, 2)
+        if not manque.any():
+            break
+        base = np.round(base + 0.01 * manque, 2)
+        valeurs = evaluer(base, cadre, effectif, taux_AT, salarie, primes, avantages, periode)
+    return pd.DataFrame({
+        "net_cible": nets_cibles,
+        "salaire_de_base": base,
+        "salaire_brut": valeurs["salaire_brut"],
+        "resultat": valeurs[cible],
+        "ecart": valeurs[cible] - nets_cibles,
+    })
+
+
+def brut_pour_net(net_cible, salarie_template, cible="net_a_payer", primes=None, avantages=None, periode=None):
+    """
+    Salaire de base à proposer pour que le salarié modèle perçoive `net_cible`
+    (ou, selon `cible`, un net imposable ou un coût entreprise donné). Voir bruts_pour_nets.
+    """
+    return float(bruts_pour_nets([net_cible], salarie_template, cible, primes, avantages, periode)["salaire_de_base"].iloc[0])
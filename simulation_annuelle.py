@@ -0,0 +1,176 @@
+"""
+Projection de la paie sur plusieurs mois consécutifs.
+
+Chaque salarié est simulé mois après mois à partir de son état courant : le solde de congés payés
+évolue selon evolution_cp, l'historique des douze derniers salaires glisse d'un mois, l'ancienneté
+et le 13ème mois suivent la période simulée et la timesheet du mois précédent, gardée en mémoire,
+complète la semaine à cheval sur deux mois pour le calcul des heures supplémentaires.
+"""
+import dataclasses
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from cache_paie import bulletin_en_cache
+from import_pointage import dates_du_mois
+from payroll import CANAUX_TIMESHEET, calculer_bulletin, evolution_cp
+
+JOURS_SEMAINE = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+
+COLONNES_RECAPITULATIF = [
+    "salarie", "periode", "salaire_brut", "net_imposable", "prelevement_a_la_source",
+    "net_a_payer", "cotisations_patronales", "solde_cp",
+]
+
+
+def timesheet_contractuelle(salarie, annee, mois):
+    """
+    Timesheet d'un mois travaillé selon les horaires par défaut du salarié ({"lundi": 7, ...}) :
+    heures contractuelles et réelles identiques, aucune absence.
+    """
+    dates = dates_du_mois(annee, mois)
+    heures = [
+        float(salarie.horaires_par_defaut.get(JOURS_SEMAINE[jour.weekday()], 0)) if jour.month == mois else 0.0
+        for jour in dates
+    ]
+    df = pd.DataFrame(0.0, index=dates.strftime("%Y-%m-%d"), columns=CANAUX_TIMESHEET)
+    df["heures contractuelles"] = heures
+    df["heures réelles normales"] = heures
+    df.index.name = "date"
+    return df
+
+
+def _mois_suivants(annee, mois, nb_mois):
+    for _ in range(nb_mois):
+        yield annee, mois
+        annee, mois = (annee, mois + 1) if mois < 12 else (annee + 1, 1)
+
+
+def _montant(bulletin, categorie, colonne="Total (€)"):
+    valeur = bulletin.loc[bulletin["Catégorie"] == categorie, colonne]
+    return float(valeur.iloc[0]) if len(valeur) and valeur.iloc[0] != "" else 0.0
+
+
+def simuler_mois(salarie, avantages, primes, timesheet, timesheet_prec, absence_motifs=None, moteur="pandas",
+                 cache=None):
+    """
+    Calcule le bulletin d'un mois et l'état du salarié au début du mois suivant.
+
+    Les timesheets ne sont pas modifiées. La période de paie est celle de la timesheet.
+    :param cache: CacheBulletins où relire et stocker le bulletin, ou None
+    :return: (bulletin, salarié mis à jour)
+    """
+    periode = pd.Timestamp(max(pd.to_datetime(timesheet.index))).replace(day=1)
+    courant = dataclasses.replace(salarie, douze_derniers_salaires=list(salarie.douze_derniers_salaires))
+    precedent = timesheet_prec
+    if pd.Timestamp(max(precedent.index)).weekday() in [4, 5, 6]:
+        # Comme dans calcul_hs : la dernière semaine du mois précédent y a déjà été payée
+        precedent = precedent.iloc[0:0]
+
+    if cache is not None:
+        bulletin, salaire_brut = bulletin_en_cache(cache, courant, avantages, primes, timesheet, precedent,
+                                                   absence_motifs or {}, periode, moteur=moteur, avec_brut=True)
+    else:
+        bulletin, salaire_brut = calculer_bulletin(courant, avantages, primes, timesheet, precedent, absence_motifs or {},
+                                                   periode_primes=periode, moteur=moteur, avec_brut=True)
+
+    solde_cp = evolution_cp(courant, timesheet)[3]
+    suivant = dataclasses.replace(
+        courant,
+        solde_cp=solde_cp,
+        douze_derniers_salaires=courant.douze_derniers_salaires[1:] + [float(salaire_brut)],
+    )
+    return bulletin, suivant
+
+
+def _simuler_salarie(identifiant, salarie, annee, mois, nb_mois, avantages, primes,
+                     timesheets, absences, timesheet_initiale, conserver_bulletins, moteur, cache):
+    annee_prec, mois_prec = (annee, mois - 1) if mois > 1 else (annee - 1, 12)
+    timesheet_prec = timesheet_initiale if timesheet_initiale is not None else timesheets(salarie, annee_prec, mois_prec)
+
+    lignes, bulletins = [], {}
+    for a, m in _mois_suivants(annee, mois, nb_mois):
+        timesheet = timesheets(salarie, a, m)
+        motifs = absences(identifiant, a, m) if absences else {}
+        bulletin, suivant = simuler_mois(salarie, avantages, primes, timesheet, timesheet_prec, motifs, moteur, cache)
+
+        periode = f"{a}-{m:02d}"
+        lignes.append({
+            "salarie": identifiant,
+            "periode": periode,
+            "salaire_brut": suivant.douze_derniers_salaires[-1],
+            "net_imposable": _montant(bulletin, "Net imposable"),
+            "prelevement_a_la_source": -_montant(bulletin, "Prelevement à la source"),
+            "net_a_payer": _montant(bulletin, "Net à payer"),
+            "cotisations_patronales": _montant(bulletin, "Sous-total Cotisations Patronales", "Part_Employeur"),
+            "solde_cp": suivant.solde_cp,
+        })
+        if conserver_bulletins:
+            bulletins[periode] = bulletin
+        salarie, timesheet_prec = suivant, timesheet
+    return identifiant, lignes, bulletins, salarie
+
+
+def _simuler_salarie_args(args):
+    return _simuler_salarie(*args)
+
+
+@dataclasses.dataclass
+class ProjectionPaie:
+    """Résultat d'une projection : récapitulatif mensuel, bulletins éventuels et état final des salariés."""
+    recapitulatif: pd.DataFrame
+    bulletins: dict
+    salaries: dict
+
+
+def simuler_annee(salaries, annee, mois=1, nb_mois=12, avantages=None, primes=None,
+                  timesheets=timesheet_contractuelle, absences=None, timesheets_initiales=None,
+                  conserver_bulletins=False, workers=None, moteur="numpy", cache=None):
+    """
+    Projette la paie de plusieurs salariés sur `nb_mois` mois consécutifs à partir de `annee`-`mois`.
+
+    Chaque salarié est simulé indépendamment, mois après mois, sans jamais recalculer les mois
+    déjà passés. Les salariés sont répartis entre `workers` processus, par défaut un par processeur
+    (os.cpu_count()) et jamais plus que de salariés : les fonctions `timesheets` et `absences` doivent
+    alors être définies au niveau d'un module ; workers=1 calcule tout dans le processus appelant.
+
+    :param salaries: Dictionnaire {identifiant: Salarie} ; les objets fournis ne sont pas modifiés
+    :param avantages: Dictionnaire {identifiant: avantages} au format de calcul_avantages_en_nature
+    :param primes: Dictionnaire {identifiant: primes} au format de calcul_primes
+    :param timesheets: Fonction (salarie, annee, mois) -> timesheet combinée du mois
+    :param absences: Fonction (identifiant, annee, mois) -> motifs d'absence {date: motif}
+    :param timesheets_initiales: Dictionnaire {identifiant: timesheet du mois précédant la projection}
+    :param conserver_bulletins: Garde chaque bulletin dans le résultat (mémoire proportionnelle au volume)
+    :param moteur: Moteur de calcul des bulletins, voir calculer_bulletin (numpy par défaut, mêmes lignes que pandas)
+    :param cache: CacheBulletins où relire et stocker les bulletins, ou None ; chaque processus en reçoit
+        une copie, et tous partagent son répertoire
+    :return: ProjectionPaie ; recapitulatif a une ligne par salarié et par mois, colonnes COLONNES_RECAPITULATIF
+    """
+    avantages = avantages or {}
+    primes = primes or {}
+    timesheets_initiales = timesheets_initiales or {}
+    taches = [
+        (identifiant, salarie, annee, mois, nb_mois, avantages.get(identifiant, {}), primes.get(identifiant, {}),
+         timesheets, absences, timesheets_initiales.get(identifiant), conserver_bulletins, moteur, cache)
+        for identifiant, salarie in salaries.items()
+    ]
+
+    workers = min(workers or os.cpu_count() or 1, len(taches))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            resultats = list(pool.map(_simuler_salarie_args, taches, chunksize=max(1, len(taches) // (workers * 4))))
+    else:
+        resultats = [_simuler_salarie(*tache) for tache in taches]
+
+    lignes, bulletins, etats = [], {}, {}
+    for identifiant, lignes_salarie, bulletins_salarie, salarie in resultats:
+        lignes.extend(lignes_salarie)
+        for periode, bulletin in bulletins_salarie.items():
+            bulletins[(identifiant, periode)] = bulletin
+        etats[identifiant] = salarie
+    return ProjectionPaie(
+        recapitulatif=pd.DataFrame(lignes, columns=COLONNES_RECAPITULATIF),
+        bulletins=bulletins,
+        salaries=etats,
+    )
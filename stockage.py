@@ -0,0 +1,373 @@
+import dataclasses
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from payroll import CANAUX_TIMESHEET, Entreprise, Salarie
+
+# Base à côté du module, quel que soit le répertoire courant ; la variable d'environnement PEPPERS_DB la remplace
+FICHIER_BASE = os.environ.get("PEPPERS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "peppers.db"))
+
+# Colonne SQL de chaque canal de la timesheet combinée
+COLONNES_CANAUX = {
+    "heures contractuelles": "contractuelles",
+    "heures réelles normales": "reelles",
+    "heures de nuit": "nuit",
+    "heures de dimanche": "dimanche",
+    "absence rémunérée RTT": "rtt",
+    "absence rémunérée congé payé": "cp",
+    "absence rémunérée jour férié": "jf_r",
+    "absence non rémunérée jour férié": "jf_nr",
+    "absence non rémunérée absence injustifiée": "injustifiee",
+    "absence maladie": "maladie",
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS entreprises (
+    id INTEGER PRIMARY KEY,
+    siret TEXT NOT NULL UNIQUE,
+    nom TEXT NOT NULL,
+    donnees TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS salaries (
+    id INTEGER PRIMARY KEY,
+    numero_ss TEXT NOT NULL UNIQUE,
+    entreprise_id INTEGER NOT NULL REFERENCES entreprises(id),
+    nom TEXT NOT NULL,
+    prenom TEXT NOT NULL,
+    donnees TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_salaries_entreprise ON salaries(entreprise_id);
+CREATE TABLE IF NOT EXISTS timesheets (
+    salarie_id INTEGER NOT NULL REFERENCES salaries(id),
+    date TEXT NOT NULL,
+    {", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in COLONNES_CANAUX.values())},
+    PRIMARY KEY (salarie_id, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS absences (
+    salarie_id INTEGER NOT NULL REFERENCES salaries(id),
+    date TEXT NOT NULL,
+    motif TEXT NOT NULL,
+    PRIMARY KEY (salarie_id, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lignes_bulletin (
+    salarie_id INTEGER NOT NULL REFERENCES salaries(id),
+    periode TEXT NOT NULL,
+    ordre INTEGER NOT NULL,
+    categorie TEXT NOT NULL,
+    base REAL,
+    taux REAL,
+    total REAL,
+    part_employeur REAL,
+    PRIMARY KEY (salarie_id, periode, ordre)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_lignes_categorie ON lignes_bulletin(salarie_id, categorie, periode);
+CREATE TABLE IF NOT EXISTS periodes_closes (
+    salarie_id INTEGER NOT NULL REFERENCES salaries(id),
+    periode TEXT NOT NULL,
+    entrees TEXT NOT NULL,
+    lignes TEXT NOT NULL,
+    PRIMARY KEY (salarie_id, periode)
+) WITHOUT ROWID;
+"""
+
+
+def _periode(periode):
+    """Ramène une période (date, Timestamp ou chaîne) au format "AAAA-MM"."""
+    if isinstance(periode, str):
+        return periode[:7]
+    return f"{periode.year:04d}-{periode.month:02d}"
+
+
+def _decaler(periode, mois):
+    annee, m = divmod(int(periode[:4]) * 12 + int(periode[5:7]) - 1 + mois, 12)
+    return f"{annee:04d}-{m + 1:02d}"
+
+
+def _nombre(valeur):
+    if valeur is None or valeur == "":
+        return None
+    return float(valeur)
+
+
+class PoolConnexions:
+    """Pool de connexions SQLite partagé entre les threads de l'application ou du traitement par lot."""
+
+    def __init__(self, chemin=FICHIER_BASE, taille=4):
+        self.chemin = chemin
+        self._libres = queue.Queue()
+        self._verrou = threading.Lock()
+        self._creees = 0
+        self.taille = taille
+
+    def _ouvrir(self):
+        connexion = sqlite3.connect(self.chemin, check_same_thread=False, timeout=30)
+        connexion.execute("PRAGMA journal_mode=WAL")
+        connexion.execute("PRAGMA synchronous=NORMAL")
+        connexion.execute("PRAGMA foreign_keys=ON")
+        return connexion
+
+    @contextmanager
+    def connexion(self):
+        """Emprunte une connexion ; la transaction est validée à la sortie, annulée en cas d'erreur."""
+        try:
+            connexion = self._libres.get_nowait()
+        except queue.Empty:
+            with self._verrou:
+                creer = self._creees < self.taille
+                if creer:
+                    self._creees += 1
+            connexion = self._ouvrir() if creer else self._libres.get()
+        try:
+            with connexion:
+                yield connexion
+        finally:
+            self._libres.put(connexion)
+
+    def fermer(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class StockagePaie:
+    """
+    Stockage SQLite des entreprises, salariés, timesheets journalières, absences, lignes de bulletin
+    et clôtures (entrées et lignes versées de chaque mois clos, pour les rappels).
+    Les écritures en masse passent par executemany dans une transaction.
+    """
+
+    def __init__(self, chemin=FICHIER_BASE, taille_pool=4):
+        self.pool = PoolConnexions(chemin, taille_pool)
+        with self.pool.connexion() as cx:
+            cx.executescript(SCHEMA)
+
+    # --- Entreprises et salariés -------------------------------------------
+    def enregistrer_entreprise(self, entreprise):
+        donnees = json.dumps(dataclasses.asdict(entreprise), ensure_ascii=False)
+        with self.pool.connexion() as cx:
+            cx.execute(
+                "INSERT INTO entreprises (siret, nom, donnees) VALUES (?, ?, ?) "
+                "ON CONFLICT(siret) DO UPDATE SET nom = excluded.nom, donnees = excluded.donnees",
+                (entreprise.siret, entreprise.nom, donnees),
+            )
+            return cx.execute("SELECT id FROM entreprises WHERE siret = ?", (entreprise.siret,)).fetchone()[0]
+
+    def enregistrer_salarie(self, salarie):
+        entreprise_id = self.enregistrer_entreprise(salarie.entreprise)
+        champs = {f.name: getattr(salarie, f.name) for f in dataclasses.fields(salarie)
+                  if f.name not in ("entreprise", "salaire_brut")}
+        with self.pool.connexion() as cx:
+            cx.execute(
+                "INSERT INTO salaries (numero_ss, entreprise_id, nom, prenom, donnees) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(numero_ss) DO UPDATE SET entreprise_id = excluded.entreprise_id, "
+                "nom = excluded.nom, prenom = excluded.prenom, donnees = excluded.donnees",
+                (salarie.numero_ss, entreprise_id, salarie.nom, salarie.prenom, json.dumps(champs, ensure_ascii=False)),
+            )
+            return cx.execute("SELECT id FROM salaries WHERE numero_ss = ?", (salarie.numero_ss,)).fetchone()[0]
+
+    def identifiant_salarie(self, numero_ss):
+        with self.pool.connexion() as cx:
+            ligne = cx.execute("SELECT id FROM salaries WHERE numero_ss = ?", (numero_ss,)).fetchone()
+        return ligne[0] if ligne else None
+
+    def charger_salarie(self, salarie_id):
+        with self.pool.connexion() as cx:
+            ligne = cx.execute(
+                "SELECT s.donnees, e.donnees FROM salaries s JOIN entreprises e ON e.id = s.entreprise_id WHERE s.id = ?",
+                (salarie_id,),
+            ).fetchone()
+        if ligne is None:
+            return None
+        return Salarie(**json.loads(ligne[0]), entreprise=Entreprise(**json.loads(ligne[1])))
+
+    def salaries_entreprise(self, siret):
+        with self.pool.connexion() as cx:
+            return [r[0] for r in cx.execute(
+                "SELECT s.id FROM salaries s JOIN entreprises e ON e.id = s.entreprise_id WHERE e.siret = ? ORDER BY s.id",
+                (siret,),
+            )]
+
+    # --- Timesheets et absences --------------------------------------------
+    def enregistrer_timesheets(self, timesheets):
+        """
+        Enregistre en une transaction les timesheets combinées de plusieurs salariés.
+        Seuls les jours du mois de paie sont stockés : les jours de complément de la première
+        semaine appartiennent au mois précédent.
+        :param timesheets: Itérable de (identifiant salarié, DataFrame au format combine_timesheets)
+        """
+        colonnes = list(COLONNES_CANAUX.values())
+        requete = (f"INSERT OR REPLACE INTO timesheets (salarie_id, date, {', '.join(colonnes)}) "
+                   f"VALUES (?, ?, {', '.join('?' * len(colonnes))})")
+
+        def lignes():
+            for salarie_id, timesheet in timesheets:
+                dates = pd.to_datetime(timesheet.index)
+                du_mois = dates >= dates.max().replace(day=1)
+                valeurs = timesheet[CANAUX_TIMESHEET].to_numpy(dtype=float)[du_mois].tolist()
+                dates = dates[du_mois].strftime("%Y-%m-%d")
+                for jour, heures in zip(dates, valeurs):
+                    yield (salarie_id, jour, *heures)
+
+        with self.pool.connexion() as cx:
+            cx.executemany(requete, lignes())
+
+    def charger_timesheet(self, salarie_id, debut, fin):
+        """
+        Timesheet combinée du salarié entre deux dates incluses ("AAAA-MM-JJ"), un jour par ligne.
+        Les jours sans saisie valent 0 ; le DataFrame est vide si rien n'est stocké sur la plage.
+        """
+        debut = pd.Timestamp(debut).strftime("%Y-%m-%d")
+        fin = pd.Timestamp(fin).strftime("%Y-%m-%d")
+        with self.pool.connexion() as cx:
+            lignes = cx.execute(
+                f"SELECT date, {', '.join(COLONNES_CANAUX.values())} FROM timesheets "
+                "WHERE salarie_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (salarie_id, debut, fin),
+            ).fetchall()
+        df = pd.DataFrame([l[1:] for l in lignes], columns=CANAUX_TIMESHEET, index=[l[0] for l in lignes])
+        if not df.empty:
+            jours = pd.date_range(debut, fin).strftime("%Y-%m-%d")
+            df = df.reindex(jours, fill_value=0.0)
+        df.index.name = "date"
+        return df
+
+    def enregistrer_absences(self, absences):
+        """
+        Remplace en une transaction les absences de plusieurs salariés sur un mois : celles retirées
+        de la saisie sont supprimées.
+        :param absences: Itérable de (identifiant salarié, période, {date: motif})
+        """
+        absences = [(salarie_id, _periode(periode), motifs) for salarie_id, periode, motifs in absences]
+        with self.pool.connexion() as cx:
+            cx.executemany("DELETE FROM absences WHERE salarie_id = ? AND date BETWEEN ? AND ?",
+                           ((salarie_id, f"{periode}-01", f"{periode}-31") for salarie_id, periode, _ in absences))
+            cx.executemany(
+                "INSERT OR REPLACE INTO absences (salarie_id, date, motif) VALUES (?, ?, ?)",
+                ((salarie_id, jour, motif) for salarie_id, _, motifs in absences for jour, motif in motifs.items()),
+            )
+
+    def charger_absences(self, salarie_id, periode):
+        periode = _periode(periode)
+        with self.pool.connexion() as cx:
+            return dict(cx.execute(
+                "SELECT date, motif FROM absences WHERE salarie_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (salarie_id, f"{periode}-01", f"{periode}-31"),
+            ))
+
+    # --- Bulletins -----------------------------------------------------------
+    def enregistrer_bulletins(self, bulletins):
+        """
+        Enregistre en une transaction les lignes de plusieurs bulletins (format ajouter_sous_totaux).
+        :param bulletins: Itérable de (identifiant salarié, période, DataFrame des lignes)
+        """
+        bulletins = [(salarie_id, _periode(periode), df) for salarie_id, periode, df in bulletins]
+
+        def lignes():
+            for salarie_id, periode, df in bulletins:
+                for ordre, ligne in enumerate(df.itertuples(index=False)):
+                    yield (salarie_id, periode, ordre, ligne[0],
+                           _nombre(ligne[1]), _nombre(ligne[2]), _nombre(ligne[3]), _nombre(ligne[4]))
+
+        with self.pool.connexion() as cx:
+            cx.executemany("DELETE FROM lignes_bulletin WHERE salarie_id = ? AND periode = ?",
+                           ((salarie_id, periode) for salarie_id, periode, _ in bulletins))
+            cx.executemany(
+                "INSERT INTO lignes_bulletin (salarie_id, periode, ordre, categorie, base, taux, total, part_employeur) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                lignes(),
+            )
+
+    def charger_bulletin(self, salarie_id, periode):
+        with self.pool.connexion() as cx:
+            lignes = cx.execute(
+                "SELECT categorie, base, taux, total, part_employeur FROM lignes_bulletin "
+                "WHERE salarie_id = ? AND periode = ? ORDER BY ordre",
+                (salarie_id, _periode(periode)),
+            ).fetchall()
+        return pd.DataFrame(lignes, columns=["Catégorie", "Base", "Taux (%)", "Total (€)", "Part_Employeur"])
+
+    def charger_lignes_periode(self, periode):
+        """Lignes de tous les bulletins d'une période, à plat : salarie, Catégorie, Total (€), Part_Employeur."""
+        with self.pool.connexion() as cx:
+            lignes = cx.execute(
+                "SELECT salarie_id, categorie, total, part_employeur FROM lignes_bulletin "
+                "WHERE periode = ? ORDER BY salarie_id, ordre",
+                (_periode(periode),),
+            ).fetchall()
+        return pd.DataFrame(lignes, columns=["salarie", "Catégorie", "Total (€)", "Part_Employeur"])
+
+    def bulletin_mois_precedent(self, salarie_id, periode):
+        return self.charger_bulletin(salarie_id, _decaler(_periode(periode), -1))
+
+    def historique_salaires(self, salarie_id, periode, nb_mois=12):
+        """
+        Salaires bruts des nb_mois précédant la période, du plus ancien au plus récent,
+        au format de Salarie.douze_derniers_salaires (0.0 pour un mois sans bulletin).
+        """
+        fin = _decaler(_periode(periode), -1)
+        debut = _decaler(fin, -(nb_mois - 1))
+        with self.pool.connexion() as cx:
+            bruts = dict(cx.execute(
+                "SELECT periode, total FROM lignes_bulletin "
+                "WHERE salarie_id = ? AND categorie = 'Salaire Brut' AND periode BETWEEN ? AND ?",
+                (salarie_id, debut, fin),
+            ))
+        return [bruts.get(_decaler(debut, i)) or 0.0 for i in range(nb_mois)]
+
+    # --- Périodes closes -----------------------------------------------------
+    def enregistrer_clotures(self, clotures):
+        """
+        Enregistre en une transaction les entrées et les lignes versées de bulletins clos,
+        en remplaçant une clôture existante de la même période.
+        :param clotures: Itérable de (identifiant salarié, période, entrées (dictionnaire JSON), lignes (liste de dictionnaires))
+        """
+        with self.pool.connexion() as cx:
+            cx.executemany(
+                "INSERT OR REPLACE INTO periodes_closes (salarie_id, periode, entrees, lignes) VALUES (?, ?, ?, ?)",
+                ((salarie_id, _periode(periode), json.dumps(entrees, ensure_ascii=False), json.dumps(lignes, ensure_ascii=False))
+                 for salarie_id, periode, entrees, lignes in clotures),
+            )
+
+    def charger_clotures(self, cles):
+        """
+        Clôtures de plusieurs mois-salariés.
+        :param cles: Itérable de (identifiant salarié, période)
+        :return: {(identifiant salarié, "AAAA-MM"): (entrées, lignes)} pour les mois effectivement clos
+        """
+        cles = [(salarie_id, _periode(periode)) for salarie_id, periode in cles]
+        clotures = {}
+        with self.pool.connexion() as cx:
+            for salarie_id, periode in cles:
+                ligne = cx.execute(
+                    "SELECT entrees, lignes FROM periodes_closes WHERE salarie_id = ? AND periode = ?",
+                    (salarie_id, periode),
+                ).fetchone()
+                if ligne is not None:
+                    clotures[(salarie_id, periode)] = (json.loads(ligne[0]), json.loads(ligne[1]))
+        return clotures
+
+    def periodes_closes(self, salarie_id):
+        with self.pool.connexion() as cx:
+            return [r[0] for r in cx.execute(
+                "SELECT periode FROM periodes_closes WHERE salarie_id = ? ORDER BY periode", (salarie_id,))]
+
+
+_stockage = None
+_verrou_stockage = threading.Lock()
+
+
+def stockage_par_defaut():
+    """Stockage partagé par le processus (application Streamlit ou traitement par lot)."""
+    global _stockage
+    with _verrou_stockage:
+        if _stockage is None:
+            _stockage = StockagePaie()
+    return _stockage
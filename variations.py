@@ -0,0 +1,175 @@
+"""
+Contrôle des variations d'un mois de paie sur le précédent.
+
+Les lignes des bulletins du mois et du mois précédent sont mises à plat en une table par mois
+(une ligne par salarié et rubrique) puis appariées par (salarié, catégorie, rang) en une seule
+jointure : les clés sont ramenées à un entier commun aux deux tables, de sorte que la jointure par
+hachage porte sur une colonne d'entiers quel que soit l'effectif. Les écarts absolus et relatifs du
+montant salarial et de la part employeur de chaque ligne (brut, cotisations, net à payer,
+sous-total patronal...) sont calculés sur les colonnes entières, puis comparés aux seuils.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Table à plat des lignes d'un mois (format de StockagePaie.charger_lignes_periode)
+COLONNES_LIGNES = ["salarie", "Catégorie", "Total (€)", "Part_Employeur"]
+
+COLONNES_VARIATIONS = [
+    "salarie", "Catégorie", "rang", "statut",
+    "ancien_total", "nouveau_total", "ecart_total", "ecart_relatif_total",
+    "ancienne_part_employeur", "nouvelle_part_employeur", "ecart_part_employeur", "ecart_relatif_part_employeur",
+]
+
+# Statut d'une ligne appariée
+NOUVELLE, DISPARUE, MODIFIEE = "nouvelle", "disparue", "modifiée"
+
+
+@dataclass(frozen=True)
+class SeuilsVariation:
+    """
+    Une ligne est signalée quand, pour son montant salarial ou sa part employeur, l'écart dépasse à
+    la fois le seuil absolu (en euros) et le seuil relatif (0.10 = 10 % du montant du mois précédent).
+    Un montant qui apparaît (nul le mois précédent) a un écart relatif infini.
+
+    :param par_categorie: {catégorie: (seuil absolu, seuil relatif)} remplaçant les seuils par défaut
+    """
+    absolu: float = 50.0
+    relatif: float = 0.10
+    par_categorie: dict = field(default_factory=dict)
+
+
+def table_lignes(bulletins):
+    """
+    Lignes de bulletins à plat, au format COLONNES_LIGNES.
+    :param bulletins: {salarié: lignes d'ajouter_sous_totaux (DataFrame ou liste de dictionnaires)},
+        ou table déjà à plat ; les montants vides valent 0. Les DataFrames sont mis à plat en une
+        seule concaténation, les listes lues telles quelles.
+    """
+    if isinstance(bulletins, pd.DataFrame):
+        table = bulletins[COLONNES_LIGNES].copy()
+        for colonne in ("Total (€)", "Part_Employeur"):
+            table[colonne] = pd.to_numeric(table[colonne].replace("", np.nan), errors="coerce").fillna(0.0)
+        return table
+    trames = {salarie: lignes for salarie, lignes in bulletins.items() if isinstance(lignes, pd.DataFrame)}
+    listes = {salarie: lignes for salarie, lignes in bulletins.items() if not isinstance(lignes, pd.DataFrame)}
+    parties = []
+    if trames:
+        # Une seule concaténation : le salarié devient le premier niveau de l'index
+        lignes = pd.concat(trames, names=["salarie"]).reindex(columns=COLONNES_LIGNES[1:])
+        parties.append(pd.DataFrame({"salarie": lignes.index.get_level_values("salarie").to_numpy(),
+                                     "Catégorie": lignes["Catégorie"].to_numpy(),
+                                     "Total (€)": _montants(lignes["Total (€)"].to_numpy()),
+                                     "Part_Employeur": _montants(lignes["Part_Employeur"].to_numpy())}))
+    if listes or not trames:
+        salaries, categories, totaux, parts = [], [], [], []
+        for salarie, lignes in listes.items():
+            salaries += [salarie] * len(lignes)
+            categories += [ligne["Catégorie"] for ligne in lignes]
+            totaux += [ligne.get("Total (€)") for ligne in lignes]
+            parts += [ligne.get("Part_Employeur") for ligne in lignes]
+        parties.append(pd.DataFrame({"salarie": salaries, "Catégorie": categories,
+                                     "Total (€)": _montants(totaux), "Part_Employeur": _montants(parts)}))
+    if len(parties) == 1:
+        return parties[0]
+    # Bulletins des deux formes : les lignes reprennent l'ordre des salariés
+    table = pd.concat(parties, ignore_index=True)
+    rangs = {salarie: rang for rang, salarie in enumerate(bulletins)}
+    ordre = np.argsort(table["salarie"].map(rangs).to_numpy(), kind="stable")
+    return table.iloc[ordre].reset_index(drop=True)
+
+
+def _montants(valeurs):
+    """Cellules du bulletin (chaînes formatées, nombres ou vides) en flottants, 0 pour les vides."""
+    valeurs = np.array(valeurs, dtype=object)
+    valeurs[(valeurs == "") | (valeurs == None)] = 0.0  # noqa: E711 (comparaison élément par élément)
+    montants = valeurs.astype(float)
+    montants[np.isnan(montants)] = 0.0
+    return montants
+
+
+def _relatif(ecart, ancien):
+    """Écart rapporté à la valeur absolue du mois précédent ; infini si elle est nulle et l'écart non nul."""
+    relatif = np.full(len(ecart), np.inf)
+    np.divide(ecart, np.abs(ancien), out=relatif, where=ancien != 0)
+    relatif[(ancien == 0) & (ecart == 0)] = 0.0
+    return relatif
+
+
+def variations(courants, precedents):
+    """
+    Apparie les lignes du mois et du mois précédent et calcule leurs écarts. Les catégories
+    présentes plusieurs fois dans un bulletin sont appariées dans leur ordre d'apparition.
+
+    :param courants: Bulletins du mois (voir table_lignes)
+    :param precedents: Bulletins du mois précédent
+    :return: DataFrame de toutes les lignes appariées, colonnes COLONNES_VARIATIONS
+    """
+    courants, precedents = table_lignes(courants), table_lignes(precedents)
+    n = len(precedents)
+    lignes = pd.concat([precedents, courants], ignore_index=True)
+
+    # Clé entière commune aux deux mois : (salarié, catégorie, rang de la catégorie dans le bulletin)
+    codes_salaries, salaries = pd.factorize(lignes["salarie"])
+    codes_categories, categories = pd.factorize(lignes["Catégorie"])
+    paires = codes_salaries.astype(np.int64) * len(categories) + codes_categories
+    rangs = np.empty(len(lignes), dtype=np.int64)
+    rangs[:n] = pd.Series(paires[:n]).groupby(paires[:n], sort=False).cumcount().to_numpy()
+    rangs[n:] = pd.Series(paires[n:]).groupby(paires[n:], sort=False).cumcount().to_numpy()
+    cles = paires * (int(rangs.max(initial=0)) + 1) + rangs
+
+    totaux, parts = lignes["Total (€)"].to_numpy(), lignes["Part_Employeur"].to_numpy()
+    ancien = pd.DataFrame({"cle": cles[:n], "ancien_total": totaux[:n], "ancienne_part_employeur": parts[:n]})
+    nouveau = pd.DataFrame({"cle": cles[n:], "nouveau_total": totaux[n:], "nouvelle_part_employeur": parts[n:]})
+    df = nouveau.merge(ancien, on="cle", how="outer", sort=False, indicator=True)
+
+    cle = df["cle"].to_numpy(dtype=np.int64)
+    paire, rang = np.divmod(cle, int(rangs.max(initial=0)) + 1)
+    code_salarie, code_categorie = np.divmod(paire, len(categories))
+    df["salarie"] = salaries.take(code_salarie)
+    df["Catégorie"] = categories.take(code_categorie)
+    df["rang"] = rang
+    df["statut"] = df["_merge"].map({"left_only": NOUVELLE, "right_only": DISPARUE, "both": MODIFIEE}).astype(object)
+    df = df.fillna({"ancien_total": 0.0, "nouveau_total": 0.0, "ancienne_part_employeur": 0.0, "nouvelle_part_employeur": 0.0})
+
+    for suffixe, ancienne, nouvelle in (("total", "ancien_total", "nouveau_total"),
+                                        ("part_employeur", "ancienne_part_employeur", "nouvelle_part_employeur")):
+        ecart = (df[nouvelle].to_numpy() - df[ancienne].to_numpy()).round(2)
+        df[f"ecart_{suffixe}"] = ecart
+        df[f"ecart_relatif_{suffixe}"] = _relatif(ecart, df[ancienne].to_numpy())
+    return df[COLONNES_VARIATIONS]
+
+
+def anomalies(courants, precedents, seuils=SeuilsVariation()):
+    """
+    Rapport des lignes dont la variation dépasse les seuils, classées de la plus forte à la plus
+    faible (écart absolu en euros, salarial ou patronal, puis écart relatif).
+
+    :return: DataFrame au format COLONNES_VARIATIONS, avec en tête une colonne "classement" (1 = plus forte)
+    """
+    df = variations(courants, precedents)
+    categories = df["Catégorie"]
+    absolu = categories.map({c: s[0] for c, s in seuils.par_categorie.items()}).fillna(seuils.absolu).to_numpy(dtype=float)
+    relatif = categories.map({c: s[1] for c, s in seuils.par_categorie.items()}).fillna(seuils.relatif).to_numpy(dtype=float)
+
+    signalee = np.zeros(len(df), dtype=bool)
+    for suffixe in ("total", "part_employeur"):
+        ecart = np.abs(df[f"ecart_{suffixe}"].to_numpy())
+        signalee |= (ecart > 0) & (ecart >= absolu) & (np.abs(df[f"ecart_relatif_{suffixe}"].to_numpy()) >= relatif)
+
+    df = df[signalee]
+    ampleur = np.maximum(df["ecart_total"].abs(), df["ecart_part_employeur"].abs())
+    ampleur_relative = np.maximum(df["ecart_relatif_total"].abs(), df["ecart_relatif_part_employeur"].abs())
+    ordre = np.lexsort((ampleur_relative.to_numpy(), ampleur.to_numpy()))[::-1]
+    df = df.iloc[ordre].reset_index(drop=True)
+    df.insert(0, "classement", np.arange(1, len(df) + 1))
+    return df
+
+
+def anomalies_par_salarie(rapport):
+    """Nombre de lignes signalées et plus fort écart absolu de chaque salarié d'un rapport d'anomalies, du plus touché au moins touché."""
+    ampleur = np.maximum(rapport["ecart_total"].abs(), rapport["ecart_part_employeur"].abs())
+    resume = pd.DataFrame({"salarie": rapport["salarie"], "ampleur": ampleur}).groupby("salarie", sort=False)["ampleur"]
+    resume = pd.DataFrame({"lignes_signalees": resume.size(), "plus_fort_ecart": resume.max()})
+    return resume.sort_values(["plus_fort_ecart", "lignes_signalees"], ascending=False)